@@ -1,4 +1,8 @@
+import time
+from threading import RLock
+
 import matplotlib
+import numpy as np
 
 matplotlib.use("QtAgg")
 
@@ -21,3 +25,81 @@ class MplCanvas(FigureCanvasQTAgg):
 
         ###it is related to modifying QtWidgets.QColorDialog.ShowAlphaChannel to QtWidgets.QColorDialog.ColorDialogOption.ShowAlphaChannel
         return NavigationToolbar(self, parentWindow)
+
+    def blit_later(self, bbox=None):
+        """Like blit, but schedules the repaint of the region instead of painting immediately.
+        The Agg buffer is painted in the GUI thread, so this may be called from worker threads."""
+        if bbox is None:
+            bbox = self.figure.bbox
+        l, b, w, h = (int(pt / self.device_pixel_ratio) for pt in bbox.bounds)
+        self.update(l, self.rect().height() - b - h, w + 1, h + 1)
+
+
+class LiveLinePlot:
+    """A line in an MplCanvas that is updated frame by frame (spectrometer previews).
+
+    The line artist is created once and only its data changes. It is drawn over a cached background of the axes
+    (blitting), the full figure is redrawn only when the data leaves the y limits, on resize, or when the toolbar
+    changes the view. Limits set by the user with the toolbar are kept. Frames arriving faster than max_fps are not
+    drawn.
+    """
+
+    def __init__(self, canvas: MplCanvas, axes, fmt: str = "b-", max_fps: float = 25, margin: float = 0.05):
+        self.canvas = canvas
+        self.axes = axes
+        (self.line,) = axes.plot([], [], fmt, animated=True)
+        self.min_interval = 1 / max_fps if max_fps else 0
+        self.margin = margin
+        self._background = None
+        self._autoLimits = None  # y limits last set here, anything else was set by the user
+        self._lastDraw = 0.0
+        self._x = None
+        self._lock = RLock()
+        canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event=None):
+        with self._lock:
+            self._background = self.canvas.copy_from_bbox(self.axes.bbox)
+            if self._x is not None:
+                self.axes.draw_artist(self.line)
+
+    def update(self, x, y) -> bool:
+        """Shows a new frame.
+
+        Returns:
+            bool: False if the frame was skipped because of the frame rate limit.
+        """
+        now = time.monotonic()
+        if now - self._lastDraw < self.min_interval:
+            return False
+        self._lastDraw = now
+        with self._lock:
+            if self._x is None or (x is not self._x and not np.array_equal(x, self._x)):
+                self.line.set_data(x, y)
+                self._x = x
+            else:
+                self.line.set_ydata(y)
+            if self._rescale(y) or self._background is None:
+                self.canvas.draw()  # the draw event caches the new background and draws the line
+            else:
+                self.canvas.restore_region(self._background)
+                self.axes.draw_artist(self.line)
+            self.canvas.blit_later(self.axes.bbox)
+        return True
+
+    def _rescale(self, y) -> bool:
+        """Sets new y limits if the data left the current ones and the user has not set their own."""
+        ymin, ymax = self.axes.get_ylim()
+        if self._autoLimits is not None and (ymin, ymax) != self._autoLimits:
+            return False
+        y = np.asarray(y, dtype=np.float64)
+        finite = y[np.isfinite(y)]
+        if finite.size == 0:
+            return False
+        low, high = float(finite.min()), float(finite.max())
+        if self._autoLimits is not None and ymin <= low and high <= ymax:
+            return False
+        pad = (high - low) * self.margin or abs(high) * self.margin or 1.0
+        self.axes.set_ylim(low - pad, high + pad)
+        self._autoLimits = self.axes.get_ylim()
+        return True
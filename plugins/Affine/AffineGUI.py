@@ -2,6 +2,7 @@ import os
 
 
 from Affine_skimage import Affine, AffineError
+from alignment_service import AlignmentService, parse_candidates
 from PyQt6 import QtWidgets, uic
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QAction, QBrush, QImage, QPen, QPixmap
@@ -18,6 +19,8 @@ class AffineGUI:
     public API:
 
     -positioning_coords(coords: tuple[float, float]) -> tuple[float, float]
+    -positioning_match() -> [status, info]: matches a camera image in the alignment worker processes
+    -positioning_track() -> [status, info]: follows the drift since the last aligned image, matches if it is lost
 
     revision 2.0.0
     -Added dialog for matching and manual mode. Added settings for preprocessing.
@@ -42,6 +45,11 @@ class AffineGUI:
 
         # init core functionality
         self.affine = Affine(self.settings)
+        self.affine.feature_cache.directory = self.path + "masks" + os.sep + "feature_cache"
+        self.alignment = AlignmentService(workers=1, cache_dir=self.affine.feature_cache.directory)
+        self.alignment_candidates = ""
+        self.alignment_mode = "best"
+        self.alignment_min_inliers = 20
         self.dependency = ["camera"]
 
         self.logger = LoggingHelper(self)
@@ -78,6 +86,19 @@ class AffineGUI:
         residualthreshold = int(settings["residualthreshold"])
         crosscheck = True if settings["crosscheck"] == "True" else False
         backend = settings.get("backend", "SIFT")
+        pyramid = settings.get("pyramid", "False") == "True"
+        pyramidscale = float(settings.get("pyramidscale", 0.5))
+        roisize = int(settings.get("roisize", 192))
+        trackingmethod = settings.get("trackingmethod", "ecc")
+        trackingscale = float(settings.get("trackingscale", 0.5))
+        trackingconfidence = float(settings.get("trackingconfidence", 0.9))
+        self.alignment_candidates = settings.get("alignmentcandidates", "")
+        self.alignment_mode = settings.get("alignmentmode", "best")
+        self.alignment_min_inliers = int(settings.get("alignmentmininliers", 20))
+        alignmentworkers = int(settings.get("alignmentworkers", 2))
+        if alignmentworkers != self.alignment.workers:
+            self.alignment.shutdown()
+            self.alignment = AlignmentService(workers=alignmentworkers, cache_dir=self.affine.feature_cache.directory)
         default_camera = settings["cameracombobox"]
         # set the camera combobox to the default camera
         if default_camera:
@@ -137,6 +158,12 @@ class AffineGUI:
         s["residualthreshold"] = residualthreshold
         s["crosscheck"] = crosscheck
         s["backend"] = backend
+        s["pyramid"] = pyramid
+        s["pyramidscale"] = pyramidscale
+        s["roisize"] = roisize
+        s["trackingmethod"] = trackingmethod
+        s["trackingscale"] = trackingscale
+        s["trackingconfidence"] = trackingconfidence
 
         # set the preprocessing settings to the affine object
         self.affine.update_settings(s)
@@ -350,7 +377,18 @@ class AffineGUI:
         status, settings = self.parse_settings_widget()
         if status == 0:
             # Pass the settings dict to the dialog
-            self.dialog = dialog(self.affine, img[1], self.mdi_mask, settings, pointslist=pointslist, logger=self.logger)
+            self.dialog = dialog(
+                self.affine,
+                img[1],
+                self.mdi_mask,
+                settings,
+                pointslist=pointslist,
+                logger=self.logger,
+                alignment=self.alignment,
+                candidates=parse_candidates(self.alignment_candidates),
+                mode=self.alignment_mode,
+                min_inliers=self.alignment_min_inliers,
+            )
             self.dialog.finished.connect(_on_close)
             self.dialog.show()
         else:
@@ -567,6 +605,80 @@ class AffineGUI:
         except AffineError:
             return (-1, -1)
 
+    @public
+    def positioning_match(self):
+        """Captures an image and matches it to the mask with the alignment candidates in worker processes.
+        The best (or first passing) candidate sets the transformation. Blocks until the match is done.
+
+        Returns:
+            [0, {"inliers": int, "settings": dict of the winner}] or [status, {"Error message": ...}]
+        """
+        status, img = self._capture_for_alignment()
+        if status:
+            return [status, img]
+        try:
+            outcome = self._align(img)
+        except ValueError as e:
+            return [1, {"Error message": f"Affine: {e}"}]
+        except AffineError as e:
+            return [2, {"Error message": e.message}]
+        self.affine.reset_tracking(img)
+        return [0, {"inliers": outcome["inliers"], "settings": outcome["settings"]}]
+
+    @public
+    def positioning_track(self):
+        """Captures an image and updates the transformation by the drift since the last aligned image.
+        A full match in the worker processes is run if there is no aligned image yet or the tracking confidence is low.
+
+        Returns:
+            [0, {"tracked": bool, "confidence": float or None}] or [status, {"Error message": ...}]
+        """
+        status, img = self._capture_for_alignment()
+        if status:
+            return [status, img]
+        try:
+            tracked = self.affine.track(img, fallback=self._align)
+        except ValueError as e:
+            return [1, {"Error message": f"Affine: {e}"}]
+        except AffineError as e:
+            return [2, {"Error message": e.message}]
+        if not tracked and self.affine.track_confidence is not None:
+            self.logger.log_debug(f"Affine: tracking confidence {self.affine.track_confidence:.3f} < {self.affine.track_min_confidence}, ran a full match")
+        return [0, {"tracked": tracked, "confidence": self.affine.track_confidence}]
+
+    def _capture_for_alignment(self):
+        if self.affine.internal_mask is None:
+            return [1, {"Error message": "Affine: no mask loaded"}]
+        try:
+            img = self.functions["camera"][self.cameraComboBox.currentText()]["camera_capture_image"]()
+        except KeyError:
+            return [3, {"Error message": "Affine: camera not available"}]
+        if img[0] != 0:
+            return [4, {"Error message": f"Affine: error capturing image: {img[1]}"}]
+        return [0, img[1]]
+
+    def _align(self, img):
+        """Full match of img in the alignment service, sets the transformation of the winner."""
+        outcome = self.alignment.align(
+            img,
+            self.affine.internal_mask,
+            parse_candidates(self.alignment_candidates),
+            base_settings=self.affine.get_settings(),
+            mode=self.alignment_mode,
+            min_inliers=self.alignment_min_inliers,
+        )
+        AlignmentService.apply(self.affine, outcome)
+        self.logger.log_info(f"Affine: matched with {outcome['settings']['backend']}, {outcome['inliers']} inliers")
+        self._log_match_diagnostics(outcome["result"])
+        return outcome
+
+    def _log_match_diagnostics(self, result):
+        """Logs the preprocessing timings and the coarse-to-fine fallback of the last match, see Affine.result."""
+        if "pyramid_error" in result:
+            self.logger.log_debug(f"Affine: coarse-to-fine matching failed, matched at full resolution: {result['pyramid_error']}")
+        if "timings" in result:
+            self.logger.log_debug("Affine: image preprocessing (ms): " + ", ".join(f"{k} {v * 1000:.1f}" for k, v in result["timings"].items()))
+
     @public
     def positioning_measurement_points(self):
         """Returns the measurement points defined in the list widget."""
@@ -590,15 +702,18 @@ class AffineGUI:
                 "default_mask_path": self.last_mask_path,
                 "centerClicks": self.centerCheckbox.isChecked(),
             }
-            # extend the settings with the preprprocessing settings
-            s = self.affine.preprocessor.settings
-            # convert prepro settings to correct types
-            settings["ratiotest"] = float(self.affine.ratio_test)
-            settings["residualthreshold"] = int(self.affine.residual_threshold)
-            settings["crosscheck"] = True if self.affine.cross_check else False
-            settings["backend"] = self.affine.backend
-            settings.update(s)
-
+            # extend the settings with the matching and preprocessing settings
+            settings.update(self.affine.get_settings())
+            settings["alignmentcandidates"] = self.alignment_candidates
+            settings["alignmentmode"] = self.alignment_mode
+            settings["alignmentmininliers"] = self.alignment_min_inliers
+            settings["alignmentworkers"] = self.alignment.workers
+
+            assert 0 < settings["pyramidscale"] < 1, "pyramidScale must be between 0 and 1"
+            assert 0 < settings["trackingscale"] <= 1, "trackingScale must be between 0 and 1"
+            assert settings["alignmentmode"] in AlignmentService.MODES, "alignmentMode must be best or first"
+            assert settings["alignmentmininliers"] >= self.affine.MIN_MATCHES, "alignmentMinInliers must be at least 4"
+            parse_candidates(settings["alignmentcandidates"])
             assert settings["sigmaimage"] >= 0, "sigmaImage must be non-negative"
             assert settings["sigmamask"] >= 0, "sigmaMask must be non-negative"
             assert 0 <= settings["thresholdimage"] <= 255, "thresholdImage must be between 0 and 255"
@@ -1,6 +1,11 @@
+import hashlib
 import os
+import tempfile
+import time
+import zipfile
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Optional, Tuple, Dict
+from typing import Any, Callable, Optional, Tuple, Dict
 
 import cv2 as cv
 import numpy as np
@@ -17,8 +22,16 @@ class Preprocessor:
     """
     Handles preprocessing of images and masks for affine registration.
     Settings control operations like blur, invert, equalize, canny edge detection, and sigma values.
+
+    The images stay uint8 through all stages (OpenCV kernels, in place where possible), intermediate results are
+    written to scratch buffers that are reused between calls of the same size. The output is a new array. The time
+    of each stage of the last call is in timings["img"] / timings["mask"].
     """
 
+    # weights of skimage.color.rgb2gray as the previous float pipeline, the offset makes the rounding of cv.transform
+    # truncate like the float to uint8 conversion did (the features depend on it)
+    GRAY_TRANSFORM = np.array([[0.2125, 0.7154, 0.0721, -0.499]], dtype=np.float32)
+
     def __init__(self) -> None:
         self.settings: Dict[str, Any] = {
             "blurmask": False,
@@ -44,6 +57,8 @@ class Preprocessor:
             "sigmaimage": 1.0,
             "sigmamask": 1.0,
         }
+        self.timings: Dict[str, Dict[str, float]] = {"img": {}, "mask": {}}
+        self._scratch: Dict[Tuple[str, int], np.ndarray] = {}
 
     def update_settings(self, settings_dict: Dict[str, Any]) -> None:
         """
@@ -61,48 +76,7 @@ class Preprocessor:
         Returns:
             np.ndarray: Preprocessed image (uint8, grayscale).
         """
-        s = self.settings
-        if len(img.shape) == 3:
-            img = ski.color.rgb2gray(img)
-        if s["invertimage"]:
-            img = 1.0 - img
-        if s["equalizeimage"]:
-            img = ski.exposure.equalize_hist(img)
-        if s["blurimage"]:
-            img = ski.filters.gaussian(img, sigma=s["sigmaimage"])
-        if s["cannyimage"]:
-            img = ski.feature.canny(img, sigma=s["sigmaimage"])
-            img = img.astype(float)
-        if s["otsuimage"]:
-            # Convert to uint8 for threshold_otsu
-            img_uint8 = (img * 255).astype("uint8")
-            threshold = ski.filters.threshold_otsu(img_uint8)
-            img = img_uint8 > threshold
-            img = img.astype(float)
-        if s["manualthresholdimage"]:
-            # Convert to uint8 for manual threshold
-            img_uint8 = (img * 255).astype("uint8")
-            img = img_uint8 > s["thresholdimage"]
-            img = img.astype(float)
-        if s["morphologyimage"]:
-            # Apply morphological operations
-            img_binary = (img > 0.5).astype(bool) if img.max() <= 1.0 else (img > 127).astype(bool)
-            morph_type = s["morphologytypeimage"]
-            strength = s["morphologystrengthimage"]
-            kernel = ski.morphology.disk(strength)
-
-            if morph_type == "erosion":
-                img_binary = ski.morphology.erosion(img_binary, kernel)
-            elif morph_type == "dilation":
-                img_binary = ski.morphology.dilation(img_binary, kernel)
-            elif morph_type == "opening":
-                img_binary = ski.morphology.opening(img_binary, kernel)
-            elif morph_type == "closing":
-                img_binary = ski.morphology.closing(img_binary, kernel)
-
-            img = img_binary.astype(float)
-        img = (img * 255).astype("uint8")
-        return img
+        return self._preprocess(img, "image", "img")
 
     def preprocess_mask(self, mask: np.ndarray) -> np.ndarray:
         """
@@ -112,49 +86,178 @@ class Preprocessor:
         Returns:
             np.ndarray: Preprocessed mask (uint8, grayscale).
         """
+        return self._preprocess(mask, "mask", "mask")
+
+    def _buffer(self, name: str, index: int, shape: Tuple[int, ...]) -> np.ndarray:
+        buffer = self._scratch.get((name, index))
+        if buffer is None or buffer.shape != shape:
+            buffer = self._scratch[(name, index)] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def _preprocess(self, img: np.ndarray, suffix: str, name: str) -> np.ndarray:
+        """
+        Runs the enabled stages in the order of the settings dialog. Every stage reads one scratch buffer and writes
+        the other one (or itself), so a call allocates only the returned image.
+        """
         s = self.settings
-        if len(mask.shape) == 3:
-            mask = ski.color.rgb2gray(mask)
-        if s["invertmask"]:
-            mask = 1.0 - mask
-        if s["equalizemask"]:
-            mask = ski.exposure.equalize_hist(mask)
-        if s["blurmask"]:
-            mask = ski.filters.gaussian(mask, sigma=s["sigmamask"])
-        if s["cannymask"]:
-            mask = ski.feature.canny(mask, sigma=s["sigmamask"])
-            mask = mask.astype(float)
-        if s["otsumask"]:
-            # Convert to uint8 for threshold_otsu
-            mask_uint8 = (mask * 255).astype("uint8")
-            threshold = ski.filters.threshold_otsu(mask_uint8)
-            mask = mask_uint8 > threshold
-            mask = mask.astype(float)
-        if s["manualthresholdmask"]:
-            # Convert to uint8 for manual threshold
-            mask_uint8 = (mask * 255).astype("uint8")
-            mask = mask_uint8 > s["thresholdmask"]
-            mask = mask.astype(float)
-        if s["morphologymask"]:
-            # Apply morphological operations
-            mask_binary = (mask > 0.5).astype(bool) if mask.max() <= 1.0 else (mask > 127).astype(bool)
-            morph_type = s["morphologytypemask"]
-            strength = s["morphologystrengthmask"]
-            kernel = ski.morphology.disk(strength)
-
-            if morph_type == "erosion":
-                mask_binary = ski.morphology.erosion(mask_binary, kernel)
-            elif morph_type == "dilation":
-                mask_binary = ski.morphology.dilation(mask_binary, kernel)
-            elif morph_type == "opening":
-                mask_binary = ski.morphology.opening(mask_binary, kernel)
-            elif morph_type == "closing":
-                mask_binary = ski.morphology.closing(mask_binary, kernel)
-
-            mask = mask_binary.astype(float)
-        mask = (mask * 255).astype("uint8")
-
-        return mask
+        timings = self.timings[name] = {}
+        start = time.perf_counter()
+
+        def lap(stage: str) -> None:
+            nonlocal start
+            now = time.perf_counter()
+            timings[stage] = now - start
+            start = now
+
+        shape = img.shape[:2]
+        current, other = self._buffer(name, 0, shape), self._buffer(name, 1, shape)
+        img = self._to_uint8(img)
+        if img.ndim == 3:
+            cv.transform(img[:, :, :3], self.GRAY_TRANSFORM, dst=current)
+        else:
+            np.copyto(current, img)
+        lap("gray")
+        if s[f"invert{suffix}"]:
+            cv.bitwise_not(current, dst=current)
+            lap("invert")
+        if s[f"equalize{suffix}"]:
+            # same mapping as skimage equalize_hist: cumulative histogram normalized to the pixel count
+            cdf = np.cumsum(np.bincount(current.ravel(), minlength=256))
+            lut = np.round(cdf * (255.0 / cdf[-1])).astype(np.uint8)
+            cv.LUT(current, lut, dst=current)
+            lap("equalize")
+        sigma = float(s[f"sigma{suffix}"])
+        if s[f"blur{suffix}"] and sigma > 0:
+            cv.GaussianBlur(current, self._kernel_size(sigma), sigma, dst=other, borderType=cv.BORDER_REPLICATE)
+            current, other = other, current
+            lap("blur")
+        if s[f"canny{suffix}"]:
+            # skimage canny: gaussian smoothing, sobel magnitude, thresholds 0.1 and 0.2 of the intensity range.
+            # The smoothed image is kept in float and the gradients in 16 fixed point levels per gray level, so
+            # weak edges are not lost to rounding.
+            smoothed = current.astype(np.float32)
+            if sigma > 0:
+                cv.GaussianBlur(smoothed, self._kernel_size(sigma), sigma, dst=smoothed, borderType=cv.BORDER_REPLICATE)
+            dx = cv.Sobel(smoothed, cv.CV_32F, 1, 0, ksize=3, scale=16, borderType=cv.BORDER_REPLICATE).astype(np.int16)
+            dy = cv.Sobel(smoothed, cv.CV_32F, 0, 1, ksize=3, scale=16, borderType=cv.BORDER_REPLICATE).astype(np.int16)
+            edges = cv.Canny(dx, dy, 0.1 * 255 * 16, 0.2 * 255 * 16, L2gradient=True)
+            edges[[0, -1], :] = 0  # no edges on the border
+            edges[:, [0, -1]] = 0
+            current, other = edges, current
+            lap("canny")
+        if s[f"otsu{suffix}"]:
+            # threshold_otsu returns the last level of the background class, as cv.THRESH_OTSU does
+            cv.threshold(current, 0, 255, cv.THRESH_BINARY + cv.THRESH_OTSU, dst=current)
+            lap("otsu")
+        if s[f"manualthreshold{suffix}"]:
+            cv.threshold(current, int(s[f"threshold{suffix}"]), 255, cv.THRESH_BINARY, dst=current)
+            lap("threshold")
+        if s[f"morphology{suffix}"]:
+            cv.threshold(current, 127, 255, cv.THRESH_BINARY, dst=other)
+            kernel = ski.morphology.disk(int(s[f"morphologystrength{suffix}"])).astype(np.uint8)
+            operation = {
+                "erosion": cv.MORPH_ERODE,
+                "dilation": cv.MORPH_DILATE,
+                "opening": cv.MORPH_OPEN,
+                "closing": cv.MORPH_CLOSE,
+            }.get(s[f"morphologytype{suffix}"])
+            if operation is not None:
+                cv.morphologyEx(other, operation, kernel, dst=current)
+                lap("morphology")
+            else:
+                current, other = other, current
+        result = current.copy()
+        lap("copy")
+        return result
+
+    @staticmethod
+    def _to_uint8(img: np.ndarray) -> np.ndarray:
+        """Float images in [0, 1] (e.g. from skimage) are scaled to uint8, RGBA loses the alpha channel."""
+        if img.dtype == np.uint8:
+            return img
+        if np.issubdtype(img.dtype, np.floating):
+            return np.clip(img * 255 + 0.5, 0, 255).astype(np.uint8)
+        return np.clip(img, 0, 255).astype(np.uint8)
+
+    @staticmethod
+    def _kernel_size(sigma: float) -> Tuple[int, int]:
+        """Kernel of skimage.filters.gaussian (truncated at 4 sigma)."""
+        size = 2 * int(4 * sigma + 0.5) + 1
+        return (size, size)
+
+
+class MaskFeatureCache:
+    """
+    Keypoints and descriptors of preprocessed masks, so that repeated matches against the same mask only extract
+    features from the image. Entries are keyed by the content of the mask, the backend and the mask-side
+    preprocessing settings. They are kept in memory (least recently used are evicted) and, if directory is set, as
+    .npz files in it.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_items: int = 4) -> None:
+        self.directory = directory
+        self.max_items = max_items
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]" = OrderedDict()
+        self._digest: Optional[Tuple[np.ndarray, str]] = None  # (mask, hash of its content), masks are large
+
+    def key(self, mask: np.ndarray, backend: str, settings: Dict[str, Any]) -> str:
+        """
+        Cache key of a mask. The hash of the mask content is remembered for the last mask object, so a mask
+        modified in place is not noticed.
+        """
+        if self._digest is None or self._digest[0] is not mask:
+            digest = hashlib.sha1(np.ascontiguousarray(mask).data)
+            digest.update(str((mask.shape, mask.dtype.str)).encode())
+            self._digest = (mask, digest.hexdigest())
+        mask_settings = sorted((k, str(v)) for k, v in settings.items() if k.endswith("mask"))
+        return hashlib.sha1(f"{self._digest[1]}|{backend}|{mask_settings}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Returns:
+            (preprocessed mask, keypoints, descriptors) or None if not cached.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self.directory is None:
+            return None
+        try:
+            with np.load(os.path.join(self.directory, key + ".npz")) as cached:
+                entry = (cached["mask"], cached["keypoints"], cached["descriptors"])
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None  # not cached or unreadable, extracted again
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, mask: np.ndarray, keypoints: np.ndarray, descriptors: np.ndarray) -> None:
+        self._remember(key, (mask, keypoints, descriptors))
+        if self.directory is None:
+            return
+        tmp = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # unique temporary file, alignment worker processes may store the same key at the same time
+            fd, tmp = tempfile.mkstemp(suffix=".tmp.npz", prefix=key, dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, mask=mask, keypoints=keypoints, descriptors=descriptors)
+            os.replace(tmp, os.path.join(self.directory, key + ".npz"))
+        except OSError:
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+            # the memory cache still works
+
+    def _remember(self, key: str, entry: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Clears the memory cache, files are kept."""
+        self._entries.clear()
+        self._digest = None
 
 
 class AffineError(Exception):
@@ -285,6 +388,19 @@ class Affine:
         - Call try_match() with the input image.
         - If the transformation is found, access the transformation matrix using the A attribute.
         - Use coords() to get the transformed coordinates of a point.
+
+    With pyramid enabled, try_match first matches downsampled copies (pyramid_scale) of the image and mask. The coarse
+    transform predicts where the coarse inliers are at full resolution, and features are then extracted only in
+    windows (roi_size) around them in the image and around the predicted points in the mask. If either stage fails,
+    the full resolution match is run.
+
+    try_match prints nothing. Besides the keypoints and matches, result holds the image preprocessing time per stage in
+    seconds ("timings") and, after a failed coarse-to-fine stage, its error message ("pyramid_error").
+
+    Between full matches, track() follows small drift of the sample: the new frame is registered to the last aligned
+    frame (downsampled to track_scale) with phase correlation, refined with ECC for track_method "ecc", and the
+    estimated motion updates A. When the confidence (ECC correlation coefficient, or phase correlation response) is
+    below track_min_confidence, a full match is run instead.
     """
 
     path: str
@@ -294,11 +410,19 @@ class Affine:
     internal_mask: Optional[np.ndarray]
     MIN_MATCHES: int
     preprocessor: Preprocessor
+    feature_cache: MaskFeatureCache
     io: Affine_IO
     ratio_test: float
     residual_threshold: int
     cross_check: bool
     backend: str
+    pyramid: bool
+    pyramid_scale: float
+    roi_size: int
+    track_method: str
+    track_scale: float
+    track_min_confidence: float
+    track_confidence: Optional[float]
 
     def __init__(self, settings: Optional[Dict[str, Any]] = None) -> None:
         """
@@ -313,11 +437,22 @@ class Affine:
         self.internal_mask = None  # Internal mask
         self.MIN_MATCHES = 4
         self.preprocessor = Preprocessor()
+        self.feature_cache = MaskFeatureCache()  # memory only, the GUI sets a directory next to masks/
         self.io = Affine_IO(self.path)
         self.ratio_test = 0.80
         self.residual_threshold = 10
         self.cross_check = True
         self.backend = "SIFT"  # Default backend
+        self.pyramid = False  # coarse-to-fine matching
+        self.pyramid_scale = 0.5  # size of the coarse level
+        self.roi_size = 192  # px, full resolution windows around the coarse inliers
+        self.max_rois = 24
+        self.track_method = "ecc"  # "phase": translation only, "ecc": phase correlation refined to a rigid motion
+        self.track_scale = 0.5  # size of the frames registered by track()
+        self.track_min_confidence = 0.9  # below this track() runs a full match
+        self.track_confidence = None  # of the last track()
+        self._track_reference = None  # last aligned frame, grayscale float32 at track_scale
+        self._track_window = None  # Hanning window of the phase correlation
         if settings is not None:
             self.update_settings(settings)
 
@@ -340,8 +475,45 @@ class Affine:
                 self.cross_check = bool(val)
         if "backend" in settings:
             self.backend = settings["backend"]
+        if "pyramid" in settings:
+            val = settings["pyramid"]
+            self.pyramid = val.lower() == "true" if isinstance(val, str) else bool(val)
+        if "pyramidscale" in settings:
+            self.pyramid_scale = float(settings["pyramidscale"])
+        if "roisize" in settings:
+            self.roi_size = int(settings["roisize"])
+        if "trackingmethod" in settings:
+            if settings["trackingmethod"] not in ("phase", "ecc"):
+                raise AffineError(f"Unsupported tracking method: {settings['trackingmethod']}", 1)
+            self.track_method = settings["trackingmethod"]
+        if "trackingscale" in settings and float(settings["trackingscale"]) != self.track_scale:
+            self.track_scale = float(settings["trackingscale"])
+            self._track_reference = None  # the next track() runs a full match
+        if "trackingconfidence" in settings:
+            self.track_min_confidence = float(settings["trackingconfidence"])
         self.preprocessor.update_settings(settings)
 
+    def get_settings(self) -> Dict[str, Any]:
+        """
+        Current algorithmic and preprocessing settings, in the format of update_settings.
+        Returns:
+            dict: Settings dictionary.
+        """
+        settings = {
+            "ratiotest": float(self.ratio_test),
+            "residualthreshold": int(self.residual_threshold),
+            "crosscheck": bool(self.cross_check),
+            "backend": self.backend,
+            "pyramid": self.pyramid,
+            "pyramidscale": self.pyramid_scale,
+            "roisize": self.roi_size,
+            "trackingmethod": self.track_method,
+            "trackingscale": self.track_scale,
+            "trackingconfidence": self.track_min_confidence,
+        }
+        settings.update(self.preprocessor.settings)
+        return settings
+
     def _create_feature_detector(self):
         """
         Creates the appropriate feature detector based on the selected backend.
@@ -377,35 +549,46 @@ class Affine:
             raise AffineError("No image provided.", 1)
         if mask is None:
             raise AffineError("No mask loaded.", 2)
+        frame = img
+        if self.pyramid:
+            try:
+                matched = self._try_match_pyramid(img, mask)
+                self.result.pop("pyramid_error", None)
+                self.reset_tracking(frame)
+                return matched
+            except AffineError as e:
+                self.result["pyramid_error"] = e.message  # matched again at full resolution below
+        self.result.pop("coarse_transform", None)
         img = self.preprocessor.preprocess_img(img)
-        mask = self.preprocessor.preprocess_mask(mask)
+        self.result["timings"] = dict(self.preprocessor.timings["img"])
+        key = self.feature_cache.key(mask, self.backend, self.preprocessor.settings)
+        cached = self.feature_cache.get(key)
+        if cached is not None:
+            mask, kp_mask, desc_mask = cached
+        else:
+            mask = self.preprocessor.preprocess_mask(mask)
         self.result["img"] = img
         self.result["mask"] = mask
         try:
             detector = self._create_feature_detector()
             detector.detect_and_extract(img)
             kp_img, desc_img = detector.keypoints, detector.descriptors
-            detector.detect_and_extract(mask)
-            kp_mask, desc_mask = detector.keypoints, detector.descriptors
+            if cached is None:
+                detector.detect_and_extract(mask)
+                kp_mask, desc_mask = detector.keypoints, detector.descriptors
+                self.feature_cache.put(key, mask, kp_mask, desc_mask)
         except RuntimeError as e:
             raise AffineError(f"Runtime error during {self.backend} detection: {e}", 3) from e
 
         self.result["kp1"] = kp_mask
         self.result["kp2"] = kp_img
-        print("Keypoints in mask:", len(kp_mask))
-        print("Keypoints in image:", len(kp_img))
         matches = match_descriptors(desc_mask, desc_img, max_ratio=max_ratio, cross_check=cross_check)
-        print("Matches found:", len(matches))
         if len(matches) < self.MIN_MATCHES:
             raise AffineError(f"Not enough matches found: {len(matches)} < {self.MIN_MATCHES}", 3)
         if kp_mask is None or kp_img is None:
             raise AffineError("No keypoints found in either image or mask.", 3)
         src = kp_mask[matches[:, 0]][:, ::-1].astype(np.float32)  # mask keypoints masked with matches
         dst = kp_img[matches[:, 1]][:, ::-1].astype(np.float32)  # image keypoints masked with matches
-
-        print("Source points (mask) matched: ", len(src))
-        print("Destination points (image) matched:", len(dst))
-        print("Example mask point: ", src[0])
         model, inliers = self.get_transformation(src, dst, residual_threshold=residual_threshold)
         self.A = model.params
         matches = matches[inliers]
@@ -415,10 +598,112 @@ class Affine:
         self.result["kp2"] = kp_img
         self.result["matches"] = matches
         self.result["transform"] = model
+        self.reset_tracking(frame)
         return True
 
+    def _detect(self, detector, image: np.ndarray, offset: Tuple[int, int] = (0, 0)) -> Tuple[np.ndarray, np.ndarray]:
+        """Keypoints (row, col) shifted by offset and descriptors of an image, raises AffineError if none are found."""
+        try:
+            detector.detect_and_extract(image)
+        except RuntimeError as e:
+            raise AffineError(f"Runtime error during {self.backend} detection: {e}", 3) from e
+        return detector.keypoints + np.asarray(offset), detector.descriptors
+
+    def _try_match_pyramid(self, img: np.ndarray, mask: np.ndarray) -> bool:
+        """
+        Coarse-to-fine version of try_match, see the class docstring. Raises AffineError if a stage fails.
+        """
+        scale = self.pyramid_scale
+        if not 0 < scale < 1:
+            raise AffineError(f"Pyramid scale should be between 0 and 1, not {scale}", 4)
+        img = self.preprocessor.preprocess_img(img)
+        self.result["timings"] = dict(self.preprocessor.timings["img"])
+        detector = self._create_feature_detector()
+
+        # coarse level, the cache entry holds the full resolution preprocessed mask and the coarse features
+        key = self.feature_cache.key(mask, f"{self.backend}@{scale}", self.preprocessor.settings)
+        cached = self.feature_cache.get(key)
+        if cached is None:
+            full = self.feature_cache.get(self.feature_cache.key(mask, self.backend, self.preprocessor.settings))
+            mask = full[0] if full is not None else self.preprocessor.preprocess_mask(mask)
+            coarse_mask = cv.resize(mask, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+            kp_mask, desc_mask = self._detect(detector, coarse_mask)
+            self.feature_cache.put(key, mask, kp_mask, desc_mask)
+        else:
+            mask, kp_mask, desc_mask = cached
+        coarse_img = cv.resize(img, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+        kp_img, desc_img = self._detect(detector, coarse_img)
+        matches = match_descriptors(desc_mask, desc_img, max_ratio=self.ratio_test, cross_check=self.cross_check)
+        if len(matches) < self.MIN_MATCHES:
+            raise AffineError(f"Not enough coarse matches found: {len(matches)} < {self.MIN_MATCHES}", 3)
+        src = kp_mask[matches[:, 0]][:, ::-1] / scale
+        dst = kp_img[matches[:, 1]][:, ::-1] / scale
+        # a similarity is defined by two points, minimal samples need far fewer trials at low inlier ratios
+        coarse, inliers = self.get_transformation(src, dst, residual_threshold=self.residual_threshold, max_trials=2000, min_samples=2)
+
+        # full resolution windows around the coarse inliers, spread over the image
+        half = self.roi_size // 2
+        mask_half = int(np.ceil(half / max(coarse.scale, 1e-6))) + half // 2  # margin for the coarse error
+        centers = []
+        for point in dst[inliers]:
+            if all(np.max(np.abs(point - c)) >= half for c in centers):
+                centers.append(point)
+            if len(centers) >= self.max_rois:
+                break
+        kp1, kp2, desc1, desc2, pairs = [], [], [], [], []
+        n1 = n2 = 0
+        for center in centers:
+            mask_center = coarse.inverse(center[None, :])[0]
+            img_window = self._window(img, center, half)
+            mask_window = self._window(mask, mask_center, mask_half)
+            if img_window is None or mask_window is None:
+                continue
+            try:
+                k2, d2 = self._detect(detector, *img_window)
+                k1, d1 = self._detect(detector, *mask_window)
+            except AffineError:
+                continue  # featureless window
+            m = match_descriptors(d1, d2, max_ratio=self.ratio_test, cross_check=self.cross_check)
+            kp1.append(k1)
+            kp2.append(k2)
+            desc1.append(d1)
+            desc2.append(d2)
+            pairs.append(m + (n1, n2))
+            n1 += len(k1)
+            n2 += len(k2)
+        if not pairs:
+            raise AffineError("No features in the regions of interest", 3)
+        kp_mask, kp_img, matches = np.concatenate(kp1), np.concatenate(kp2), np.concatenate(pairs)
+        src = kp_mask[matches[:, 0]][:, ::-1].astype(np.float32)
+        dst = kp_img[matches[:, 1]][:, ::-1].astype(np.float32)
+        # matches that agree with the coarse transform, the window margin bounds the coarse error
+        agree = np.linalg.norm(coarse(src) - dst, axis=1) < max(half / 2, 2 * self.residual_threshold)
+        matches, src, dst = matches[agree], src[agree], dst[agree]
+        if len(matches) < self.MIN_MATCHES:
+            raise AffineError(f"Not enough fine matches found: {len(matches)} < {self.MIN_MATCHES}", 3)
+        model, inliers = self.get_transformation(src, dst, residual_threshold=self.residual_threshold, max_trials=500)
+        self.A = model.params
+        self.result["img"] = img
+        self.result["mask"] = mask
+        self.result["kp1"] = kp_mask
+        self.result["kp2"] = kp_img
+        self.result["matches"] = matches[inliers]
+        self.result["transform"] = model
+        self.result["coarse_transform"] = coarse
+        return True
+
+    @staticmethod
+    def _window(image: np.ndarray, center: np.ndarray, half: int) -> Optional[Tuple[np.ndarray, Tuple[int, int]]]:
+        """Crop of image around center (x, y) and its offset (row, col), None if it is mostly outside the image."""
+        x, y = int(round(center[0])), int(round(center[1]))
+        r0, r1 = max(y - half, 0), min(y + half, image.shape[0])
+        c0, c1 = max(x - half, 0), min(x + half, image.shape[1])
+        if r1 - r0 < half or c1 - c0 < half:
+            return None
+        return image[r0:r1, c0:c1], (r0, c0)
+
     def get_transformation(
-        self, src: np.ndarray, dst: np.ndarray, residual_threshold: int = 10
+        self, src: np.ndarray, dst: np.ndarray, residual_threshold: int = 10, max_trials: int = 5000, min_samples: int = 4
     ) -> Tuple[Any, np.ndarray]:
         """
         Estimate the affine transformation using RANSAC.
@@ -426,6 +711,8 @@ class Affine:
             src (np.ndarray): Source points (N, 2).
             dst (np.ndarray): Destination points (N, 2).
             residual_threshold (int): RANSAC residual threshold.
+            max_trials (int): RANSAC iterations, fewer are needed for matches already filtered by a coarse transform.
+            min_samples (int): points per RANSAC hypothesis.
         Returns:
             Tuple[SimilarityTransform, np.ndarray]: Model and inlier mask.
         Raises:
@@ -435,9 +722,9 @@ class Affine:
         model, inliers = ski.measure.ransac(
             (src, dst),
             ski.transform.SimilarityTransform,
-            min_samples=4,
+            min_samples=min_samples,
             residual_threshold=residual_threshold,
-            max_trials=5000,
+            max_trials=max_trials,
         )
         if inliers is None:
             raise AffineError("Ransac filtered out all points", 3)
@@ -477,9 +764,72 @@ class Affine:
             self.result["matches"] = np.array(
                 [[i, i] for i in range(len(src))]  # dummy matches to retain the structure
             )
+            self.reset_tracking(img)
         except Exception as e:
             raise AffineError(f"Error during manual transformation: {e}", 3) from e
 
+    def track(self, img: np.ndarray, fallback: Optional[Callable[[np.ndarray], Any]] = None) -> bool:
+        """
+        Updates A by the drift between the last aligned frame and img. Runs a full match if there is no aligned
+        frame yet, or if the confidence of the drift estimate is below track_min_confidence.
+        Args:
+            img (np.ndarray): New camera image.
+            fallback (callable, optional): Full match used instead of try_match, called with img. Must set A.
+        Returns:
+            bool: True if A was updated by tracking, False if a full match was run.
+        Raises:
+            AffineError: If the full match fails.
+        """
+        if img is None:
+            raise AffineError("No image provided.", 1)
+        frame = self._tracking_frame(img)
+        reference = self._track_reference
+        self.track_confidence = None
+        if self.A is not None and reference is not None and reference.shape == frame.shape:
+            motion, self.track_confidence = self._estimate_motion(reference, frame)
+            if self.track_confidence >= self.track_min_confidence:
+                # motion maps the last frame to the new one at track_scale, A maps the mask to the last frame
+                scale = np.diag([self.track_scale, self.track_scale, 1.0])
+                self.A = np.linalg.inv(scale) @ np.vstack([motion, [0, 0, 1]]) @ scale @ self.A
+                self.result.pop("transform", None)  # the model of the last full match
+                self._track_reference = frame
+                return True
+        (fallback or self.try_match)(img)
+        self._track_reference = frame
+        return False
+
+    def reset_tracking(self, img: Optional[np.ndarray] = None) -> None:
+        """
+        Sets the frame that A aligns, track() registers the next frame to it. None forgets the frame.
+        Args:
+            img (np.ndarray, optional): Aligned camera image.
+        """
+        self._track_reference = None if img is None else self._tracking_frame(img)
+
+    def _tracking_frame(self, img: np.ndarray) -> np.ndarray:
+        """Grayscale float32 copy of a camera image at track_scale."""
+        gray = Preprocessor._to_uint8(img)
+        if gray.ndim == 3:
+            gray = cv.cvtColor(gray, cv.COLOR_RGBA2GRAY if gray.shape[2] == 4 else cv.COLOR_RGB2GRAY)
+        if self.track_scale != 1:
+            gray = cv.resize(gray, None, fx=self.track_scale, fy=self.track_scale, interpolation=cv.INTER_AREA)
+        return gray.astype(np.float32)
+
+    def _estimate_motion(self, reference: np.ndarray, frame: np.ndarray) -> Tuple[np.ndarray, float]:
+        """2x3 motion from reference to frame coordinates and its confidence, 0 if ECC does not converge."""
+        if self._track_window is None or self._track_window.shape != reference.shape:
+            self._track_window = cv.createHanningWindow(reference.shape[::-1], cv.CV_32F)
+        (dx, dy), response = cv.phaseCorrelate(reference, frame, self._track_window)
+        motion = np.array([[1, 0, dx], [0, 1, dy]], dtype=np.float32)
+        if self.track_method == "phase":
+            return motion, float(response)
+        criteria = (cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 50, 1e-4)
+        try:
+            cc, motion = cv.findTransformECC(reference, frame, motion, cv.MOTION_EUCLIDEAN, criteria, None, 5)
+        except cv.error:
+            return motion, 0.0
+        return motion, float(cc)
+
     def coords(self, point: Tuple[float, float]) -> Tuple[float, float]:
         """
         Transforms a point from the mask to the corresponding point on the image using the affine transformation.
@@ -514,6 +864,7 @@ class Affine:
             self.mask_path = path
             self.internal_mask = mask
             self.result.clear()
+            self.reset_tracking()
             return mask
         except Exception as e:
             raise AffineError(f"Error loading mask from {path}: {e}", 2) from e
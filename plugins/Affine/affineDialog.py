@@ -36,7 +36,19 @@ class dialog(QDialog):
 
     info_msg = pyqtSignal(str)
 
-    def __init__(self, affine, img, mask, settings, pointslist=None, logger: Optional[LoggingHelper] = None):
+    def __init__(
+        self,
+        affine,
+        img,
+        mask,
+        settings,
+        pointslist=None,
+        logger: Optional[LoggingHelper] = None,
+        alignment=None,
+        candidates=None,
+        mode: str = "best",
+        min_inliers: int = 20,
+    ):
         """
         Initialize the dialog.
         Args:
@@ -45,6 +57,10 @@ class dialog(QDialog):
             mask: Mask image (numpy array).
             settings: Settings dictionary for preprocessing and matching.
             pointslist: Optional list of points for manual mode.
+            alignment: Optional AlignmentService, matching then runs in its worker processes.
+            candidates: Settings raced by the alignment service on top of the dialog settings.
+            mode: "best" or "first" candidate of the alignment service.
+            min_inliers: inliers of the first candidate that ends a "first" race.
         """
         super().__init__(None, Qt.WindowType.WindowMaximizeButtonHint | Qt.WindowType.WindowCloseButtonHint)
         self.ui = Ui_Dialog()
@@ -67,6 +83,10 @@ class dialog(QDialog):
                 child.currentTextChanged.connect(self._preprocessing_settings_changed)
 
         self.affine = affine
+        self.alignment = alignment
+        self.candidates = candidates or []
+        self.mode = mode
+        self.min_inliers = min_inliers
         self.pointslist = pointslist
         self.img = img
         self.mask = mask
@@ -457,7 +477,29 @@ class dialog(QDialog):
             """
 
             img = self.img
-            self.affine.try_match(img)
+            if self.alignment is None:
+                self.affine.try_match(img)
+            else:
+                outcome = self.alignment.align(
+                    img,
+                    self.affine.internal_mask,
+                    self.candidates,
+                    base_settings=self.affine.get_settings(),
+                    mode=self.mode,
+                    min_inliers=self.min_inliers,
+                )
+                self.alignment.apply(self.affine, outcome)
+                self.affine.reset_tracking(img)
+                if self.logger is not None:
+                    self.logger.log_info(
+                        "Affine: alignment candidates: "
+                        + ", ".join(
+                            f"{c['settings']['backend']} {c['settings']['ratiotest']}: "
+                            + (f"{c['inliers']} inliers" if c["error"] is None else "failed")
+                            + f" ({c['seconds']:.2f} s)"
+                            for c in outcome["candidates"]
+                        )
+                    )
             result = self.affine.result
 
             # Emit progress with result data
@@ -476,6 +518,10 @@ class dialog(QDialog):
             matches_count = len(result["matches"])
             message = f"Keypoints found - Mask: {kp1_count}, Image: {kp2_count}\n"
             message += f"Matching successful, found {matches_count} matches out of {min(kp1_count, kp2_count)} possible"
+            if "pyramid_error" in result:
+                message += f"\nCoarse-to-fine matching failed, matched at full resolution: {result['pyramid_error']}"
+            if "timings" in result:
+                message += "\nImage preprocessing (ms): " + ", ".join(f"{k} {v * 1000:.1f}" for k, v in result["timings"].items())
             self.info_message(message)
             self.draw_result(result, pointslist)
 
@@ -0,0 +1,211 @@
+"""
+Affine matching in worker processes.
+
+Matching an image to the mask takes from hundreds of milliseconds to seconds of pure Python and numpy work, which in
+the GUI process competes with Qt and the instrument threads for the GIL. AlignmentService runs the matching in a
+process pool instead. A job is a frame, the mask, the base settings (those of the GUI) and a list of candidates:
+settings that override the base settings, for example {"backend": "ORB", "ratiotest": 0.9}. The base settings are
+always the first candidate, the others are matched in parallel with it and the service returns
+
+    - mode "best": the candidate with the most inliers, after all candidates have finished,
+    - mode "first": the first candidate that finished with at least min_inliers inliers. Candidates that have not
+      started are cancelled, running ones finish in the background and their results are discarded.
+
+Every worker keeps one Affine object, so the mask features stay in its MaskFeatureCache between jobs. With a cache
+directory the workers also share the features stored on disk.
+
+The pool uses the spawn start method: forking a process that runs Qt and hardware threads is not safe.
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from Affine_skimage import Affine, AffineError
+
+_worker_affine = None  # Affine object of a worker process
+
+
+def parse_candidates(text: str) -> List[Dict[str, Any]]:
+    """Candidates from the settings string "BACKEND:ratiotest, ...", e.g. "SIFT:0.8, ORB:0.9".
+    The ratio test is optional ("ORB" keeps the base value). Raises ValueError for malformed entries."""
+    candidates = []
+    for entry in text.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        backend, _, ratio = entry.partition(":")
+        backend = backend.strip().upper()
+        if backend not in ("SIFT", "ORB"):
+            raise ValueError(f"Unsupported backend in alignment candidates: {backend}")
+        candidate = {"backend": backend}
+        if ratio.strip():
+            candidate["ratiotest"] = float(ratio)
+            if not 0 < candidate["ratiotest"] <= 1:
+                raise ValueError(f"Ratio test must be in (0, 1]: {entry}")
+        candidates.append(candidate)
+    return candidates
+
+
+def _match(img: np.ndarray, mask: np.ndarray, settings: Dict[str, Any], cache_dir: Optional[str]) -> Dict[str, Any]:
+    """Matches one candidate, runs in a worker process (or in the calling process for workers=1).
+    Errors are returned, not raised, so that a failing candidate does not end the race."""
+    global _worker_affine
+    if _worker_affine is None:
+        _worker_affine = Affine()
+    affine = _worker_affine
+    affine.feature_cache.directory = cache_dir
+    affine.update_settings(settings)
+    affine.internal_mask = mask
+    affine.A = None
+    affine.result = {}
+    start = time.perf_counter()
+    outcome = {"settings": settings, "A": None, "inliers": 0, "result": {}, "error": None}
+    try:
+        affine.try_match(img)
+        outcome["A"] = affine.A
+        outcome["inliers"] = len(affine.result["matches"])
+        outcome["result"] = dict(affine.result)
+    except AffineError as e:
+        outcome["error"] = e.message
+    except Exception as e:
+        outcome["error"] = f"{type(e).__name__}: {e}"
+    outcome["seconds"] = time.perf_counter() - start
+    return outcome
+
+
+def _warm_up(cache_dir: Optional[str]) -> None:
+    """Imports the matching code and creates the Affine object of the worker."""
+    global _worker_affine
+    if _worker_affine is None:
+        _worker_affine = Affine()
+    _worker_affine.feature_cache.directory = cache_dir
+
+
+class AlignmentService:
+    """Races matching candidates in a process pool. workers=1 matches in the calling process."""
+
+    MODES = ("best", "first")
+
+    def __init__(self, workers: int = 2, cache_dir: Optional[str] = None) -> None:
+        self.workers = max(1, int(workers))
+        self.cache_dir = cache_dir
+        self._pool = None
+        self._racer = None  # thread waiting for the candidates of submitted jobs
+
+    def start(self) -> None:
+        """Starts the worker processes. Called by the first job, call it early to hide the start up time."""
+        if self._racer is None:
+            self._racer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AlignmentService")
+        if self.workers > 1 and self._pool is None:
+            context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            for future in [self._pool.submit(_warm_up, self.cache_dir) for _ in range(self.workers)]:
+                future.add_done_callback(lambda f: f.exception())
+
+    def shutdown(self) -> None:
+        """Stops the workers, pending candidates are cancelled."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._racer is not None:
+            self._racer.shutdown(wait=False, cancel_futures=True)
+            self._racer = None
+
+    def submit(
+        self,
+        img: np.ndarray,
+        mask: np.ndarray,
+        candidates: List[Dict[str, Any]],
+        base_settings: Optional[Dict[str, Any]] = None,
+        mode: str = "best",
+        min_inliers: int = 4,
+    ) -> Future:
+        """Starts a job and returns at once. The future resolves to the winning outcome (see align)."""
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown alignment mode: {mode}")
+        if img is None:
+            raise AffineError("No image provided.", 1)
+        if mask is None:
+            raise AffineError("No mask loaded.", 2)
+        base = dict(base_settings or {})
+        jobs = [base]
+        for candidate in candidates or []:
+            settings = {**base, **candidate}
+            if settings not in jobs:
+                jobs.append(settings)
+        self.start()
+        return self._racer.submit(self._race, img, mask, jobs, mode, min_inliers)
+
+    def align(
+        self,
+        img: np.ndarray,
+        mask: np.ndarray,
+        candidates: List[Dict[str, Any]],
+        base_settings: Optional[Dict[str, Any]] = None,
+        mode: str = "best",
+        min_inliers: int = 4,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Matches the candidates and waits for the winner.
+
+        Args:
+            img: camera image.
+            mask: mask image, Affine.internal_mask.
+            candidates: settings overriding base_settings, one match per candidate in addition to the base settings.
+            base_settings: Affine settings, matched as the first candidate and shared by the others.
+            mode: "best" or "first", see the module docstring.
+            min_inliers: inliers needed to end a "first" race.
+            timeout: seconds, raises concurrent.futures.TimeoutError.
+
+        Returns:
+            dict: settings, A, inliers, result (the Affine.result of the winner), seconds, and candidates: the
+            settings, inliers, error and seconds of every finished candidate.
+
+        Raises:
+            AffineError: if no candidate matched.
+        """
+        return self.submit(img, mask, candidates, base_settings, mode, min_inliers).result(timeout)
+
+    def _race(self, img, mask, jobs, mode, min_inliers) -> Dict[str, Any]:
+        outcomes = []
+        if self._pool is None:
+            for settings in jobs:
+                outcomes.append(_match(img, mask, settings, self.cache_dir))
+                if mode == "first" and outcomes[-1]["inliers"] >= min_inliers:
+                    break
+        else:
+            pending = {self._pool.submit(_match, img, mask, settings, self.cache_dir) for settings in jobs}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                outcomes.extend(future.result() for future in done)
+                if mode == "first" and any(outcome["inliers"] >= min_inliers for outcome in outcomes):
+                    for future in pending:
+                        future.cancel()
+                    break
+        return self._winner(outcomes, mode, min_inliers)
+
+    @staticmethod
+    def _winner(outcomes, mode, min_inliers) -> Dict[str, Any]:
+        summary = [{k: outcome[k] for k in ("settings", "inliers", "error", "seconds")} for outcome in outcomes]
+        matched = [outcome for outcome in outcomes if outcome["error"] is None]
+        if not matched:
+            errors = "; ".join(f"{o['settings'].get('backend', '')}: {o['error']}" for o in outcomes)
+            raise AffineError(f"No alignment candidate matched: {errors}", 3)
+        if mode == "first":
+            passing = [outcome for outcome in matched if outcome["inliers"] >= min_inliers]
+            winner = passing[0] if passing else max(matched, key=lambda outcome: outcome["inliers"])
+        else:
+            winner = max(matched, key=lambda outcome: outcome["inliers"])
+        winner = dict(winner)
+        winner["candidates"] = summary
+        return winner
+
+    @staticmethod
+    def apply(affine: Affine, outcome: Dict[str, Any]) -> None:
+        """Sets the transformation and result of a winning outcome to the Affine object of the GUI."""
+        affine.A = outcome["A"]
+        affine.result = dict(outcome["result"])
@@ -75,6 +75,7 @@ class Keithley2612B:
     ke: Optional[MessageBasedResource] = None
     k: Optional[usbtmc.Instrument] = None
     mock_con: bool = False
+    triggered_pulse_length: float = 0.0  # s, trigger delay and width of the last keithley_run_triggered_pulse
     ####################################  threads
 
     ################################### internal functions
@@ -598,6 +599,103 @@ class Keithley2612B:
                 raise e
                 return 1
 
+    def keithley_run_triggered_pulse(self, s: dict) -> int:
+        """Runs a single pulse on the source channel and emits a TTL on a digio line when the pulse level is reached.
+
+        Pulse timing is done by the instrument trigger model, so the host only has to arm the device connected to the
+        digio line (e.g. a spectrometer in external trigger mode) before calling this and collect the result after:
+
+            SOURCE_COMPLETE -> timer[3] (triggerdelay) -> TTL on digio line, measure starts
+                                                       -> timer[4] (pulsewidth) -> end of pulse, source back to 0
+
+        The result is read with read_triggered_pulse.
+
+        Args:
+            s (dict): settings dictionary
+                s["source"] source channel
+                s["type"] source inject current or voltage: may take values [i ,v]
+                s["level"] pulse level
+                s["pulsewidth"] time from the TTL to the end of the pulse, should cover the exposure of the triggered device
+                s["triggerdelay"] settling time from reaching the pulse level to the TTL
+                s["digio"] digio line for the TTL (1-14)
+                s["ttlwidth"] TTL pulse width, optional, default 1 ms
+
+        Returns:
+            0 - no error
+        """
+        src = s["source"]
+        line = int(s["digio"])
+        with self.lock:
+            try:
+                self.safewrite(f"{src}.nvbuffer1.clear()")
+                self.safewrite(f"{src}.nvbuffer2.clear()")
+                # idle (bias) level between pulses, see pulse trigger models on pp 3-35-36 (172-173) of the manual
+                self.safewrite(f"{src}.source.level{s['type']} = 0")
+                self.safewrite(f"{src}.trigger.source.list{s['type']}({{{s['level']}}})")
+                self.safewrite(f"{src}.trigger.source.action = {src}.ENABLE")
+                self.safewrite(f"{src}.trigger.count = 1")
+                self.safewrite(f"{src}.trigger.arm.count = 1")
+                self.safewrite(f"{src}.trigger.measure.iv({src}.nvbuffer1, {src}.nvbuffer2)")
+                self.safewrite(f"{src}.trigger.measure.action = {src}.ENABLE")
+                self.safewrite(f"{src}.trigger.endpulse.action = {src}.SOURCE_IDLE")
+                self.safewrite(f"{src}.trigger.endsweep.action = {src}.SOURCE_IDLE")
+
+                # TTL after the settling delay, timers 1 and 2 are used by keithley_run_sweep
+                self.safewrite("trigger.timer[3].reset()")
+                self.safewrite(f"trigger.timer[3].delay = {max(float(s['triggerdelay']), 1e-6)}")
+                self.safewrite("trigger.timer[3].count = 1")
+                self.safewrite("trigger.timer[3].passthrough = false")
+                self.safewrite(f"trigger.timer[3].stimulus = {src}.trigger.SOURCE_COMPLETE_EVENT_ID")
+                # output trigger on the digio line, see 2600b reference manual p.4-41
+                self.safewrite(f"digio.trigger[{line}].clear()")
+                self.safewrite(f"digio.trigger[{line}].mode = digio.TRIG_RISINGM")
+                self.safewrite(f"digio.trigger[{line}].pulsewidth = {s.get('ttlwidth', 0.001)}")
+                self.safewrite(f"digio.trigger[{line}].stimulus = trigger.timer[3].EVENT_ID")
+                # IV is measured during the exposure
+                self.safewrite(f"{src}.trigger.measure.stimulus = trigger.timer[3].EVENT_ID")
+
+                # end of pulse
+                self.safewrite("trigger.timer[4].reset()")
+                self.safewrite(f"trigger.timer[4].delay = {s['pulsewidth']}")
+                self.safewrite("trigger.timer[4].count = 1")
+                self.safewrite("trigger.timer[4].passthrough = false")
+                self.safewrite("trigger.timer[4].stimulus = trigger.timer[3].EVENT_ID")
+                self.safewrite(f"{src}.trigger.endpulse.stimulus = trigger.timer[4].EVENT_ID")
+
+                self.safewrite(f"{src}.source.output = {src}.OUTPUT_ON")
+                self.safewrite(f"{src}.trigger.initiate()")
+                self.triggered_pulse_length = max(float(s["triggerdelay"]), 1e-6) + float(s["pulsewidth"])
+                return 0
+            except Exception as e:
+                self.safewrite(f"{src}.abort()")
+                self.safewrite(f"{src}.source.output = {src}.OUTPUT_OFF")
+                print(f"Caught exception during keithley_run_triggered_pulse : {e}")
+                raise e
+
+    def read_triggered_pulse(self, channel) -> list[Optional[float]]:
+        """Waits for the pulse started by keithley_run_triggered_pulse to finish and returns the IV measured during it.
+
+        The instrument answers the buffer query only after the pulse has ended, so the I/O timeout is extended by the
+        length of the pulse for the query.
+
+        Returns:
+            list [i, v, number of point in the buffer]
+        """
+        if self.backend == BackendType.MOCK.value:
+            return self.get_last_buffer_value(channel)
+        # usbtmc timeout is in seconds, pyvisa timeout in milliseconds
+        instrument, scale = (self.k, 1) if self.backend == BackendType.USB.value else (self.ke, 1000)
+        if instrument is None:
+            raise ValueError("Keithley 2612B is not connected. Please connect first.")
+        timeout = instrument.timeout
+        instrument.timeout = timeout + self.triggered_pulse_length * scale
+        try:
+            # blocks command processing on the instrument until the trigger model is idle
+            self.safewrite("waitcomplete()")
+            return self.get_last_buffer_value(channel)
+        finally:
+            instrument.timeout = timeout
+
     def set_digio(self, line_id: int, value: bool):
         """Set a digital I/O line to a value.
 
@@ -230,6 +230,32 @@ class Keithley2612BGUI:
         """
         return self.smu.keithley_run_sweep(s)
 
+    def smu_runTriggeredPulse(self, s: dict) -> tuple[int, dict]:
+        """an interface for an externall calling function to run a single hardware timed pulse with a TTL on a digio line
+        s: dictionary with source, type, level, pulsewidth, triggerdelay and digio (see keithley_run_triggered_pulse)
+
+        Returns [status, message]:
+            0 - no error, ~0 - error
+
+        Note: this function should be called only after the Keithley is initialized (i.e. after smu.keithley_init(s))
+        """
+        try:
+            self.smu.keithley_run_triggered_pulse(s)
+            return (0, {"Error message": "OK"})
+        except Exception as e:
+            return (4, {"Error message": "Hardware error in Keithley2612B plugin: can not run triggered pulse", "Exception": e})
+
+    def smu_readTriggeredPulse(self, channel) -> tuple[int, list]:
+        """waits for the pulse started by smu_runTriggeredPulse to finish
+
+        Returns:
+            [status, [i, v, number of point in the buffer]]
+        """
+        try:
+            return (0, self.smu.read_triggered_pulse(channel))
+        except Exception as e:
+            return (4, {"Error message": "Hardware error in Keithley2612B plugin: can not read triggered pulse", "Exception": e})
+
     def smu_getLastBufferValue(self, channel, readings=None) -> list:
         """an interface for an externall calling function to get last buffer value from Keithley
         s: channel to get the last value (may be 'smua' or 'smub')
@@ -9,14 +9,14 @@
 ################################################################################
 
 from PyQt6.QtCore import QCoreApplication, QMetaObject, QRect, QSize
-from PyQt6.QtWidgets import QCheckBox, QComboBox, QGridLayout, QGroupBox, QHBoxLayout, QLabel, QLineEdit, QScrollArea, QSizePolicy, QSpacerItem, QVBoxLayout, QWidget, QDoubleSpinBox
+from PyQt6.QtWidgets import QCheckBox, QComboBox, QGridLayout, QGroupBox, QHBoxLayout, QLabel, QLineEdit, QScrollArea, QSizePolicy, QSpacerItem, QVBoxLayout, QWidget, QDoubleSpinBox, QSpinBox
 
 
 class Ui_Form(object):
     def setupUi(self, Form):
         if not Form.objectName():
             Form.setObjectName(u"Form")
-        Form.resize(1560, 1037)
+        Form.resize(1566, 1050)
         sizePolicy = QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
@@ -29,7 +29,7 @@ class Ui_Form(object):
         self.scrollArea.setWidgetResizable(True)
         self.scrollAreaWidgetContents = QWidget()
         self.scrollAreaWidgetContents.setObjectName(u"scrollAreaWidgetContents")
-        self.scrollAreaWidgetContents.setGeometry(QRect(0, 0, 1540, 1017))
+        self.scrollAreaWidgetContents.setGeometry(QRect(0, 0, 1546, 1030))
         self.verticalLayout_4 = QVBoxLayout(self.scrollAreaWidgetContents)
         self.verticalLayout_4.setObjectName(u"verticalLayout_4")
         self.groupBox_general = QGroupBox(self.scrollAreaWidgetContents)
@@ -60,6 +60,16 @@ class Ui_Form(object):
 
         self.gridLayout_2.addWidget(self.spectrometerBox, 1, 1, 1, 1)
 
+        self.label_spectrometerGroup = QLabel(self.groupBox_dependency)
+        self.label_spectrometerGroup.setObjectName(u"label_spectrometerGroup")
+
+        self.gridLayout_2.addWidget(self.label_spectrometerGroup, 2, 0, 1, 1)
+
+        self.spectrometerGroup = QLineEdit(self.groupBox_dependency)
+        self.spectrometerGroup.setObjectName(u"spectrometerGroup")
+
+        self.gridLayout_2.addWidget(self.spectrometerGroup, 2, 1, 1, 1)
+
 
         self.verticalLayout.addWidget(self.groupBox_dependency)
 
@@ -134,6 +144,7 @@ class Ui_Form(object):
         self.comboBox_mode.addItem("")
         self.comboBox_mode.addItem("")
         self.comboBox_mode.addItem("")
+        self.comboBox_mode.addItem("")
         self.comboBox_mode.setObjectName(u"comboBox_mode")
         sizePolicy1.setHeightForWidth(self.comboBox_mode.sizePolicy().hasHeightForWidth())
         self.comboBox_mode.setSizePolicy(sizePolicy1)
@@ -418,7 +429,9 @@ class Ui_Form(object):
 
         self.groupBox = QGroupBox(self.groupBox_general)
         self.groupBox.setObjectName(u"groupBox")
-        self.horizontalLayout_2 = QHBoxLayout(self.groupBox)
+        self.verticalLayout_spectro = QVBoxLayout(self.groupBox)
+        self.verticalLayout_spectro.setObjectName(u"verticalLayout_spectro")
+        self.horizontalLayout_2 = QHBoxLayout()
         self.horizontalLayout_2.setObjectName(u"horizontalLayout_2")
         self.spectro_check_after = QCheckBox(self.groupBox)
         self.spectro_check_after.setObjectName(u"spectro_check_after")
@@ -448,6 +461,45 @@ class Ui_Form(object):
         self.horizontalLayout_2.addWidget(self.spectro_use_last_integ)
 
 
+        self.verticalLayout_spectro.addLayout(self.horizontalLayout_2)
+
+        self.horizontalLayout_3 = QHBoxLayout()
+        self.horizontalLayout_3.setObjectName(u"horizontalLayout_3")
+        self.spectro_pipelined = QCheckBox(self.groupBox)
+        self.spectro_pipelined.setObjectName(u"spectro_pipelined")
+
+        self.horizontalLayout_3.addWidget(self.spectro_pipelined)
+
+        self.spectro_archive = QCheckBox(self.groupBox)
+        self.spectro_archive.setObjectName(u"spectro_archive")
+
+        self.horizontalLayout_3.addWidget(self.spectro_archive)
+
+
+        self.verticalLayout_spectro.addLayout(self.horizontalLayout_3)
+
+        self.horizontalLayout_4 = QHBoxLayout()
+        self.horizontalLayout_4.setObjectName(u"horizontalLayout_4")
+        self.label_trigger_line = QLabel(self.groupBox)
+        self.label_trigger_line.setObjectName(u"label_trigger_line")
+
+        self.horizontalLayout_4.addWidget(self.label_trigger_line)
+
+        self.spectro_trigger_line = QSpinBox(self.groupBox)
+        self.spectro_trigger_line.setObjectName(u"spectro_trigger_line")
+        self.spectro_trigger_line.setMinimum(1)
+        self.spectro_trigger_line.setMaximum(14)
+
+        self.horizontalLayout_4.addWidget(self.spectro_trigger_line)
+
+        self.horizontalSpacer_trigger = QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
+
+        self.horizontalLayout_4.addItem(self.horizontalSpacer_trigger)
+
+
+        self.verticalLayout_spectro.addLayout(self.horizontalLayout_4)
+
+
         self.verticalLayout.addWidget(self.groupBox)
 
         self.verticalSpacer = QSpacerItem(20, 40, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
@@ -480,6 +532,8 @@ class Ui_Form(object):
         self.groupBox_dependency.setTitle(QCoreApplication.translate("Form", u"Dependencies", None))
         self.label.setText(QCoreApplication.translate("Form", u"SMU Plugin", None))
         self.label_2.setText(QCoreApplication.translate("Form", u"Spectrometer Plugin", None))
+        self.label_spectrometerGroup.setText(QCoreApplication.translate("Form", u"Also capture with", None))
+        self.spectrometerGroup.setPlaceholderText(QCoreApplication.translate("Form", u"other spectrometer plugins, comma separated", None))
         self.groupBox_general_2.setTitle(QCoreApplication.translate("Form", u"General", None))
         self.label_Channel.setText(QCoreApplication.translate("Form", u"Source channel", None))
         self.comboBox_channel.setItemText(0, QCoreApplication.translate("Form", u"smuA", None))
@@ -493,6 +547,7 @@ class Ui_Form(object):
         self.comboBox_mode.setItemText(0, QCoreApplication.translate("Form", u"Continuous", None))
         self.comboBox_mode.setItemText(1, QCoreApplication.translate("Form", u"Pulsed", None))
         self.comboBox_mode.setItemText(2, QCoreApplication.translate("Form", u"Mixed", None))
+        self.comboBox_mode.setItemText(3, QCoreApplication.translate("Form", u"Triggered", None))
 
         self.label_sourceSenseMode.setText(QCoreApplication.translate("Form", u"Sense", None))
         self.comboBox_sourceSenseMode.setItemText(0, QCoreApplication.translate("Form", u"2 wire", None))
@@ -529,5 +584,8 @@ class Ui_Form(object):
         self.spectro_check_after.setText(QCoreApplication.translate("Form", u"Measure IV before and after", None))
         self.spectro_pause.setText(QCoreApplication.translate("Form", u"pause", None))
         self.spectro_use_last_integ.setText(QCoreApplication.translate("Form", u"getAutoTime initial guess from last integration time", None))
+        self.spectro_pipelined.setText(QCoreApplication.translate("Form", u"Pipelined (save in background, prepare next point during pause)", None))
+        self.spectro_archive.setText(QCoreApplication.translate("Form", u"Save run to one archive (.specarchive)", None))
+        self.label_trigger_line.setText(QCoreApplication.translate("Form", u"Triggered mode: SMU digio line to spectrometer trigger input", None))
     # retranslateUi
 
@@ -18,7 +18,9 @@ from settingsWidget import Ui_Form
 import numpy as np
 import copy
 from typing import Optional
-from plugin_components import LoggingHelper
+from plugin_components import AsyncFileWriter, LoggingHelper
+from spectral_archive import SpectralArchiveWriter, archive_path
+from spectrometer_components import SpectrometerGroup
 
 
 class specSMU_GUI(QWidget):
@@ -31,6 +33,7 @@ class specSMU_GUI(QWidget):
         "setSettings",
         "set_gui_from_settings",
     ]  # add function names here, necessary for descendents of QObject, otherwise _get_public_methods returns a lot of QObject methods
+    _TRIGGER_MARGIN = 0.01  # s, triggered mode: pulse is kept on this long after the end of the exposure
     ########Signals
 
     def _log_verbose(self, message):
@@ -68,6 +71,7 @@ class specSMU_GUI(QWidget):
         self.settingsWidget.setupUi(self)
         self.settings = {}
         self.function_dict = {}
+        self.group_settings = {}  # settings of the additional spectrometers, by plugin name
         self.last_integration_time: Optional[float] = None  # s
         self.logger = LoggingHelper(self)
         self.logger.log_debug(f"specSMU GUI initialized with logger: {self.logger}")
@@ -139,10 +143,12 @@ class specSMU_GUI(QWidget):
             self.settingsWidget.label_pulsedPause.setEnabled(False)
             self.settingsWidget.label_pulsedPause_2.setEnabled(False)
             self.settingsWidget.lineEdit_Pause.setEnabled(False)
-        elif mode == "Pulsed":
+        elif mode == "Pulsed" or mode == "Triggered":
             self.settingsWidget.label_pulsedPause.setEnabled(True)
             self.settingsWidget.label_pulsedPause_2.setEnabled(True)
             self.settingsWidget.lineEdit_Pause.setEnabled(True)
+        self.settingsWidget.label_trigger_line.setEnabled(mode == "Triggered")
+        self.settingsWidget.spectro_trigger_line.setEnabled(mode == "Triggered")
 
         self.update()
 
@@ -229,6 +235,8 @@ class specSMU_GUI(QWidget):
             idx = self.settingsWidget.spectrometerBox.findText(spectro_name, Qt.MatchFlag.MatchFixedString)
             if idx > -1:
                 self.settingsWidget.spectrometerBox.setCurrentIndex(idx)
+        group = settings.get("spectrometer_group", "")
+        self.settingsWidget.spectrometerGroup.setText(", ".join(group) if isinstance(group, list) else str(group))
 
         # Set combo boxes
         combo_map = {
@@ -275,10 +283,13 @@ class specSMU_GUI(QWidget):
         set_checkbox("spectro_check_after", "spectro_check_after")
         set_checkbox("spectro_pause", "spectro_pause")
         set_checkbox("checkBox_singleChannel", "singlechannel")
+        set_checkbox("spectro_pipelined", "spectro_pipelined")
+        set_checkbox("spectro_archive", "spectro_archive")
 
         # set spinbox
         spectro_pause_time = settings.get("spectro_pause_time", 1.0)
         self.settingsWidget.spectro_pause_time.setValue(float(spectro_pause_time))
+        self.settingsWidget.spectro_trigger_line.setValue(int(settings.get("spectro_trigger_line", 1)))
 
         # Update GUI state
         self._update_GUI_state()
@@ -350,6 +361,7 @@ class specSMU_GUI(QWidget):
             self.settings = {}
             self.settings["smu"] = raw_settings["smu"]
             self.settings["spectrometer"] = raw_settings["spectrometer"]
+            self.settings["spectrometer_group"] = [name.strip() for name in raw_settings["spectrometer_group"].split(",") if name.strip() and name.strip() != raw_settings["spectrometer"]]
             self.settings["channel"] = raw_settings["channel"].lower()
             self.settings["inject"] = raw_settings["inject"].lower()
             self.settings["mode"] = raw_settings["mode"].lower()
@@ -359,6 +371,8 @@ class specSMU_GUI(QWidget):
             self.settings["spectro_check_after"] = raw_settings["spectro_check_after"]  # bool
             self.settings["spectro_pause"] = raw_settings["spectro_pause"]  # bool
             self.settings["spectro_use_last_integ"] = raw_settings["spectro_use_last_integ"]  # bool
+            self.settings["spectro_pipelined"] = raw_settings["spectro_pipelined"]  # bool
+            self.settings["spectro_archive"] = raw_settings["spectro_archive"]  # bool
             self.settings["drainchannel"] = ""  # PLACEHOLDER FIXME:
 
             # Parse numeric fields
@@ -370,6 +384,7 @@ class specSMU_GUI(QWidget):
             self.settings["delay"] = float(raw_settings["delay"])
             self.settings["pause"] = float(raw_settings["pause"])
             self.settings["spectro_pause_time"] = float(raw_settings["spectro_pause_time"])  # should already be float from double spin box
+            self.settings["spectro_trigger_line"] = int(raw_settings["spectro_trigger_line"])
 
             self._log_verbose("Settings successfully parsed and validated")
         except ValueError as e:
@@ -398,8 +413,26 @@ class specSMU_GUI(QWidget):
             self._log_verbose("No spectrometer selected")
             return [1, {"Error message": "No spectrometer selected"}]
 
+        # Additional spectrometers, captured together with the selected one
+        self.group_settings = {}
+        for name in self.settings["spectrometer_group"]:
+            if name not in self.function_dict["spectrometer"]:
+                return [1, {"Error message": f"Spectrometer plugin {name} in 'Also capture with' is not available"}]
+            if "spectrometerGetScan" not in self.function_dict["spectrometer"][name]:
+                return [3, {"Error message": f"Spectrometer plugin {name} does not provide spectrometerGetScan"}]
+            [status, member_settings] = self.function_dict["spectrometer"][name]["parse_settings_widget"]()
+            if status:
+                self._log_verbose(f"Error in spectrometer plugin {name} settings: {member_settings}")
+                return [2, member_settings]
+            if member_settings.get("integrationtimetype") == "auto":
+                return [1, {"Error message": f"Spectrometer {name}: auto integration time is only supported for the main spectrometer"}]
+            self.group_settings[name] = member_settings
+        if self.group_settings and self.settings["mode"] == "triggered":
+            return [1, {"Error message": "Additional spectrometers can not be used in triggered mode"}]
+
         self.settings["smu_settings"] = self.smu_settings
         self.settings["spectrometer_settings"] = self.spectrometer_settings
+        self.settings["group_settings"] = self.group_settings
 
         self._log_verbose("Exiting parse_settings_widget with success")
         return [0, self.settings]
@@ -410,6 +443,7 @@ class specSMU_GUI(QWidget):
         self.settings = copy.deepcopy(settings)
         self.smu_settings = self.settings["smu_settings"]
         self.spectrometer_settings = self.settings["spectrometer_settings"]
+        self.group_settings = self.settings.get("group_settings", {})
 
     # this function is called not from the main thread. Direct addressing of qt elements not from te main thread causes segmentation fault crash. Using a signal-slot interface between different threads should make it work
     #        self._setGUIfromSettings()
@@ -434,6 +468,17 @@ class specSMU_GUI(QWidget):
         if status:
             self._log_verbose(f"Error connecting Spectrometer: {message}")
             return [status, message]
+        connected = [spectro_name]
+        for name, member_settings in self.group_settings.items():
+            self.function_dict["spectrometer"][name]["setSettings"](member_settings)
+            [status, message] = self.function_dict["spectrometer"][name]["spectrometerConnect"]()
+            if status:
+                self._log_verbose(f"Error connecting Spectrometer {name}: {message}")
+                self.function_dict["smu"][smu_name]["smu_disconnect"]()
+                for connected_name in connected:
+                    self.function_dict["spectrometer"][connected_name]["spectrometerDisconnect"]()
+                return [status, message]
+            connected.append(name)
 
         try:
             self._log_verbose("inside try block of sequenceStep")
@@ -445,13 +490,14 @@ class specSMU_GUI(QWidget):
             return [1, {"Error message": "SpecSMU plugin: error in seq implementation", "Exception": str(e)}]
         finally:
             self.function_dict["smu"][smu_name]["smu_disconnect"]()
-            self.function_dict["spectrometer"][spectro_name]["spectrometerDisconnect"]()
+            for name in connected:
+                self.function_dict["spectrometer"][name]["spectrometerDisconnect"]()
 
     def smuInit(self):
         self._log_verbose("Entering smuInit")
         s = {}
 
-        s["pulse"] = self.settings["mode"] == "pulsed"  # pulsed mode: may be True or False
+        s["pulse"] = self.settings["mode"] in ("pulsed", "triggered")  # pulsed mode: may be True or False
         s["source"] = self.settings["channel"]  # may take values depending on the channel names in smu, e.g. for Keithley 2612B [smua, smub]
         s["drain"] = self.settings["drainchannel"]
         s["type"] = "v" if self.settings["inject"] == "voltage" else "i"  # source inject current or voltage: may take values [i ,v]
@@ -485,23 +531,102 @@ class specSMU_GUI(QWidget):
 
     def _SpecSMUImplementation(self):
         self._log_verbose("Entering _SpecSMUImplementation")
-        smu_name = self.settings["smu"]
-        spectro_name = self.settings["spectrometer"]
         status, state = self.smuInit()
         assert status == 0, f"Error in initializing SMU: {state}"
+        if self.settings["mode"] == "triggered":
+            missing = [f for f in ("smu_runTriggeredPulse", "smu_readTriggeredPulse") if f not in self.function_dict["smu"][self.settings["smu"]]]
+            missing += [f for f in ("spectrometerArmTrigger",) if f not in self.function_dict["spectrometer"][self.settings["spectrometer"]]]
+            if missing:
+                raise RuntimeError(f"SpecSMU: triggered mode is not supported by the selected plugins, missing {missing}")
+        group = None
+        if self.group_settings:
+            # additional spectrometers use the integration time set in their own plugin
+            for name, member_settings in self.group_settings.items():
+                status, state = self.function_dict["spectrometer"][name]["spectrometerSetIntegrationTime"](float(member_settings["integrationTime"]))
+                if status:
+                    raise RuntimeError(f"SpecSMU: can not set integration time of {name}: {state}")
+            names = [self.settings["spectrometer"]] + list(self.group_settings)
+            group = SpectrometerGroup({name: self.function_dict["spectrometer"][name] for name in names})
+        # in pipelined mode files are written by a background thread and the next point is prepared during the pause
+        writer = AsyncFileWriter(name="SpecSMU writer") if self.settings.get("spectro_pipelined", False) else None
+        # in archive mode all spectra of the run go to one archive per spectrometer instead of a csv per point
+        archives = {}
+        try:
+            if self.settings.get("spectro_archive", False):
+                archives[self.settings["spectrometer"]] = self._open_archive()
+                for name in self.group_settings:
+                    archives[name] = self._open_archive(name)
+            self._SpecSMULoop(writer, archives, group)
+        finally:
+            if writer is not None:
+                self._log_verbose(f"Waiting for {writer.pending} spectra to be written")
+                writer.close()
+                for job_name, error in writer.errors:
+                    self.logger.log_warn(f"Background writer: {job_name} failed: {error}")
+            for archive in archives.values():
+                archive.close()
+            if group is not None:
+                group.close()
+        if writer is not None and writer.errors:
+            raise RuntimeError(f"SpecSMU: {len(writer.errors)} spectra could not be saved, see log")
+        self._log_verbose("Exiting _SpecSMUImplementation")
+        return 0
+
+    def _open_archive(self, member: Optional[str] = None) -> SpectralArchiveWriter:
+        """Create the archive for this run, named after the spectrometer filename.
+
+        Args:
+            member (str, optional): additional spectrometer of the group, its archive name ends with _<plugin name>.
+        """
+        spectro_name = member or self.settings["spectrometer"]
+        spectro_functions = self.function_dict["spectrometer"][spectro_name]
+        if "spectrometerGetWavelength" not in spectro_functions:
+            raise RuntimeError(f"SpecSMU: spectrometer plugin {spectro_name} does not provide spectrometerGetWavelength, can not save to archive")
+        status, wavelength = spectro_functions["spectrometerGetWavelength"]()
+        if status:
+            raise RuntimeError(f"SpecSMU: can not get wavelength axis for archive: {wavelength}")
+        header = {
+            "samplename": self.spectrometer_settings["samplename"],
+            "comment": self.spectrometer_settings["comment"],
+            "triggermode": 1 if self.spectrometer_settings["externalTrigger"] else 0,
+            "csv_name_format": "{name}_{setpoint:.4f} iv.csv",  # same names as the csv files written by createFile
+            "settings": self.settings,
+        }
+        if member:
+            header["spectrometer"] = member
+            header["integrationtime"] = float(self.group_settings[member]["integrationTime"])
+        path = archive_path(self.spectrometer_settings["address"], self.spectrometer_settings["filename"] + (f"_{member}" if member else ""))
+        self._log_verbose(f"Saving spectra to archive {path}")
+        return SpectralArchiveWriter(path, wavelength, header=header)
+
+    def _SpecSMULoop(self, writer: Optional[AsyncFileWriter], archives: dict, group: Optional[SpectrometerGroup] = None):
+        """Measurement loop over the SMU setpoints.
+
+        Args:
+            writer: background writer in pipelined mode, None to save directly.
+            archives (dict): plugin name -> archive in archive mode, empty to save csv files.
+            group: all spectrometers of the run if additional ones are used. They scan concurrently and share the timestamp.
+        """
+        smu_name = self.settings["smu"]
+        spectro_name = self.settings["spectrometer"]
         smuLoop = self.settings["points"]
         if smuLoop > 1:
             smuChange = (self.settings["end"] - self.settings["start"]) / (smuLoop - 1)
         else:
             smuChange = 0
         specFilename = self.spectrometer_settings["filename"]
+        prefetched_value = None  # SMU value already set during the previous pause
         # iterate over the SMU loop steps
         for smuLoopStep in range(smuLoop):
             smuSetValue = self.settings["start"] + smuLoopStep * smuChange
-            self._log_verbose(f"Setting SMU output to {smuSetValue}")
-            # set output on SMU
-            self.function_dict["smu"][smu_name]["smu_setOutput"](self.settings["channel"], "v" if self.settings["inject"] == "voltage" else "i", smuSetValue)
-            self._log_verbose("SMU output set")
+            if prefetched_value is not None and np.isclose(prefetched_value, smuSetValue):
+                self._log_verbose(f"SMU output already set to {smuSetValue} during previous pause")
+            else:
+                self._log_verbose(f"Setting SMU output to {smuSetValue}")
+                # set output on SMU
+                self.function_dict["smu"][smu_name]["smu_setOutput"](self.settings["channel"], "v" if self.settings["inject"] == "voltage" else "i", smuSetValue)
+                self._log_verbose("SMU output set")
+            prefetched_value = None
             integration_time_setting = float(self.spectrometer_settings["integrationTime"])
             status, integration_time_seconds = self.function_dict["spectrometer"][spectro_name]["spectrometerGetIntegrationTime"]()
             integration_time = integration_time_seconds
@@ -524,8 +649,8 @@ class specSMU_GUI(QWidget):
                     self._log_verbose(f"Using last valid integration time as initial guess for AutoTime: {self.last_integration_time}")
                     last_integration_time = self.last_integration_time
 
-                # check mode, pulse or continuous
-                if self.settings["mode"] == "pulsed":
+                # check mode, pulse or continuous. Auto time in triggered mode uses host timed pulses
+                if self.settings["mode"] in ("pulsed", "triggered"):
                     # "Abandon all hope, ye who enter here"
                     status, auto_time = self.function_dict["spectrometer"][spectro_name]["getAutoTime"](
                         external_action=self.function_dict["smu"][smu_name]["smu_outputON"],
@@ -533,11 +658,12 @@ class specSMU_GUI(QWidget):
                         external_cleanup=self.function_dict["smu"][smu_name]["smu_outputOFF"],
                         pause_duration=self.settings["pause"],
                         last_integration_time=last_integration_time,
+                        setpoint=smuSetValue,
                     )
                 else:
                     # continuous mode, just set the output on and get the auto time
                     self.function_dict["smu"][smu_name]["smu_outputON"](self.settings["channel"])
-                    status, auto_time = self.function_dict["spectrometer"][spectro_name]["getAutoTime"](last_integration_time=last_integration_time)
+                    status, auto_time = self.function_dict["spectrometer"][spectro_name]["getAutoTime"](last_integration_time=last_integration_time, setpoint=smuSetValue)
 
                 # Depending on the branch, auto_time may be None if getAutoTime failed
                 if status == 0:
@@ -570,41 +696,61 @@ class specSMU_GUI(QWidget):
                 self._log_verbose(f"Not changing integration time, current {integration_time} is close to setting {integration_time_setting}")
                 self._log_verbose(f"Integ time determined with mode: {self.spectrometer_settings['integrationtimetype']}")
 
-            # integration time set, smu ready, spectrometer ready:
-            self.function_dict["smu"][smu_name]["smu_outputON"](self.settings["channel"])  # output on
-
-            # pause before any measurements if spectro_pause is set
-            if self.settings["spectro_pause"]:
-                self._log_verbose(f"Pausing for {self.settings['spectro_pause_time']} seconds before reading spectrum")
-                time.sleep(self.settings["spectro_pause_time"])
-
-            # if checkbox for before and after is set:
-            after_flag = self.settings["spectro_check_after"]
-            if after_flag:
-                # IV before spectrum
-                status, sourceIV_before = self.function_dict["smu"][smu_name]["smu_getIV"](self.settings["channel"])
-
-            # spectrum
-            status, spectrum = self.function_dict["spectrometer"][spectro_name]["spectrometerGetScan"]()
-            if status:
-                self._log_verbose(f"Error getting spectrum: {spectrum}")
-                raise NotImplementedError(f"Error in getting spectrum: {spectrum}, no handling provided")
+            if self.settings["mode"] == "triggered":
+                # pulse and exposure are timed by the SMU, the IV is measured during the exposure
+                after_flag = False
+                spectrum, sourceIV_after = self._triggered_point(smuSetValue, integration_time_setting)
+                scan_timestamp = time.time()
+            else:
+                # integration time set, smu ready, spectrometer ready:
+                self.function_dict["smu"][smu_name]["smu_outputON"](self.settings["channel"])  # output on
+
+                # pause before any measurements if spectro_pause is set
+                if self.settings["spectro_pause"]:
+                    self._log_verbose(f"Pausing for {self.settings['spectro_pause_time']} seconds before reading spectrum")
+                    time.sleep(self.settings["spectro_pause_time"])
+
+                # if checkbox for before and after is set:
+                after_flag = self.settings["spectro_check_after"]
+                if after_flag:
+                    # IV before spectrum
+                    status, sourceIV_before = self.function_dict["smu"][smu_name]["smu_getIV"](self.settings["channel"])
+
+                # spectrum
+                if group is not None:
+                    # all spectrometers at once, the point takes as long as the slowest exposure
+                    scan_timestamp, group_spectra = group.capture()
+                    spectrum = group_spectra[spectro_name]
+                else:
+                    status, spectrum = self.function_dict["spectrometer"][spectro_name]["spectrometerGetScan"]()
+                    if status:
+                        self._log_verbose(f"Error getting spectrum: {spectrum}")
+                        raise NotImplementedError(f"Error in getting spectrum: {spectrum}, no handling provided")
+                    scan_timestamp = time.time()
 
-            # IV after spectrum
-            status, sourceIV_after = self.function_dict["smu"][smu_name]["smu_getIV"](self.settings["channel"])
-            time.sleep(0.02)
-            self.function_dict["smu"][smu_name]["smu_outputOFF"]()
+                # IV after spectrum
+                status, sourceIV_after = self.function_dict["smu"][smu_name]["smu_getIV"](self.settings["channel"])
+                time.sleep(0.02)
+                self.function_dict["smu"][smu_name]["smu_outputOFF"]()
 
             # scan finished, now time to sleep if in pulsed mode
-            if self.settings["mode"] == "pulsed":
-                self._log_verbose(f"Sleeping for {self.settings['pause']} seconds in pulsed mode")
-                time.sleep(self.settings["pause"])
+            if self.settings["mode"] in ("pulsed", "triggered"):
+                pause_start = time.perf_counter()
+                if writer is not None and self.settings["mode"] == "pulsed" and smuLoopStep + 1 < smuLoop:
+                    # the output is off, so the next level can be set during the pause
+                    prefetched_value = self._prefetch_next_point(self.settings["start"] + (smuLoopStep + 1) * smuChange)
+                remaining = self.settings["pause"] - (time.perf_counter() - pause_start)
+                self._log_verbose(f"Sleeping for {remaining} seconds in pulsed mode")
+                if remaining > 0:
+                    time.sleep(remaining)
 
             # saving the results
             varDict = {}
             varDict["integrationtime"] = integration_time_setting
             varDict["triggermode"] = 1 if self.spectrometer_settings["externalTrigger"] else 0
             varDict["name"] = self.spectrometer_settings["samplename"]
+            varDict["timestamp"] = scan_timestamp  # shared by all spectrometers of the group, as in the archive
+            i_before, v_before = None, None
             if after_flag:
                 # sourceIV is returned as a tuple (i, v, readings)
                 i_before, v_before = sourceIV_before
@@ -616,12 +762,68 @@ class specSMU_GUI(QWidget):
 
             varDict["comment"] = self.spectrometer_settings["comment"] + " " + readings
             address = self.spectrometer_settings["address"] + os.sep + self.spectrometer_settings["filename"]
-            self.function_dict["spectrometer"][spectro_name]["createFile"](varDict=varDict, filedelimeter=";", address=address, data=spectrum)
+            # (plugin name, spectrum, integration time, csv address)
+            results = [(spectro_name, spectrum, integration_time_setting, address)]
+            if group is not None:
+                for name, member_settings in self.group_settings.items():
+                    member_address = self.spectrometer_settings["address"] + os.sep + specFilename + f"_{name}_{smuSetValue:.4f}" + " iv.csv"
+                    results.append((name, group_spectra[name], float(member_settings["integrationTime"]), member_address))
+            for name, result_spectrum, result_integration_time, result_address in results:
+                if archives:
+                    save = archives[name].append
+                    save_kwargs = dict(spectrum=result_spectrum, timestamp=scan_timestamp, setpoint=smuSetValue, integrationtime=result_integration_time, i_before=i_before, v_before=v_before, i_after=i_after, v_after=v_after)
+                else:
+                    save = self.function_dict["spectrometer"][name]["createFile"]
+                    save_kwargs = dict(varDict=dict(varDict, integrationtime=result_integration_time), filedelimeter=";", address=result_address, data=result_spectrum)
+                if writer is not None:
+                    writer.submit(save, **save_kwargs)
+                else:
+                    save(**save_kwargs)
 
             # updating the internal state of last integration time
             self.last_integration_time = integration_time_setting
-        self._log_verbose("Exiting _SpecSMUImplementation")
-        return 0
+
+    def _triggered_point(self, level: float, integration_time: float):
+        """One hardware timed point: the spectrometer is armed for external trigger, the SMU pulse emits a TTL on a digio line
+        when the pulse level is reached (after spectro_pause_time if pause is set) and ends integration time later.
+
+        Returns:
+            (spectrum, [i, v]) with the IV measured by the SMU during the exposure
+        """
+        smu_functions = self.function_dict["smu"][self.settings["smu"]]
+        spectro_functions = self.function_dict["spectrometer"][self.settings["spectrometer"]]
+        status, state = spectro_functions["spectrometerArmTrigger"]()
+        if status:
+            raise RuntimeError(f"SpecSMU: can not arm spectrometer trigger: {state}")
+        pulse = {
+            "source": self.settings["channel"],
+            "type": "v" if self.settings["inject"] == "voltage" else "i",
+            "level": level,
+            "pulsewidth": integration_time + self._TRIGGER_MARGIN,
+            "triggerdelay": self.settings["spectro_pause_time"] if self.settings["spectro_pause"] else 0,
+            "digio": self.settings["spectro_trigger_line"],
+        }
+        self._log_verbose(f"Triggered pulse: {pulse}")
+        try:
+            status, state = smu_functions["smu_runTriggeredPulse"](pulse)
+            if status:
+                raise RuntimeError(f"SpecSMU: can not run triggered pulse: {state}")
+            status, spectrum = spectro_functions["spectrometerGetSpectrum"]()
+            if status:
+                raise RuntimeError(f"SpecSMU: error getting triggered spectrum: {spectrum}")
+            status, reading = smu_functions["smu_readTriggeredPulse"](self.settings["channel"])
+            if status:
+                raise RuntimeError(f"SpecSMU: error reading triggered pulse: {reading}")
+        finally:
+            # the pulse ends at the idle level with the output on, switch it off between points as in the other modes
+            smu_functions["smu_outputOFF"]()
+        return spectrum, reading[:2]
+
+    def _prefetch_next_point(self, next_value: float) -> float:
+        """Set the SMU level for the next point while the output is off. Returns the value that was set."""
+        self._log_verbose(f"Prefetch: setting SMU output to {next_value} for the next point")
+        self.function_dict["smu"][self.settings["smu"]]["smu_setOutput"](self.settings["channel"], "v" if self.settings["inject"] == "voltage" else "i", next_value)
+        return next_value
 
     def set_dependencies(self, dependencies: list) -> None:
         """
@@ -647,6 +849,7 @@ class specSMU_GUI(QWidget):
         settings = {}
         settings["smu"] = self.settingsWidget.smuBox.currentText()
         settings["spectrometer"] = self.settingsWidget.spectrometerBox.currentText()
+        settings["spectrometer_group"] = self.settingsWidget.spectrometerGroup.text()
         settings["channel"] = self.settingsWidget.comboBox_channel.currentText()
         settings["inject"] = self.settingsWidget.comboBox_inject.currentText()
         settings["mode"] = self.settingsWidget.comboBox_mode.currentText()
@@ -663,5 +866,8 @@ class specSMU_GUI(QWidget):
         settings["spectro_check_after"] = self.settingsWidget.spectro_check_after.isChecked()
         settings["spectro_pause"] = self.settingsWidget.spectro_pause.isChecked()
         settings["spectro_pause_time"] = self.settingsWidget.spectro_pause_time.value()
+        settings["spectro_trigger_line"] = self.settingsWidget.spectro_trigger_line.value()
         settings["spectro_use_last_integ"] = self.settingsWidget.spectro_use_last_integ.isChecked()
+        settings["spectro_pipelined"] = self.settingsWidget.spectro_pipelined.isChecked()
+        settings["spectro_archive"] = self.settingsWidget.spectro_archive.isChecked()
         return settings
@@ -9,12 +9,23 @@ import time
 THORSPEC_VID = 0x1313
 THORSPEC_PID = 0x8087
 
+# number of USB buffers scans are read into in turn. A raw frame stays valid until RAW_RING_SIZE - 1 more scans are read.
+RAW_RING_SIZE = 4
+
+# longest wait for the device to become idle after opening, it may still be re-enumerating or finishing a scan
+OPEN_IDLE_TIMEOUT = 3  # s
+
 
 class CCSDRV:
     #    def __init__(self):
     #
     #    	return 0
 
+    integration_time = const.CCS_SERIES_DEF_INT_TIME  # s, last value sent to the device
+    _raw_ring = None  # preallocated USB buffers, created on first use
+    _raw_views = None  # uint16 views of _raw_ring, no copies
+    _raw_index = -1  # index of the buffer holding the last raw frame
+
     def open(
         self,
         spectrometerVID,
@@ -38,9 +49,16 @@ class CCSDRV:
             if "SCAN_IDLE" not in state:
                 # FIXME: This is a workaround for the device not being in idle state
                 # after opening connection for first time. Look into reset.
-                time.sleep(3)
-                self.start_scan()
-                self.get_scan_data()
+                # Wait until it is idle or has a scan to hand over, usually much shorter than the full timeout.
+                deadline = time.monotonic() + OPEN_IDLE_TIMEOUT
+                interval = 0.005
+                while not {"SCAN_IDLE", "SCAN_TRANSFER"} & set(state) and time.monotonic() < deadline:
+                    time.sleep(interval)
+                    interval = min(interval * 2, 0.1)
+                    state = self.get_device_status()
+                if "SCAN_IDLE" not in state:
+                    self.start_scan()
+                    self.get_scan_data()
             return True
         return False
 
@@ -130,6 +148,12 @@ class CCSDRV:
         self.integration_time = intg_time
         return True
 
+    def scan_ready(self) -> bool:
+        """True when a finished scan is waiting to be read. Cheaper than get_device_status for polling."""
+        readTo = usb.util.create_buffer(2)
+        self.io.control_in(const.CCS_SERIES_RCMD_GET_STATUS, readTo)
+        return bool(np.frombuffer(readTo, dtype=np.int16)[0] & const.CCS_SERIES_STATUS_SCAN_TRANSFER)
+
     def get_device_status(self, debug=False):
         """Gets device status and parses the status bytes
 
@@ -203,48 +227,49 @@ class CCSDRV:
     def _get_raw_data(self) -> np.ndarray:
         """Retrieve raw scan data from the device buffer.
 
-        The raw scan data is read from the device as a NumPy array of type np.uint16.
+        The scan is read into the next buffer of a preallocated ring, nothing is allocated or copied per scan.
 
         Returns:
-            np.ndarray: Raw scan data as a NumPy array of type np.uint16.
+            np.ndarray: Raw scan data as a NumPy array of type np.uint16. This is a view of the ring buffer,
+            it is overwritten after RAW_RING_SIZE more scans.
         """
-        # Calculate size of read and create a buffer to read into
-        buffer_size = const.CCS_SERIES_NUM_RAW_PIXELS * 2  # since uint16 is 2 bytes
-        buffer = usb.util.create_buffer(buffer_size)
-        # Read to buffer and convert to uint16
-        self.io.read_raw(buffer)
-        readTo = np.frombuffer(buffer, dtype=np.uint16)
+        if self._raw_ring is None:
+            buffer_size = const.CCS_SERIES_NUM_RAW_PIXELS * 2  # since uint16 is 2 bytes
+            self._raw_ring = [usb.util.create_buffer(buffer_size) for _ in range(RAW_RING_SIZE)]
+            self._raw_views = [np.frombuffer(buffer, dtype=np.uint16) for buffer in self._raw_ring]
+        self._raw_index = (self._raw_index + 1) % RAW_RING_SIZE
+        # Read to buffer, the uint16 view sees the data directly
+        self.io.read_raw(self._raw_ring[self._raw_index])
 
-        return readTo
+        return self._raw_views[self._raw_index]
 
-    def _acquire_raw_scan_data(self, raw: np.ndarray) -> np.ndarray:
+    def _acquire_raw_scan_data(self, raw: np.ndarray, out: np.ndarray = None) -> np.ndarray:
         """Process raw scan data to normalize it.
 
         This method calculates the dark current average, normalizing factor, and processes the raw data to produce normalized scan data.
 
         Args:
             raw (np.ndarray): Raw scan data as a NumPy array of type np.uint16.
+            out (np.ndarray, optional): float64 array of CCS_SERIES_NUM_PIXELS to write the result to. A new array is
+                created if not given, since callers usually keep the returned spectrum.
 
         Returns:
             np.ndarray: Normalized scan data as a NumPy array of type np.float64.
         """
-        # Initialize array for modified data
-        data = np.zeros(const.CCS_SERIES_NUM_PIXELS, dtype=np.float64)
-
-        # Sum the dark pixels
-        dark_com = np.sum(raw[const.DARK_PIXELS_OFFSET : const.DARK_PIXELS_OFFSET + const.NO_DARK_PIXELS])
+        if out is None:
+            out = np.empty(const.CCS_SERIES_NUM_PIXELS, dtype=np.float64)
 
         # Calculate dark current average
-        dark_com /= const.NO_DARK_PIXELS
+        dark_com = raw[const.DARK_PIXELS_OFFSET : const.DARK_PIXELS_OFFSET + const.NO_DARK_PIXELS].mean(dtype=np.float64)
 
         # Calculate normalizing factor
         norm_com = 1.0 / (const.MAX_ADC_VALUE - dark_com)
 
-        # Process raw data
-        for i in range(const.CCS_SERIES_NUM_PIXELS):
-            data[i] = (raw[const.SCAN_PIXELS_OFFSET + i] - dark_com) * norm_com
+        # Process raw data in place: (raw - dark) * norm
+        np.subtract(raw[const.SCAN_PIXELS_OFFSET : const.SCAN_PIXELS_OFFSET + const.CCS_SERIES_NUM_PIXELS], dark_com, out=out)
+        out *= norm_com
 
-        return data
+        return out
 
     def read_eeprom(self, addr, idx, length):
         # Buffers
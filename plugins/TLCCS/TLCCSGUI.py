@@ -39,12 +39,13 @@ from pathvalidate import is_valid_filename
 from PyQt6 import uic
 from PyQt6.QtCore import QObject, pyqtSignal, Qt
 from PyQt6.QtWidgets import QVBoxLayout, QFileDialog
-from MplCanvas import MplCanvas
+from MplCanvas import LiveLinePlot, MplCanvas
 from threadStopped import ThreadStopped, thread_with_exception
 from threading import Lock
 import copy
 
 from TLCCS import CCSDRV
+from spectrometer_components import DarkLibrary, IntegrationTimePredictor, SpectrumAccumulator, SpectrumStream, wait_for_scan
 
 
 class TLCCS_GUI(QObject):
@@ -62,6 +63,15 @@ class TLCCS_GUI(QObject):
         "spectrometerStartScan",
         "spectrometerGetScan",
         "spectrometerGetSpectrum",
+        "spectrometerArmTrigger",
+        "spectrometerGetWavelength",
+        "spectrometerGetAveragedScan",
+        "spectrometerRecordDark",
+        "spectrometerStreamStart",
+        "spectrometerStreamStop",
+        "spectrometerStreamLatest",
+        "spectrometerStreamNextAfter",
+        "spectrometerStreamAverage",
         "createFile",
         "getAutoTime",
     ]  # necessary for descendents of QObject, otherwise _get_public_methods returns a lot of QObject methods
@@ -82,6 +92,8 @@ class TLCCS_GUI(QObject):
     autoValue_min = 0.2  # spectrum value in arb.(?) units
     autoValue_max = 0.8  # spectrum value in arb.(?) units
     intTimeMaxIterations = 10
+    streamCapacity = 64  # frames kept by the continuous scan reader
+    scanTimeout = 2  # s, added to the integration time before a scan is considered lost
 
     ########Functions
     def __init__(self, verbose=False):
@@ -105,13 +117,20 @@ class TLCCS_GUI(QObject):
         self.preview_running = False
         self.integrationTimeChanged = False
         self.scanRunning = False
+        self.stream = None  # SpectrumStream while the device is in continuous scan mode
+        self._previewSequence = -1  # sequence number of the last streamed frame shown in the preview
+        self.scanStartTime = None  # time.monotonic() of the last scan start, None for triggered scans
+        self.lastScanOverhead = None  # s, time from start to data beyond the integration time for the last scan
 
         correction_file = r"SC175_correction"
         self.correction = np.loadtxt(self.path + correction_file)
+        self._preview_factor = self.correction[:, 1] * 1000  # applied to every preview scan
         self._log_verbose(f"Loaded correction data from {correction_file} with shape {self.correction.shape}")
         self.settings = {}
 
         self._scan_lock = Lock()
+        self.autoTimePredictor = IntegrationTimePredictor(self.autoTime_min, self.autoTime_max, self.autoValue_min, self.autoValue_max)
+        self.darkLibrary = DarkLibrary(self.path + "dark_library.npz")
 
     def _log_verbose(self, message):
         """Logs a message if verbose mode is enabled."""
@@ -139,6 +158,9 @@ class TLCCS_GUI(QObject):
 
         self.axes.set_xlim(const.CCS175_MIN_WV, const.CCS175_MAX_WV)  # limits are given by spectral range of the device
 
+        # persistent line, updated by blitting on every preview frame
+        self.previewLine = LiveLinePlot(self.sc, self.axes)
+
         layout = QVBoxLayout()
         layout.addWidget(self.sc._create_toolbar(self.previewWidget))
         layout.addWidget(self.sc)
@@ -153,24 +175,19 @@ class TLCCS_GUI(QObject):
         Returns:
             _type_: _description_
         """
-        [status, info] = self.spectrometerGetScan()
+        if self._streaming():
+            [status, info] = self._streamResult(self._previewFrame)
+        else:
+            [status, info] = self.spectrometerGetScan()
         if status:
             self.scanRunning = False
             return [status, info]
         if self.settings["previewCorrection"]:
-            preview_data = [m * n * 1000 for m, n in zip(info, self.correction[:, 1])]
+            preview_data = info * self._preview_factor
         else:
             preview_data = info
         try:
-            xmin, xmax = self.axes.get_xlim()
-            ymin, ymax = self.axes.get_ylim()
-            self.axes.cla()
-            self.axes.set_xlabel("Wavelength (nm)")
-            self.axes.set_ylabel("Intensity (calib. arb. un.)")
-            self.axes.plot(self.correction[:, 0], preview_data, "b-")
-            self.axes.set_xlim(xmin, xmax)
-            self.axes.set_ylim(ymin, ymax)
-            self.sc.draw()
+            self.previewLine.update(self.correction[:, 0], preview_data)
             self.lastspectrum = [info, self.settings]
             return [0, [self.correction[:, 0], info]]
         except Exception as e:
@@ -259,6 +276,9 @@ class TLCCS_GUI(QObject):
                         self.sleep_time = self.default_timerInterval / 1000
                     else:
                         self.sleep_time = self.settings["integrationTime"]
+                    if not status and not self._streaming():
+                        # continuous scan mode, so the preview gets every frame instead of waiting for single scans
+                        [status, info] = self.spectrometerStreamStart()
                     if status:
                         self.log_message.emit(
                             datetime.now().strftime("%H:%M:%S.%f") + f" : TLCCS plugin : {info}, status = {status}"
@@ -281,6 +301,9 @@ class TLCCS_GUI(QObject):
             return [0, "preview stopped"]
         except ThreadStopped:
             return [0, "preview stopped"]
+        finally:
+            if self._streaming():
+                self.spectrometerStreamStop()
 
     def _setIntTimeAction(self):
         if self.preview_running:  # this function is useful only in preview mode
@@ -353,6 +376,7 @@ class TLCCS_GUI(QObject):
         external_cleanup_args=None,
         pause_duration: float = 0.0,
         last_integration_time: Optional[float] = None,
+        setpoint: Optional[float] = None,
     ) -> tuple[int, float | dict]:
         """
         Calculates the optimal integration time, allowing external actions and cleanup with arguments.
@@ -363,36 +387,25 @@ class TLCCS_GUI(QObject):
             external_cleanup (callable): External cleanup function to execute after auto time calculation.
             external_cleanup_args (tuple): Arguments for the external cleanup function.
             pause_duration (float): Duration to pause after each iteration.
+            last_integration_time (float): Initial guess in seconds, e.g. the result for the previous point. Takes precedence over the per-setpoint cache.
+            setpoint (float): SMU setpoint the search is done for. Results are cached per setpoint and
+                the initial guess for a new setpoint is extrapolated from them.
 
         Returns:
             tuple[int, float | dict]: Status and integration time or error information.
         """
         self._log_verbose("Calculating auto integration time.")
-        low = self.autoTime_min * 1000  # time min ms
-        high = self.autoTime_max * 1000  # time max ms
-        low_spectrum = self.autoValue_min  # min spectrum value
-        high_spectrum = self.autoValue_max  # max spectrum value
-
         if self.settings["integrationtimetype"] == "auto":
-            # initial guess for time if not provided
-            if last_integration_time is None:
-                if self.settings["useintegrationtimeguess"]:
-                    # guess from current value
-                    guessIntTime = self.settings["integrationTime"] * 1000  # ms
-                else:
-                    # guess from min and max
-                    guessIntTime = (self.autoTime_min + self.autoTime_max) / 2 * 1000  # ms
-            # initial guess provided as argument, use that.
-            else:
-                guessIntTime = last_integration_time * 1000  # ms
+            # initial guess: the provided time, then the cached result for the setpoint, then the settings
+            fallback = self.settings["integrationTime"] if self.settings["useintegrationtimeguess"] else None
+            self.autoTimePredictor.start()
+            guessIntTime = self.autoTimePredictor.initial_guess(setpoint, fallback, explicit=last_integration_time)  # s
 
-            # start iterating through integration times using guessIntTime as initial guess
+            # scan, then jump to the integration time predicted from the scans so far
             for iter in range(self.intTimeMaxIterations):
-                self._log_verbose(f"Iteration {iter + 1}: Current guess = {guessIntTime} ms.")
-                self.settings["integrationTime"] = (
-                    guessIntTime / 1000.0
-                )  # needed for keeping self.lastspectrum in order
-                [status, info] = self.spectrometerSetIntegrationTime(guessIntTime / 1000.0)  # s
+                self._log_verbose(f"Iteration {iter + 1}: Current guess = {guessIntTime * 1000} ms.")
+                self.settings["integrationTime"] = guessIntTime  # needed for keeping self.lastspectrum in order
+                [status, info] = self.spectrometerSetIntegrationTime(guessIntTime)  # s
                 if status:
                     self._log_verbose(f"getAutoTime: Failed to set integration time. {status}, {info}")
                     return [status, info]
@@ -411,26 +424,21 @@ class TLCCS_GUI(QObject):
                         self._log_verbose("getAutoTime: External action completed without standard return value")
 
                 [status, info] = self._update_spectrum()
-                self._log_verbose(
-                    f"getAutoTime: Retrieved spectrum with shape {info[1].shape} and max value {max(info[1])}."
-                )
                 if status:
                     self._log_verbose(f"getAutoTime: Failed to update spectrum. {status}, {info}")
                     return [status, info]
+                self._log_verbose(f"getAutoTime: Retrieved spectrum with shape {info[1].shape} and max value {max(info[1])}.")
                 # save the spectrum if needed
                 if self.settings["saveattempts_check"]:
                     varDict = {}
-                    varDict["integrationtime"] = guessIntTime / 1000.0
+                    varDict["integrationtime"] = guessIntTime
                     varDict["triggermode"] = 1 if self.settings["externalTrigger"] else 0
                     varDict["name"] = self.settings["samplename"]
                     varDict["comment"] = self.settings["comment"] + " Auto adjust of integration time."
                     self.createFile(
                         varDict=varDict,
                         filedelimeter=self.filedelimeter,
-                        address=self.settings["address"]
-                        + os.sep
-                        + self.settings["filename"]
-                        + f"_{int(guessIntTime)}ms.csv",
+                        address=self.settings["address"] + os.sep + self.settings["filename"] + f"_{int(guessIntTime * 1000)}ms.csv",
                         data=info[1],
                     )
                 # external cleanup if needed
@@ -452,32 +460,23 @@ class TLCCS_GUI(QObject):
 
                 target = max(info[1])  # target value to optimize
                 # if spectrum is in the range, found good integration time
-                if low_spectrum <= target <= high_spectrum:
-                    self._log_verbose(f"Optimal integration time found: {guessIntTime / 1000.0} seconds.")
-                    return [0, guessIntTime / 1000.0]  # return in seconds
-                # if spectrum is below the range, increase integration time
-                if target < low_spectrum:
-                    self._log_verbose(
-                        f"Spectrum value {target} is below the range ({low_spectrum}), increasing integration time."
-                    )
-                    if guessIntTime >= high:
-                        self._log_verbose(f"Integration time is too high, returning: {guessIntTime / 1000.0} seconds.")
-                        return [1, {"Error message": "Integration time too high"}]
-                    low = guessIntTime
-                # if spectrum is above the range, decrease integration time
-                else:
-                    self._log_verbose(
-                        f"Spectrum value {target} is above the range ({high_spectrum}), decreasing integration time."
-                    )
-                    if guessIntTime <= low:
-                        self._log_verbose(f"Integration time is too low, returning: {guessIntTime / 1000.0} seconds.")
-                        return [1, {"Error message": "Integration time too low"}]
-                    high = guessIntTime
-                # Compute new guess in milliseconds, rounded to nearest millisecond
-                guessIntTime = int(round((low + high) / 2))
-
-            self._log_verbose(f"Auto integration time calculation completed: {guessIntTime / 1000.0} seconds.")
-            return [0, guessIntTime / 1000.0]  # return in seconds
+                if self.autoTimePredictor.in_window(info[1]):
+                    self._log_verbose(f"Optimal integration time found: {guessIntTime} seconds.")
+                    self.autoTimePredictor.store(setpoint, guessIntTime)
+                    return [0, guessIntTime]  # return in seconds
+                # spectrum below the range at the longest allowed time
+                if target < self.autoValue_min and guessIntTime >= self.autoTime_max:
+                    self._log_verbose(f"Integration time is too high, returning: {guessIntTime} seconds.")
+                    return [1, {"Error message": "Integration time too high"}]
+                # spectrum above the range at the shortest allowed time
+                if target > self.autoValue_max and guessIntTime <= self.autoTime_min:
+                    self._log_verbose(f"Integration time is too low, returning: {guessIntTime} seconds.")
+                    return [1, {"Error message": "Integration time too low"}]
+                guessIntTime = self.autoTimePredictor.next_time(guessIntTime, info[1])
+                self._log_verbose(f"Spectrum value {target} is outside the range ({self.autoValue_min}, {self.autoValue_max}), next guess {guessIntTime} seconds.")
+
+            self._log_verbose(f"Auto integration time calculation completed: {guessIntTime} seconds.")
+            return [0, guessIntTime]  # return in seconds
         else:
             self._log_verbose("Integration time mode is not set to auto, cannot calculate auto integration time.")
             return [
@@ -756,6 +755,8 @@ class TLCCS_GUI(QObject):
         self._log_verbose(f"Connecting to spectrometer with integration time: {integrationTime}")
         if integrationTime:
             self.settings["integrationTime"] = integrationTime
+        # auto time results of a previous measurement are not valid for the next one
+        self.autoTimePredictor.clear_cache()
         try:
             status = self.drv.open(const.CCS175_VID, const.CCS175_PID, self.settings["integrationTime"])
             if not status:
@@ -774,6 +775,8 @@ class TLCCS_GUI(QObject):
     def spectrometerDisconnect(self):
         self._log_verbose("Disconnecting spectrometer.")
         try:
+            if self._streaming():
+                self.spectrometerStreamStop()
             self.drv.close()
             self._log_verbose("Spectrometer disconnected successfully.")
             return [0, "OK"]
@@ -784,10 +787,20 @@ class TLCCS_GUI(QObject):
     def spectrometerSetIntegrationTime(self, integrationTime):
         try:
             self._log_verbose(f"Setting integration time to {integrationTime} seconds.")
-            self.drv.set_integration_time(integrationTime)
-            # single scan to make sure the time is correctly set
-            self.drv.start_scan()
-            self.drv.get_scan_data()
+            restartStream = self._streaming()
+            if restartStream:
+                # any command stops the continuous scan, so the reader has to be stopped first
+                [status, info] = self.spectrometerStreamStop()
+                if status:
+                    return [status, info]
+            with self._scan_lock:
+                self.drv.set_integration_time(integrationTime)
+                # single scan to make sure the time is correctly set
+                self.drv.start_scan()
+                self.drv.get_scan_data()
+            if restartStream:
+                self.settings["integrationTime"] = integrationTime
+                return self.spectrometerStreamStart()
 
             return [0, "OK"]
         except ThreadStopped:
@@ -812,12 +825,15 @@ class TLCCS_GUI(QObject):
             _type_: _description_
         """
         self._log_verbose("Starting spectrometer scan.")
+        if self._streaming():
+            return [1, {"Error message": "Spectrometer is streaming, use spectrometerGetScan or the stream functions"}]
         try:
             if self.scanRunning:
                 self._log_verbose("Scan is already running.")
                 self._log_verbose(f"Device status: {self.drv.get_device_status()}")
                 return [1, {"Error message": "Scan is already running"}]
 
+            self.scanStartTime = time.monotonic()
             self.drv.start_scan()
             self.scanRunning = True
             self._log_verbose("Spectrometer scan started successfully.")
@@ -829,6 +845,28 @@ class TLCCS_GUI(QObject):
             self._log_verbose(f"Exception during scan start: {e}")
             return [4, {"Error message": "Can not start scan"}]
 
+    def spectrometerArmTrigger(self):
+        """Arms a single scan that starts on the external trigger input. Collect it with spectrometerGetSpectrum.
+
+        Used for hardware timed measurements where the trigger comes from e.g. a SMU digio line.
+        """
+        self._log_verbose("Arming spectrometer for external trigger.")
+        if self._streaming():
+            return [1, {"Error message": "Spectrometer is streaming, stop the stream before arming the trigger"}]
+        try:
+            if self.scanRunning:
+                self._log_verbose("Scan is already running.")
+                return [1, {"Error message": "Scan is already running"}]
+            self.drv.start_scan_ext_trigger()
+            self.scanStartTime = None  # the exposure starts with the trigger
+            self.scanRunning = True
+            return [0, "OK"]
+        except ThreadStopped:
+            return [0, "ThreadStopped"]
+        except Exception as e:
+            self._log_verbose(f"Exception during arming: {e}")
+            return [4, {"Error message": "Can not arm external trigger"}]
+
     def spectrometerGetSpectrum(self):
         """Reads the spectrum from the spectrometer, waits for the scan to finish if necessary.
 
@@ -836,40 +874,57 @@ class TLCCS_GUI(QObject):
             _type_: _description_
         """
         self._log_verbose("Getting spectrum from spectrometer.")
-        self._log_verbose(f"Device status: {self.drv.get_device_status()}")
 
         try:
-            while self.scanRunning:
-                if "SCAN_TRANSFER" not in self.drv.get_device_status():
-                    self._log_verbose("Waiting for scan to finish.")
-                    time.sleep(self.settings["integrationTime"])
-                else:
-                    break
-            if not self.scanRunning:
+            integrationTime = self.drv.integration_time
+            if self.scanStartTime is None:
+                # triggered scan, the end of the exposure is not known
+                deadline = None
+                timeout = None
+            else:
+                deadline = self.scanStartTime + integrationTime
+                timeout = deadline + self.scanTimeout
+            if not wait_for_scan(self.drv.scan_ready, deadline, timeout, cancelled=lambda: not self.scanRunning):
                 self._log_verbose("Scan stopped before completion.")
                 return [1, {"Error message": "Scan stopped"}]
+            data = self.drv.get_scan_data()
+            self.scanRunning = False
+            if self.scanStartTime is not None:
+                self.lastScanOverhead = time.monotonic() - self.scanStartTime - integrationTime
+                self._log_verbose(f"Spectrum retrieved, {integrationTime:.4f} s exposure, overhead {self.lastScanOverhead * 1000:.1f} ms.")
             else:
-                self._log_verbose("Spectrum retrieved successfully.")
-                return [0, self.drv.get_scan_data()]
+                self._log_verbose("Triggered spectrum retrieved.")
+            return [0, data]
         except ThreadStopped:
             pass
+        except TimeoutError as e:
+            self._log_verbose(f"Scan did not finish: {e}")
+            self.scanRunning = False
+            return [4, {"Error message": f"Scan did not finish within {self.scanTimeout} s after the integration time"}]
         except Exception as e:
             self._log_verbose(f"Exception during spectrum retrieval: {e}")
             self.scanRunning = False
             return [4, {"Error message": "Can not get spectrum"}]
 
     def spectrometerGetScan(self):
-        """Atomically get a spectrum to prevent weird behavior when a scan is already running."""
-        # with self._scan_lock:
+        """Atomically get a spectrum to prevent weird behavior when a scan is already running.
+
+        While streaming, returns the first frame exposed after the call instead of starting a scan.
+        """
+        if self._streaming():
+            [status, info] = self.spectrometerStreamNextAfter()
+            return [status, info[0]] if not status else [status, info]
         try:
             self._log_verbose("combined start / fetch to get spectrum")
             # No scan running, start a new scan
             self._log_verbose("Starting new scan.")
-            self.drv.start_scan()
-            self._log_verbose(f"Device status: {self.drv.get_device_status()} directly after scan start")
-            data = self.drv.get_scan_data()
-            self._log_verbose(f"Device status immediately after calling get_scan_data: {self.drv.get_device_status()}")
-            self._log_verbose(f"Scan data shape: {data.shape}, max value: {max(data)}")
+            with self._scan_lock:
+                scanStart = time.monotonic()
+                self.drv.start_scan()
+                # the bulk read blocks until the device has the data, no status polling needed
+                data = self.drv.get_scan_data()
+            self.lastScanOverhead = time.monotonic() - scanStart - self.drv.integration_time
+            self._log_verbose(f"Scan data shape: {data.shape}, max value: {data.max()}, overhead {self.lastScanOverhead * 1000:.1f} ms")
             self.scanRunning = False
             return [0, data]
         except ThreadStopped:
@@ -877,6 +932,176 @@ class TLCCS_GUI(QObject):
         except Exception as e:
             return [4, {"Error message": f"Can not get scan: {e}"}]
 
+    def _streaming(self) -> bool:
+        return self.stream is not None and self.stream.running
+
+    def spectrometerStreamStart(self, capacity=None):
+        """Puts the spectrometer in continuous scan mode and starts reading frames in the background at the native rate.
+
+        While streaming, spectrometerGetScan returns streamed frames and spectrometerSetIntegrationTime restarts the stream.
+        Single scans (spectrometerStartScan, spectrometerArmTrigger) are refused until spectrometerStreamStop.
+
+        Args:
+            capacity (int, optional): number of frames kept in the ring buffer. Defaults to streamCapacity.
+        """
+        if self._streaming():
+            return [1, {"Error message": "Spectrum stream is already running"}]
+        if self.scanRunning:
+            return [1, {"Error message": "Scan is already running"}]
+        try:
+            self._log_verbose("Starting continuous scan stream.")
+            with self._scan_lock:
+                self.drv.start_scan_continuous()
+                self._previewSequence = -1
+                self.stream = SpectrumStream(self.drv.get_scan_data, self.settings["integrationTime"], capacity or self.streamCapacity)
+                self.stream.start()
+            return [0, "OK"]
+        except ThreadStopped:
+            return [0, "ThreadStopped"]
+        except Exception as e:
+            self._log_verbose(f"Exception during stream start: {e}")
+            self.stream = None
+            return [4, {"Error message": f"Can not start continuous scan: {e}"}]
+
+    def spectrometerStreamStop(self):
+        """Stops the background reader and takes the spectrometer out of continuous scan mode.
+
+        The stream is cleared only when the device is out of continuous mode, single scans wait for the device lock
+        until then."""
+        if self.stream is None:
+            return [0, "OK"]
+        stream = self.stream
+        try:
+            with self._scan_lock:
+                # the reader finishes the frame being exposed
+                stream.stop(timeout=stream.integration_time + 1)
+                if stream.running:
+                    return [4, {"Error message": "Spectrum stream did not stop, the spectrometer does not respond"}]
+                self._log_verbose(f"Spectrum stream stopped after {stream.count} frames, {stream.overruns} not read.")
+                # any command ends the continuous mode, a single scan leaves the device in a known state
+                self.drv.start_scan()
+                self.drv.get_scan_data()
+                self.stream = None
+            return [0, "OK"]
+        except ThreadStopped:
+            return [0, "ThreadStopped"]
+        except Exception as e:
+            self._log_verbose(f"Exception during stream stop: {e}")
+            return [4, {"Error message": f"Can not stop continuous scan: {e}"}]
+
+    def _previewFrame(self, stream):
+        """Streamed frame following the one shown last, so the preview shows every frame while it keeps up."""
+        frame = stream.next_frame(self._previewSequence)
+        self._previewSequence = frame[0]
+        return frame[3]
+
+    def _streamResult(self, func):
+        """[0, func(stream)], or an error if the stream is not running. The stream is passed to func because
+        spectrometerStreamStop may clear self.stream meanwhile."""
+        stream = self.stream
+        if stream is None or not stream.running:
+            if stream is not None and stream.error is not None:
+                return [4, {"Error message": f"Spectrum stream failed: {stream.error}"}]
+            return [1, {"Error message": "Spectrum stream is not running"}]
+        try:
+            return [0, func(stream)]
+        except TimeoutError as e:
+            return [4, {"Error message": f"{e}"}]
+        except RuntimeError as e:
+            return [4, {"Error message": f"{e}"}]
+
+    def spectrometerStreamLatest(self):
+        """Last streamed frame, does not wait.
+
+        Returns:
+            [status, [spectrum, exposure start, exposure end]], times in time.monotonic() seconds. spectrum is None if no frame has arrived yet.
+        """
+
+        def latest(stream):
+            frame = stream.latest()
+            if frame is None:
+                return [None, None, None]
+            return [frame[3], frame[1], frame[2]]
+
+        return self._streamResult(latest)
+
+    def spectrometerStreamNextAfter(self, t=None, timeout=None):
+        """First streamed frame whose exposure started after t, waits for it.
+
+        Args:
+            t (float, optional): time.monotonic() value. Defaults to now, i.e. the first fresh frame.
+            timeout (float, optional): seconds to wait. Defaults to about three exposures.
+
+        Returns:
+            [status, [spectrum, exposure start, exposure end]]
+        """
+
+        def next_after(stream):
+            frame = stream.next_after(time.monotonic() if t is None else t, timeout)
+            return [frame[3], frame[1], frame[2]]
+
+        return self._streamResult(next_after)
+
+    def spectrometerStreamAverage(self, n, timeout=None):
+        """Mean of the next n streamed frames, e.g. for noise reduction at short integration times."""
+        return self._streamResult(lambda stream: stream.average(n, timeout=timeout))
+
+    def _spectrometerSerial(self) -> str:
+        """Serial number of the connected device, keys the dark library."""
+        try:
+            return str(self.drv.dev.serial_number)
+        except Exception:
+            return "CCS175"
+
+    def spectrometerGetAveragedScan(self, n=1, darkCorrection=False, reference=False):
+        """Mean of n scans at the current integration time, dark corrected on the fly if requested.
+
+        Args:
+            n (int): number of scans.
+            darkCorrection (bool): subtract the dark stored with spectrometerRecordDark for this device and integration time.
+            reference (bool): also divide by the dark corrected reference, gives relative transmission / reflection.
+
+        Returns:
+            [status, [mean, std]]: std is the standard deviation of the single scans per pixel.
+        """
+        if n < 1:
+            return [1, {"Error message": "Number of scans must be positive"}]
+        serial = self._spectrometerSerial()
+        integrationTime = self.drv.integration_time
+        if darkCorrection or reference:
+            for kind in ("dark", "reference") if reference else ("dark",):
+                if self.darkLibrary.get(serial, integrationTime, kind) is None:
+                    return [1, {"Error message": f"No {kind} recorded for {serial} at {integrationTime} s"}]
+        accumulator = SpectrumAccumulator()
+        for _ in range(n):
+            [status, data] = self.spectrometerGetScan()
+            if status or isinstance(data, str):
+                return [status, data]
+            if darkCorrection or reference:
+                data = self.darkLibrary.correct(data, serial, integrationTime, reference)
+            accumulator.add(data)
+        self._log_verbose(f"Averaged {n} scans, dark correction: {darkCorrection}, reference: {reference}")
+        return [0, [accumulator.mean, accumulator.std]]
+
+    def spectrometerRecordDark(self, n=1, kind="dark"):
+        """Averages n scans and stores them as dark (or reference, kind="reference") for this device and the current
+        integration time. The library is kept in dark_library.npz in the plugin directory."""
+        if kind not in DarkLibrary.KINDS:
+            return [1, {"Error message": f"Unknown spectrum kind {kind}"}]
+        [status, info] = self.spectrometerGetAveragedScan(n)
+        if status or isinstance(info, str):
+            return [status, info]
+        try:
+            self.darkLibrary.store(self._spectrometerSerial(), self.drv.integration_time, info[0], kind)
+            return [0, "OK"]
+        except Exception as e:
+            self._log_verbose(f"Exception during storing the {kind}: {e}")
+            return [4, {"Error message": f"Can not store the {kind}: {e}"}]
+
+    def spectrometerGetWavelength(self):
+        """Returns the wavelength axis in nm used when saving spectra, one value per pixel."""
+        return [0, self.correction[:, 0]]
+
     ########Functions
     ###############save data
 
@@ -886,7 +1111,7 @@ class TLCCS_GUI(QObject):
         self._log_verbose(f"Correction data has shape {self.correction.shape}")
         np.savetxt(
             address,
-            list(zip(self.correction[:, 0], data)),
+            np.column_stack((self.correction[:, 0], data)),
             fmt="%.9e",
             delimiter=filedelimeter,
             newline="\n",
@@ -906,6 +1131,7 @@ class TLCCS_GUI(QObject):
         # varDict['triggermode'] - external trigger = 1 / internal = 0
         # varDict['name'] - str:sample name
         # varDict['comment'] - str:comment
+        # varDict['timestamp'] - float:time.time() of the scan, optional
         comment = "Thorlabs FTS operated by pyIVSL\n"
         comment = f"{comment}#[SpectrumHeader]\n"
         comment = f"{comment}Date{separator}{datetime.now().strftime('%Y%m%d')}\n"
@@ -947,5 +1173,7 @@ class TLCCS_GUI(QObject):
             comment = f'{comment}Comment{separator}"{varDict["comment"]}"\n'
         else:
             comment = f'{comment}Comment{separator} ""\n'
+        if "timestamp" in varDict:
+            comment = f"{comment}Timestamp{separator}{varDict['timestamp']}\n"
         comment = f"{comment}#[Data]\n"
         return comment
@@ -0,0 +1,113 @@
+"""
+Benchmark of the host side of a TLCCS scan: reading the raw frame from USB, normalization and preview correction.
+
+The device is replaced by a recorded raw frame that read_raw copies into the buffer, so only the Python/numpy work is timed.
+Compares the previous implementation (new USB buffer per scan, per-pixel loop, list comprehension correction)
+with the current one (ring of preallocated buffers, vectorized normalization and correction).
+
+Usage (from this directory):
+    python TLCCS_benchmark.py                       # synthetic frame
+    python TLCCS_benchmark.py --frame raw.npy       # recorded frame (uint16, CCS_SERIES_NUM_RAW_PIXELS values)
+    python TLCCS_benchmark.py --record raw.npy      # record a frame from a connected CCS175, then benchmark it
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import usb
+
+import TLCCS_const as const
+from TLCCS import CCSDRV
+
+
+class RecordedIO:
+    """Stands in for LLIO: read_raw copies the recorded frame into the buffer."""
+
+    def __init__(self, frame: np.ndarray):
+        self.frame = np.ascontiguousarray(frame, dtype=np.uint16).tobytes()
+
+    def read_raw(self, readTo):
+        memoryview(readTo).cast("B")[:] = self.frame
+
+
+def synthetic_frame() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    frame = rng.integers(900, 1100, const.CCS_SERIES_NUM_RAW_PIXELS).astype(np.uint16)
+    x = np.arange(const.CCS_SERIES_NUM_PIXELS)
+    frame[const.SCAN_PIXELS_OFFSET : const.SCAN_PIXELS_OFFSET + const.CCS_SERIES_NUM_PIXELS] += (30000 * np.exp(-(((x - 1800) / 100) ** 2))).astype(np.uint16)
+    return frame
+
+
+def record_frame(path: str) -> np.ndarray:
+    drv = CCSDRV()
+    if not drv.open(const.CCS175_VID, const.CCS175_PID):
+        raise RuntimeError("Can not connect to spectrometer")
+    try:
+        drv.start_scan()
+        frame = np.array(drv._get_raw_data())
+    finally:
+        drv.close()
+    np.save(path, frame)
+    return frame
+
+
+def legacy_scan(io, correction) -> list:
+    """Scan processing as it was before the ring buffer and vectorization."""
+    buffer = usb.util.create_buffer(const.CCS_SERIES_NUM_RAW_PIXELS * 2)
+    io.read_raw(buffer)
+    raw = np.frombuffer(buffer, dtype=np.uint16)
+    data = np.zeros(const.CCS_SERIES_NUM_PIXELS, dtype=np.float64)
+    dark_com = np.sum(raw[const.DARK_PIXELS_OFFSET : const.DARK_PIXELS_OFFSET + const.NO_DARK_PIXELS])
+    dark_com /= const.NO_DARK_PIXELS
+    norm_com = 1.0 / (const.MAX_ADC_VALUE - dark_com)
+    for i in range(const.CCS_SERIES_NUM_PIXELS):
+        data[i] = (raw[const.SCAN_PIXELS_OFFSET + i] - dark_com) * norm_com
+    return [m * n * 1000 for m, n in zip(data, correction)]
+
+
+def current_scan(drv, preview_factor) -> np.ndarray:
+    data = drv._acquire_raw_scan_data(drv._get_raw_data())
+    return data * preview_factor
+
+
+def scans_per_second(func, duration: float) -> float:
+    func()  # warm up
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        func()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frame", help="recorded raw frame (.npy)")
+    parser.add_argument("--record", help="record a raw frame from the device to this file first")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per measurement")
+    args = parser.parse_args()
+
+    if args.record:
+        frame = record_frame(args.record)
+    elif args.frame:
+        frame = np.load(args.frame)
+    else:
+        frame = synthetic_frame()
+
+    correction = np.loadtxt(os.path.join(os.path.dirname(os.path.abspath(__file__)), "SC175_correction"))[:, 1]
+    io = RecordedIO(frame)
+    drv = CCSDRV()
+    drv.io = io
+
+    np.testing.assert_allclose(current_scan(drv, correction * 1000), legacy_scan(io, correction), rtol=1e-12)
+
+    before = scans_per_second(lambda: legacy_scan(io, correction), args.duration)
+    after = scans_per_second(lambda: current_scan(drv, correction * 1000), args.duration)
+    print(f"before: {before:10.1f} scans/s")
+    print(f"after:  {after:10.1f} scans/s  ({after / before:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
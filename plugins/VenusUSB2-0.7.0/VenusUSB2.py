@@ -1,8 +1,17 @@
+import time
+
 import cv2 as cv
 
+from camera_components import FrameBus, FrameGrabber
+
 
 class VenusUSB2:
-    """Handles communication with the VenusUSB2 camera"""
+    """Handles communication with the VenusUSB2 camera
+
+    While the camera is open, a FrameGrabber reads it continuously and keeps the newest frame. Image captures and the
+    preview thread take frames from the grabber instead of reading the camera. Frames are converted to RGB directly
+    into the buffers of the FrameBus, so all consumers get read-only views of the same frame.
+    """
 
     exposures = [1, 2, 5, 10, 20, 39, 78, 156, 312]
     # exposures = [-12, -11, -10, -9, -8, -7, -6, -5, -4, -3, -2, -1]  # windows interface
@@ -11,10 +20,15 @@ class VenusUSB2:
     cap_height = 768
     full_size_width = 640 * 2
     full_size_height = 480 * 2
+    frame_timeout = 2  # s, waiting for a frame from the grabber
 
     def __init__(self):
         # Initialize cap as empty capture
         self.cap = cv.VideoCapture()
+        self.grabber = None
+        self.bus = FrameBus()
+        self._raw = None  # BGR frame from the camera, reused for every read
+        self._last_buffered = None  # read start of the last frame given to capture_buffered
 
     def open(self, source=None, exposure=None) -> tuple[int, dict]:
         """Opens the camera using current settings.
@@ -24,6 +38,9 @@ class VenusUSB2:
             ~0 - error (add error code later on if needed)
         """
 
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.grabber = None
         if source is None or source == "":
             self.cap.open(0)
         else:
@@ -36,6 +53,9 @@ class VenusUSB2:
             self.cap.set(cv.CAP_PROP_FRAME_WIDTH, self.full_size_width)
             self.cap.set(cv.CAP_PROP_FRAME_HEIGHT, self.full_size_height)
 
+            self.grabber = FrameGrabber(self._read, convert=self._publish, name="VenusUSB2 grabber")
+            self.grabber.start()
+            self._last_buffered = None
             return [0, {"Error message": "OK"}]
         return [4, {"Error message": "Can not open camera"}]
 
@@ -54,43 +74,63 @@ class VenusUSB2:
 
     def close(self):
         """Pretty self explanatory"""
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.grabber = None
         self.cap.release()
 
-    def capture_image(self, source, exposure):
+    def _read(self):
+        ok, frame = self.cap.read() if self._raw is None else self.cap.read(self._raw)
+        if ok:
+            self._raw = frame
+        return ok, frame
+
+    def _publish(self, frame):
+        """Converts the raw frame into a bus buffer, None (frame dropped) if all buffers are held by consumers."""
+        buffer = self.bus.acquire(frame.shape)
+        if buffer is None:
+            return None
+        cv.cvtColor(frame, cv.COLOR_BGR2RGB, dst=buffer)
+        return self.bus.publish(buffer)[1]
+
+    def capture_image(self, source, exposure, newer_than=None, latest=False):
         """Captures an image from the camera. NOTE: returns color image
 
-        Returns:
-            matlike: The captured image as matlike object, in RGB format.
-        """
+        Waits for a frame read entirely after newer_than, skipping the frames buffered by the driver, so an image
+        captured after a move shows the settled sample.
 
-        def get_frame():
-            for _ in range(self.bufferSize):
-                # empty out the buffer
-                self.cap.read()
-            # get the frame
-            ret, frame = self.cap.read()
-            return ret, frame
+        Args:
+            newer_than (float): time.monotonic() value, e.g. when a move finished. Defaults to the time of the call.
+            latest (bool): return the newest grabbed frame at once instead, it may have been exposed before the call.
 
-        # if cap is open, get the frame
-        if self.cap.isOpened():
-            ret, frame = get_frame()
-        else:
+        Returns:
+            matlike: The captured image as matlike object, in RGB format. Read-only view shared with other consumers.
+        """
+        if not self.cap.isOpened() or self.grabber is None:
             status, message = self.open(source, exposure)
             if status != 0:
                 return [status, message]
-            ret, frame = get_frame()
-
-        if not ret:
-            return [4, {"Error message": "Can not read frame from camera"}]
-        frame = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
+        try:
+            if latest:
+                _, _, _, frame = self.grabber.latest(self.frame_timeout)
+            else:
+                if newer_than is None:
+                    newer_than = time.monotonic()
+                _, _, _, frame = self.grabber.next_after(newer_than, self.frame_timeout, skip=self.bufferSize)
+        except (TimeoutError, RuntimeError) as e:
+            return [4, {"Error message": f"Can not read frame from camera: {e}"}]
         return (0, frame)
 
     def capture_buffered(self):
-        ret, frame = self.cap.read()
-        if ret:
-            frame = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
-            status = 0
-        else:
-            status = 4
-            frame = {"Error message": "Can not read frame from camera"}
-        return status, frame
+        """Next frame for the preview, waits for a frame newer than the previous one."""
+        try:
+            if self.grabber is None:
+                raise RuntimeError("camera is not open")
+            if self._last_buffered is None:
+                _, t_start, _, frame = self.grabber.latest(self.frame_timeout)
+            else:
+                _, t_start, _, frame = self.grabber.next_after(self._last_buffered + 1e-9, self.frame_timeout)
+            self._last_buffered = t_start
+            return 0, frame
+        except (TimeoutError, RuntimeError) as e:
+            return 4, {"Error message": f"Can not read frame from camera: {e}"}
@@ -15,7 +15,11 @@ Because of (i) it requires to send log and message signals, i.e. it is a child o
 public API:
 - camera_open() -> "error"
 - camera_close() -> None
-- camera_capture_image() -> image / None
+- camera_capture_image(newer_than=None, latest=False) -> image / None
+- camera_frame_bus() -> FrameBus with the frames of the camera
+- camera_record_around(name, before=None, after=None) -> status, {"clip": name}
+- camera_record_start(name) -> status, {"clip": name}
+- camera_record_stop() -> status, {"written": frames, "dropped": frames}
 
 
 version 0.6
@@ -28,6 +32,7 @@ otsoha
 
 import numpy as np
 import os
+import time
 from pathvalidate import is_valid_filename
 from plugin_components import (
     public,
@@ -41,6 +46,7 @@ from PyQt6.QtWidgets import QFileDialog
 from PyQt6.QtCore import QObject, pyqtSignal, Qt, QThread
 from PyQt6.QtGui import QImage, QPixmap
 from VenusUSB2 import VenusUSB2
+from camera_components import FrameRecorder, PreviewPacer, fit_preview
 
 ##IRtothink#### should some kind of zoom to the image part be added for the preview?
 
@@ -51,13 +57,16 @@ from VenusUSB2 import VenusUSB2
 # It would probably be better to create a single thread or worker for one preview session.
 # but then the new thread would have to be connected again back to the other plugins.
 class CameraThread(QThread):
-    new_frame = pyqtSignal(np.ndarray)
+    new_frame = pyqtSignal(np.ndarray)  # full resolution, for other plugins and saving
+    preview_frame = pyqtSignal(np.ndarray)  # downsampled to preview_size, paced by the render time of the GUI
 
     def __init__(self, camera, interval_ms):
         super().__init__()
         self.camera = camera
         self.interval_ms = interval_ms
         self._running = False
+        self.pacer = PreviewPacer(min_interval=interval_ms / 1000)
+        self.preview_size = None  # (width, height) in device pixels, set by the GUI
         self.finished.connect(self.deleteLater)
 
     def run(self):
@@ -66,6 +75,11 @@ class CameraThread(QThread):
             status, frame = self.camera.capture_buffered()
             if status == 0:
                 self.new_frame.emit(frame)
+                if self.pacer.ready():
+                    # scaling here keeps the GUI thread free, frames are dropped while the GUI is behind
+                    preview = frame if self.preview_size is None else fit_preview(frame, *self.preview_size)
+                    self.pacer.sent()
+                    self.preview_frame.emit(np.ascontiguousarray(preview))
             self.msleep(self.interval_ms)
         # finished when running flag set to false via .stop()
 
@@ -85,6 +99,10 @@ class VenusUSB2GUI(QObject):
         "camera_open",
         "camera_close",
         "camera_capture_image",
+        "camera_frame_bus",
+        "camera_record_around",
+        "camera_record_start",
+        "camera_record_stop",
         "get_thread",
         "connect_to_new_frame_signal",
     ]  # necessary for descendents of QObject, otherwise _get_public_methods returns a lot of QObject methods
@@ -108,7 +126,8 @@ class VenusUSB2GUI(QObject):
         self.previewWidget = uic.loadUi(self.path + "VenusUSB2_previewWidget.ui")
 
         self.settings = {"source": None, "exposure": None}
-        self.q_img = None
+        self.last_frame = None  # full resolution RGB frame of the preview, for saving
+        self.recorder = None  # FrameRecorder, created on the first recording
 
         # Initialize cap as empty capture
         self.camera = VenusUSB2()
@@ -150,19 +169,25 @@ class VenusUSB2GUI(QObject):
         # Camera thread connection will be made when thread is created
 
     def _update_frame(self, frame: np.ndarray):
+        """Shows a preview frame, already downsampled to the label by the camera thread."""
+        start = time.perf_counter()
         label = self.preview_label
+        ratio = label.devicePixelRatioF()
         h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-
+        qt_image = QImage(frame.data, w, h, ch * w, QImage.Format.Format_RGB888)
         pixmap = QPixmap.fromImage(qt_image)
-        scaled_pixmap = pixmap.scaled(
-            label.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation,
-        )
-        label.setPixmap(scaled_pixmap)
-        self.q_img = qt_image  # Store the QImage for saving later
+        if w > label.width() * ratio or h > label.height() * ratio:
+            # the label shrank since the frame was scaled
+            pixmap = pixmap.scaled(label.size() * ratio, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.FastTransformation)
+        pixmap.setDevicePixelRatio(ratio)
+        label.setPixmap(pixmap)
+        thread = self.camera_thread
+        if thread is not None:
+            thread.preview_size = (int(label.width() * ratio), int(label.height() * ratio))
+            thread.pacer.rendered(time.perf_counter() - start)
+
+    def _store_frame(self, frame: np.ndarray):
+        self.last_frame = frame
 
     @public
     def parse_settings_widget(self) -> tuple[int, dict]:
@@ -192,7 +217,10 @@ class VenusUSB2GUI(QObject):
         # Create new thread
         self.camera_thread = CameraThread(self.camera, interval_ms=self.default_timerInterval)
         # Connect the new thread to the local update method
-        self.camera_thread.new_frame.connect(self._update_frame)
+        label = self.preview_label
+        self.camera_thread.preview_size = (int(label.width() * label.devicePixelRatioF()), int(label.height() * label.devicePixelRatioF()))
+        self.camera_thread.preview_frame.connect(self._update_frame)
+        self.camera_thread.new_frame.connect(self._store_frame)
 
         # Emit signal to notify other plugins about the new thread
         self.new_camera_thread.emit(self.camera_thread)
@@ -231,7 +259,9 @@ class VenusUSB2GUI(QObject):
         if status:
             self.logger.info_popup(f"VenusUSB2 plugin : {info['Error message']}")
             return [status, info]
-        self.q_img.save(
+        frame = np.ascontiguousarray(self.last_frame)
+        h, w, ch = frame.shape
+        QImage(frame.data, w, h, ch * w, QImage.Format.Format_RGB888).save(
             self.settings["address"] + os.sep + self.settings["filename"] + ".jpeg",
             format="jpeg",
         )
@@ -256,6 +286,13 @@ class VenusUSB2GUI(QObject):
         self.settingsWidget.lineEdit_path.setText(plugin_info["address"])
         self.settingsWidget.lineEdit_filename.setText(plugin_info["filename"])
         self.settingsWidget.exposure.setCurrentText(str(plugin_info["exposure"]))
+        # recording settings have no widgets, they are kept as read from the ini
+        self.settings["record_format"] = plugin_info.get("record_format", "png")
+        self.settings["png_compression"] = plugin_info.get("png_compression", "3")
+        self.settings["record_codec"] = plugin_info.get("record_codec", "mp4v")
+        self.settings["record_fps"] = plugin_info.get("record_fps", "24")
+        self.settings["record_before"] = plugin_info.get("record_before", "2")
+        self.settings["record_after"] = plugin_info.get("record_after", "2")
 
     def _getAddress(self):
         address = self.settingsWidget.lineEdit_path.text()
@@ -282,7 +319,7 @@ class VenusUSB2GUI(QObject):
         self.settingsWidget.sourceBox.setEnabled(status)
 
     def _enableSaveButton(self):
-        if not self.q_img:
+        if self.last_frame is None:
             self.settingsWidget.saveButton.setEnabled(False)
         else:
             self.settingsWidget.saveButton.setEnabled(True)
@@ -321,17 +358,27 @@ class VenusUSB2GUI(QObject):
 
     @public
     def camera_close(self):
+        if self.recorder is not None:
+            # writes the queued frames and frees the pre-trigger history
+            self.recorder.close()
+            self.recorder = None
         self.camera.close()
         self._GUIchange_deviceConnected(True)
 
     @public
-    def camera_capture_image(self):
+    def camera_capture_image(self, newer_than=None, latest=False):
+        """Returns a camera frame (RGB) read entirely after the call, or after newer_than if given.
+
+        Args:
+            newer_than (float): time.monotonic() value, e.g. taken when a move finished.
+            latest (bool): return the newest grabbed frame without waiting for the camera.
+        """
         parse_status, settings = self.parse_settings_widget()
         if parse_status == 0:
             source = settings["source"]
             exposure = settings["exposure"]
             try:
-                status, img = self.camera.capture_image(source, exposure)
+                status, img = self.camera.capture_image(source, exposure, newer_than, latest)
                 if status != 0:
                     img = {"Error message": f"VenusUSB2 plugin : {img}"}
             except Exception as e:
@@ -343,6 +390,77 @@ class VenusUSB2GUI(QObject):
 
         return status, img
 
+    @public
+    def camera_frame_bus(self):
+        """FrameBus the camera publishes every frame to (see camera_components), for consumers that need every frame
+        or share frames between analyses. Frames are read-only views, copy them before modifying."""
+        return self.camera.bus
+
+    def _get_recorder(self) -> tuple[int, dict]:
+        """Recorder writing to the directory and file name of the settings, opens the camera if needed."""
+        [status, info] = self._parseSaveData()
+        if status:
+            return [status, info]
+        if self.camera.grabber is None:
+            status, message = self.camera.open(source=self.settings["source"], exposure=self.settings["exposure"])
+            if status:
+                return [status, {"Error message": f"VenusUSB2 plugin : {message['Error message']}"}]
+        try:
+            options = {
+                "fmt": self.settings.get("record_format", "png"),
+                "png_compression": int(self.settings.get("png_compression", 3)),
+                "codec": self.settings.get("record_codec", "mp4v"),
+                "fps": float(self.settings.get("record_fps", 24)),
+                "pre_seconds": float(self.settings.get("record_before", 2)),
+            }
+        except ValueError:
+            return [1, {"Error message": "VenusUSB2 plugin : recording settings should be numbers"}]
+        recorder = self.recorder
+        if recorder is not None and recorder.directory == self.settings["address"] and recorder.prefix == self.settings["filename"]:
+            return [0, {"recorder": recorder}]
+        if recorder is not None:
+            recorder.close()
+        try:
+            self.recorder = FrameRecorder(self.camera.bus, self.settings["address"], prefix=self.settings["filename"], **options)
+        except ValueError as e:
+            return [1, {"Error message": f"VenusUSB2 plugin : {e}"}]
+        return [0, {"recorder": self.recorder}]
+
+    @public
+    def camera_record_around(self, name: str, before=None, after=None):
+        """Records the camera from before seconds before the call to after seconds after it, in the background.
+        Intended for sequence steps, e.g. every probe landing. Defaults are record_before and record_after of the
+        settings, before is limited to record_before (the frames kept by the recorder).
+
+        Returns:
+            status, {"clip": name of the clip the frames are written to}
+        """
+        status, info = self._get_recorder()
+        if status:
+            return status, info
+        before = float(self.settings["record_before"]) if before is None else before
+        after = float(self.settings["record_after"]) if after is None else after
+        return 0, {"clip": info["recorder"].record_around(name, before, after)}
+
+    @public
+    def camera_record_start(self, name: str):
+        """Records the camera until camera_record_stop."""
+        status, info = self._get_recorder()
+        if status:
+            return status, info
+        return 0, {"clip": info["recorder"].start(name)}
+
+    @public
+    def camera_record_stop(self):
+        """Ends the running recording. Frames already taken are still written in the background."""
+        if self.recorder is None:
+            return 0, {"written": 0, "dropped": 0}
+        self.recorder.stop()
+        if self.recorder.errors:
+            self.logger.log_error(f"recording failed: {'; '.join(self.recorder.errors)}")
+            self.recorder.errors.clear()
+        return 0, {"written": self.recorder.written, "dropped": self.recorder.dropped}
+
     @public
     def get_thread(self):
         return self.camera_thread
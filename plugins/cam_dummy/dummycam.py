@@ -1,19 +1,108 @@
+"""
+Mock camera for offline development and benchmarks of Affine and affineMove.
+
+The source is an image file or a directory of images (playlist). Decoded images are kept in an LRU cache, so captures
+do not pay for PNG decoding. With fps > 0 the camera behaves like a video stream: the frame changes every 1/fps s,
+cycling through the playlist, and captures within one frame period return the same frame. Optional jitter simulates
+stage drift (random walk of shift and rotation per frame) and sensor noise.
+"""
+
 import os
+import time
+from collections import OrderedDict
+
 import cv2 as cv
+import numpy as np
+
+from camera_components import FrameBus
+
+
+class ImageCache:
+    """Decoded RGB images by path, least recently used images are evicted above max_bytes.
+    A changed file (modification time or size) is decoded again. Images are read-only, they are shared."""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()  # path -> (stat key, image)
+        self._bytes = 0
+
+    def get(self, path: str):
+        """RGB image of the file, None if it can not be decoded."""
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        entry = self._images.get(path)
+        if entry is not None and entry[0] == key:
+            self._images.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        img = cv.imread(path)
+        if img is None:
+            return None
+        img = cv.cvtColor(img, cv.COLOR_BGR2RGB)
+        img.flags.writeable = False
+        if entry is not None:
+            self._remove(path)
+        self._images[path] = (key, img)
+        self._bytes += img.nbytes
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            self._remove(next(iter(self._images)))
+        return img
+
+    def _remove(self, path):
+        _, img = self._images.pop(path)
+        self._bytes -= img.nbytes
+
+    def clear(self):
+        self._images.clear()
+        self._bytes = 0
 
 
 class DummyCamera:
-    """Mock camera: returns the image selected in the GUI."""
+    """Mock camera: returns the image selected in the GUI, or the images of a directory."""
+
+    image_extensions = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
 
     def __init__(self):
         self.image_path = None
         self.opened = False
+        self.bus = FrameBus()
+        self.cache = ImageCache()
+        self.fps = 0.0  # 0: every capture is a new frame of the current image, >0: video stream through the playlist
+        self.jitter_shift = 0.0  # px, standard deviation of the drift step per frame
+        self.jitter_rotate = 0.0  # deg, standard deviation of the rotation step per frame
+        self.jitter_noise = 0.0  # standard deviation of the added noise, in 8 bit levels
+        self.seed = None
+        self._playlist = []
+        self._start = time.monotonic()
+        self._frame_index = -1
+        self._frame = None  # view of the last published frame, returned again within its frame period
+        self._reset_drift()
+
+    def _reset_drift(self):
+        self._rng = np.random.default_rng(self.seed)
+        self._drift = np.zeros(3)  # dx, dy, angle
+
+    def _load_playlist(self, source):
+        if os.path.isdir(source):
+            return sorted(os.path.join(source, name) for name in os.listdir(source) if name.lower().endswith(self.image_extensions))
+        if os.path.isfile(source):
+            return [source]
+        return []
 
     def open(self, source=None, exposure=None):
-        if source is None or not os.path.isfile(source):
-            return [4, {"Error message": "Image file not provided or does not exist"}]
+        playlist = [] if not source else self._load_playlist(source)
+        if not playlist:
+            return [4, {"Error message": "Image file or directory not provided, does not exist or has no images"}]
         self.image_path = source
+        self._playlist = playlist
         self.opened = True
+        self._start = time.monotonic()
+        self._frame_index = -1
+        self._frame = None
+        self._reset_drift()
         return [0, {"Error message": "OK"}]
 
     def set_exposure(self, exposure):
@@ -22,16 +111,57 @@ class DummyCamera:
     def close(self):
         self.opened = False
         self.image_path = None
+        self._playlist = []
+        self._frame = None
 
     def capture_image(self, source=None, exposure=None):
-        path = source if source else self.image_path
-        if not path or not os.path.isfile(path):
-            return [4, {"Error message": "No image selected or file does not exist"}]
-        img = cv.imread(path)
+        if source and source != self.image_path:
+            status, message = self.open(source)
+            if status:
+                return [status, message]
+        elif not self.opened:
+            status, message = self.open(self.image_path)
+            if status:
+                return [4, {"Error message": "No image selected or file does not exist"}]
+        if self.fps > 0:
+            index = int((time.monotonic() - self._start) * self.fps)
+            if index == self._frame_index and self._frame is not None:
+                return (0, self._frame)
+        else:
+            index = self._frame_index + 1
+        path = self._playlist[index % len(self._playlist)]
+        try:
+            img = self.cache.get(path)
+        except OSError:
+            img = None
         if img is None:
             return [4, {"Error message": f"Failed to load image: {path}"}]
-        img = cv.cvtColor(img, cv.COLOR_BGR2RGB)
-        return (0, img)
+        steps = index - self._frame_index if self._frame_index >= 0 else 1
+        self._frame_index = index
+        self._frame = self._publish(self._jitter(img, steps))
+        return (0, self._frame)
+
+    def _jitter(self, img, steps):
+        """Applies the drift after steps more frames and the noise, returns img itself without jitter."""
+        if self.jitter_shift > 0 or self.jitter_rotate > 0:
+            scale = np.sqrt(steps) * np.array([self.jitter_shift, self.jitter_shift, self.jitter_rotate])
+            self._drift += self._rng.normal(0.0, 1.0, 3) * scale
+            h, w = img.shape[:2]
+            matrix = cv.getRotationMatrix2D((w / 2, h / 2), self._drift[2], 1.0)
+            matrix[:, 2] += self._drift[:2]
+            img = cv.warpAffine(img, matrix, (w, h), flags=cv.INTER_LINEAR, borderMode=cv.BORDER_REFLECT)
+        if self.jitter_noise > 0:
+            noise = self._rng.normal(0.0, self.jitter_noise, img.shape)
+            img = np.clip(img + noise, 0, 255).astype(np.uint8)
+        return img
+
+    def _publish(self, img):
+        """Copies the RGB frame into a bus buffer and returns the read-only view, a private frame if all buffers are held."""
+        buffer = self.bus.acquire(img.shape)
+        if buffer is None:
+            return img
+        np.copyto(buffer, img)
+        return self.bus.publish(buffer)[1]
 
     def capture_buffered(self):
         return self.capture_image()
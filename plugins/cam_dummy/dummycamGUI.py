@@ -16,11 +16,10 @@ public API:
 - camera_open() -> "error"
 - camera_close() -> None
 - camera_capture_image() -> image / None
+- camera_frame_bus() -> FrameBus with the captured images
 
-public API:
-- camera_open() -> "error"
-- camera_close() -> None
-- camera_capture_image() -> image / None
+The image path may be a directory, its images are then cycled as a playlist. fps, jitter and cache size are set in
+the plugin ini, see DummyCamera.
 
 version 0.6
 2025.05.12
@@ -77,6 +76,7 @@ class DummyCameraGUI(QObject):
         "camera_open",
         "camera_close",
         "camera_capture_image",
+        "camera_frame_bus",
     ]  # necessary for descendents of QObject, otherwise _get_public_methods returns a lot of QObject methods
 
     ########Signals
@@ -114,6 +114,7 @@ class DummyCameraGUI(QObject):
         self.previewWidget = uic.loadUi(self.path + "dummycam_previewWidget.ui")
 
         self.settings = {"image_path": ""}
+        self.stream_settings = {"fps": "0", "jitter_shift": "0", "jitter_rotate": "0", "jitter_noise": "0", "cache_mb": "256"}
 
         # Initialize cap as empty capture
         self.camera = DummyCamera()
@@ -127,6 +128,25 @@ class DummyCameraGUI(QObject):
 
         self.settingsWidget.pushButton.clicked.connect(self._select_image)
 
+    def _apply_settings(self, settings: dict):
+        """Sets the stream, jitter and cache options of the camera from the ini settings."""
+        for key in self.stream_settings:
+            if key in settings:
+                self.stream_settings[key] = settings[key]
+        try:
+            fps, shift, rotate, noise, cache_mb = (float(self.stream_settings[key]) for key in ("fps", "jitter_shift", "jitter_rotate", "jitter_noise", "cache_mb"))
+        except ValueError:
+            self.emit_log(1, {"Error message": "fps, jitter and cache settings should be numbers"})
+            return
+        if min(fps, shift, rotate, noise, cache_mb) < 0:
+            self.emit_log(1, {"Error message": "fps, jitter and cache settings can not be negative"})
+            return
+        self.camera.fps = fps
+        self.camera.jitter_shift = shift
+        self.camera.jitter_rotate = rotate
+        self.camera.jitter_noise = noise
+        self.camera.cache.max_bytes = int(cache_mb * 1024 * 1024)
+
     def _select_image(self):
         file_path, _ = QFileDialog.getOpenFileName(
             None,
@@ -173,6 +193,10 @@ class DummyCameraGUI(QObject):
         status, img = self.camera.capture_image(source=image_path)
         return status, img
 
+    def camera_frame_bus(self):
+        """FrameBus the captured images are published to (see camera_components)."""
+        return self.camera.bus
+
     ########Functions
     ########plugins interraction
     # These are hooked to the plugin container and sent to the main app. Then they are connected to the msg slots.
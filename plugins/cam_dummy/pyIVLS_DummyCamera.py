@@ -58,6 +58,7 @@ class pyIVLS_DummyCamera_plugin:
         image_path = settings.get("source", "")
         if hasattr(self.camera_control.settingsWidget, "lineEdit"):
             self.camera_control.settingsWidget.lineEdit.setText(image_path)
+        self.camera_control._apply_settings(settings)
         return {self.metadata["name"]: self.camera_control.settingsWidget}
 
     @hookimpl
@@ -131,5 +132,5 @@ class pyIVLS_DummyCamera_plugin:
     def get_plugin_settings(self, args=None):
         """See pyIVLS_hookspec.py for details."""
         if args is None or args.get("function") == self.metadata["function"]:
-            status, settings = 0, {"source": self.camera_control.settingsWidget.lineEdit.text()}
+            status, settings = 0, {"source": self.camera_control.settingsWidget.lineEdit.text(), **self.camera_control.stream_settings}
             return (self.metadata["name"], status, settings)
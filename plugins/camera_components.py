@@ -0,0 +1,622 @@
+"""
+Shared functionality for camera plugins (VenusUSB2, cam_dummy).
+
+Logic that does not depend on the camera hardware lives here. Nothing in this file uses Qt, so it can be used from
+the low level classes and tests.
+
+This file includes:
+- FrameGrabber: reads frames in a background thread and keeps only the newest one, so captures do not wait for frames.
+- fit_preview: downsamples a frame to the size of the preview widget.
+- PreviewPacer: drops preview frames while the GUI is busy and adapts the preview rate to the render time.
+- FrameBus: hands out camera frames as read-only views of a fixed pool of reusable buffers, to any number of consumers.
+- FrameRecorder: writes frames from a FrameBus to PNG files, NPY stacks or a video file in a background thread.
+"""
+
+import csv
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+
+Frame = Tuple[int, float, float, np.ndarray]  # (sequence number, read start, read end, frame), times from time.monotonic
+
+
+class FrameGrabber:
+    """Reads frames from a camera in a background thread and keeps the newest one (latest-frame semantics).
+
+    Consumers (image capture for Affine, the preview thread) share the grabber instead of reading the camera
+    themselves. A capture returns the newest frame at once, or waits for a frame that was read after a given time, e.g.
+    after the stage stopped moving. Frames are shared between consumers and must not be modified in place.
+    convert may return None to drop a frame (e.g. when the FrameBus has no free buffer).
+
+    Usage:
+        grabber = FrameGrabber(cap.read, convert=lambda frame: cv.cvtColor(frame, cv.COLOR_BGR2RGB))
+        grabber.start()
+        seq, t_start, t_end, frame = grabber.latest()
+        seq, t_start, t_end, frame = grabber.next_after(time.monotonic(), skip=1)  # skip one frame buffered by the driver
+        grabber.stop()
+    """
+
+    history = 16  # read start times kept for next_after
+
+    def __init__(
+        self,
+        read: Callable[[], Tuple[bool, Optional[np.ndarray]]],
+        convert: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+        max_failures: int = 50,
+        name: str = "FrameGrabber",
+    ):
+        """
+        Args:
+            read (callable): blocks until the next frame and returns (ok, frame), like cv.VideoCapture.read.
+            convert (callable): applied to every frame in the grabber thread, e.g. the color conversion.
+            max_failures (int): consecutive failed reads after which the grabber stops with an error.
+            name (str): name of the thread.
+        """
+        self.read = read
+        self.convert = convert
+        self.max_failures = max_failures
+        self.name = name
+        self.error: Optional[Exception] = None
+        self._frame: Optional[Frame] = None
+        self._starts: deque = deque(maxlen=self.history)  # read start of the last frames, oldest first
+        self._count = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def count(self) -> int:
+        """Number of frames received since start."""
+        with self._condition:
+            return self._count
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stops after the frame being read. Blocks until the thread has finished (about one frame period)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._condition:
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        failures = 0
+        try:
+            while not self._stop.is_set():
+                t_start = time.monotonic()
+                ok, frame = self.read()
+                t_end = time.monotonic()
+                if not ok or frame is None:
+                    failures += 1
+                    if failures >= self.max_failures:
+                        raise RuntimeError(f"{failures} consecutive frames could not be read")
+                    time.sleep(0.01)
+                    continue
+                failures = 0
+                if self.convert is not None:
+                    frame = self.convert(frame)
+                    if frame is None:
+                        continue
+                with self._condition:
+                    self._frame = (self._count, t_start, t_end, frame)
+                    self._starts.append(t_start)
+                    self._count += 1
+                    self._condition.notify_all()
+        except Exception as e:
+            self.error = e
+            with self._condition:
+                self._condition.notify_all()
+
+    def _wait(self, ready: Callable[[], bool], timeout: float, what: str) -> Frame:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not ready():
+                if self.error is not None:
+                    raise RuntimeError(f"Frame grabber failed: {self.error}")
+                if self._stop.is_set() or not self.running:
+                    raise RuntimeError("Frame grabber is stopped")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No {what} within {timeout:.3f} s")
+                self._condition.wait(remaining)
+            return self._frame
+
+    def latest(self, timeout: float = 2.0) -> Frame:
+        """Newest frame, waits only if nothing has been received yet.
+
+        Raises:
+            TimeoutError: no frame arrived in time.
+            RuntimeError: the grabber stopped or the camera failed.
+        """
+        return self._wait(lambda: self._frame is not None, timeout, "frame")
+
+    def next_after(self, t: float, timeout: float = 2.0, skip: int = 0) -> Frame:
+        """Newest frame once at least skip + 1 frames were read after t (time.monotonic), e.g. after a move.
+
+        Drivers that buffer frames may return a frame exposed before the read started; skip the number of buffered frames.
+
+        Raises:
+            TimeoutError: no such frame arrived in time.
+            RuntimeError: the grabber stopped or the camera failed.
+        """
+        if skip >= self.history:
+            raise ValueError(f"skip must be less than {self.history}")
+
+        def ready():
+            # the (skip + 1)-th newest frame started after t
+            return len(self._starts) > skip and self._starts[-1 - skip] >= t
+
+        return self._wait(ready, timeout, f"frame after t={t:.3f}")
+
+
+def fit_preview(frame: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Downsamples the frame to fit into width x height keeping the aspect ratio (area interpolation).
+    Frames that already fit are returned as they are, previews are never upsampled here."""
+    h, w = frame.shape[:2]
+    scale = min(width / w, height / h)
+    if scale >= 1 or width < 1 or height < 1:
+        return frame
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv.resize(frame, size, interpolation=cv.INTER_AREA)
+
+
+class PreviewPacer:
+    """Decides in the capture thread which frames are sent to the GUI for the preview.
+
+    A frame is sent only when the previous one has been rendered (frames are dropped while the GUI is behind) and the
+    preview interval has passed. The interval follows the measured render time so that rendering takes at most `load`
+    of the GUI thread, between min_interval and max_interval.
+
+    Usage:
+        capture thread:  if pacer.ready(): pacer.sent(); emit(fit_preview(frame, w, h))
+        GUI thread:      render, then pacer.rendered(render_time)
+    """
+
+    def __init__(self, min_interval: float = 0.042, max_interval: float = 0.5, load: float = 0.5, smoothing: float = 0.2, lost_after: float = 1.0):
+        """
+        Args:
+            min_interval (float): s, the preview rate limit when rendering is fast.
+            max_interval (float): s, the slowest preview rate.
+            load (float): fraction of the GUI thread time the preview may use.
+            smoothing (float): weight of the newest render time in the running average.
+            lost_after (float): s, a frame not reported as rendered after this is treated as dropped by the GUI.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.load = load
+        self.smoothing = smoothing
+        self.lost_after = lost_after
+        self.interval = min_interval
+        self.render_time: Optional[float] = None  # s, running average
+        self.sent_frames = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._last_sent = -float("inf")
+        self._in_flight = False
+
+    def ready(self) -> bool:
+        """True if a frame should be sent now, otherwise the frame is counted as dropped."""
+        now = time.monotonic()
+        with self._lock:
+            if self._in_flight and now - self._last_sent < self.lost_after:
+                self.dropped += 1
+                return False
+            if now - self._last_sent < self.interval:
+                return False
+            return True
+
+    def sent(self) -> None:
+        with self._lock:
+            self._in_flight = True
+            self._last_sent = time.monotonic()
+            self.sent_frames += 1
+
+    def rendered(self, render_time: float) -> None:
+        """Called by the GUI after a preview frame was drawn, with the time the drawing took."""
+        with self._lock:
+            self._in_flight = False
+            if self.render_time is None:
+                self.render_time = render_time
+            else:
+                self.render_time += self.smoothing * (render_time - self.render_time)
+            self.interval = min(max(self.render_time / self.load, self.min_interval), self.max_interval)
+
+
+class FrameBus:
+    """In-process distribution of camera frames without per-consumer copies.
+
+    The camera plugin writes each frame once into a buffer from a fixed pool and publishes it. Consumers get read-only
+    views of the buffer with the sequence number and time of the frame, through latest(), wait_next() or a subscribed
+    callback. A buffer is reused only when no view of it is alive any more (numpy views keep a reference to the buffer
+    they look into), so a consumer may keep a frame as long as it needs to, e.g. for matching. When all buffers are in
+    use the new frame is dropped instead of stalling the camera or allocating.
+
+    Usage:
+        camera thread:  buffer = bus.acquire(shape)
+                        if buffer is not None: cv.cvtColor(raw, cv.COLOR_BGR2RGB, dst=buffer); bus.publish(buffer)
+        consumer:       seq, t, frame = bus.wait_next(last_seq)   # frame is read-only, copy it to modify
+    """
+
+    def __init__(self, slots: int = 6):
+        """
+        Args:
+            slots (int): buffers in the pool, the number of frames that can be held by consumers at once plus one.
+        """
+        if slots < 2:
+            raise ValueError("FrameBus needs at least two buffers")
+        self.slots = slots
+        self.published = 0
+        self.dropped = 0
+        self._buffers: List[np.ndarray] = []
+        self._writing: set = set()  # ids of buffers handed out by acquire and not yet published
+        self._latest: Optional[Tuple[int, float, np.ndarray]] = None
+        self._subscribers: Dict[int, Callable[[int, float, np.ndarray], None]] = {}
+        self._next_token = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> Optional[np.ndarray]:
+        """Writable buffer for the next frame, None if all buffers are in use (the frame should be dropped).
+        The pool is reallocated when the frame shape or type changes."""
+        dtype = np.dtype(dtype)
+        with self._condition:
+            if self._buffers and (self._buffers[0].shape != tuple(shape) or self._buffers[0].dtype != dtype):
+                self._buffers = []
+                self._writing.clear()
+            if not self._buffers:
+                self._buffers = [np.empty(shape, dtype=dtype) for _ in range(self.slots)]
+            for i in range(self.slots):
+                # references: the pool list and the getrefcount argument, anything more is a live view
+                if id(self._buffers[i]) not in self._writing and sys.getrefcount(self._buffers[i]) <= 2:
+                    self._writing.add(id(self._buffers[i]))
+                    return self._buffers[i]
+            self.dropped += 1
+            return None
+
+    def publish(self, buffer: np.ndarray, timestamp: Optional[float] = None) -> Tuple[int, np.ndarray]:
+        """Publishes a buffer filled after acquire.
+
+        Args:
+            timestamp (float): time.monotonic() of the frame, defaults to now.
+
+        Returns:
+            (sequence number, read-only view of the frame)
+        """
+        view = buffer.view()
+        view.flags.writeable = False
+        with self._condition:
+            self._writing.discard(id(buffer))
+            sequence = self.published
+            self.published += 1
+            self._latest = (sequence, time.monotonic() if timestamp is None else timestamp, view)
+            latest = self._latest
+            subscribers = list(self._subscribers.values())
+            self._condition.notify_all()
+        for callback in subscribers:
+            callback(*latest)
+        return sequence, view
+
+    def publish_copy(self, frame: np.ndarray, timestamp: Optional[float] = None) -> Optional[Tuple[int, np.ndarray]]:
+        """Copies a frame into the pool and publishes it, None if it was dropped."""
+        buffer = self.acquire(frame.shape, frame.dtype)
+        if buffer is None:
+            return None
+        np.copyto(buffer, frame)
+        return self.publish(buffer, timestamp)
+
+    def latest(self) -> Optional[Tuple[int, float, np.ndarray]]:
+        """(sequence number, time, read-only frame) of the newest frame, None before the first one."""
+        with self._condition:
+            return self._latest
+
+    def wait_next(self, after: int = -1, timeout: float = 2.0) -> Tuple[int, float, np.ndarray]:
+        """Newest frame with a sequence number above after, waits for it if needed.
+
+        Raises:
+            TimeoutError: no new frame was published in time.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._latest is None or self._latest[0] <= after:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No frame after {after} within {timeout:.3f} s")
+                self._condition.wait(remaining)
+            return self._latest
+
+    def subscribe(self, callback: Callable[[int, float, np.ndarray], None]) -> int:
+        """Calls callback(sequence, time, frame) in the publishing thread for every frame. Returns a token for unsubscribe.
+        Callbacks should return quickly; keep the frame (not a copy) to hold its buffer."""
+        with self._condition:
+            token = self._next_token
+            self._next_token += 1
+            self._subscribers[token] = callback
+            return token
+
+    def unsubscribe(self, token: int) -> None:
+        with self._condition:
+            self._subscribers.pop(token, None)
+
+
+class _Clip:
+    """One recording of FrameRecorder: frames with start <= time <= end go to the same file(s)."""
+
+    def __init__(self, name: str, start: float, end: Optional[float], trigger: float):
+        self.name = name
+        self.start = start
+        self.trigger = trigger  # frame times in the index are relative to this
+        self.end = end  # None while recording until stop()
+        self.frames = 0
+
+
+class FrameRecorder:
+    """Records frames published on a FrameBus without slowing down the camera.
+
+    Frames are copied in the publishing thread (so the bus buffers are not held) and written to disk by a writer
+    thread. If the writer falls behind by more than queue_size frames, new frames are dropped and counted in dropped,
+    acquisition is never stalled. The recorder keeps the last pre_seconds of frames, so a clip can start before the
+    trigger, e.g. "record 2 s around this step" is record_around("step", 2, 2). These frames are queued in full
+    when the clip starts. The history costs pre_seconds of full frames in memory as long as the recorder is open.
+
+    Formats:
+        png   - one lossless file per frame, png_compression 0 (fast, large) to 9 (slow, small)
+        npy   - one (frames, height, width, channels) stack per clip, raw frames, loadable with np.load(mmap_mode="r")
+        video - one video file per clip, codec is a fourcc (mp4v: .mp4, FFV1: lossless .mkv, MJPG: .avi)
+    Every clip has a <clip>_frames.csv with the sequence number and time (relative to the trigger) of each frame.
+    Frames are RGB as on the bus, they are written in the channel order of the format.
+
+    Usage:
+        recorder = FrameRecorder(bus, directory, fmt="video")
+        recorder.record_around("landing_3", before=2, after=2)  # returns at once, the clip is written in the background
+        recorder.start("alignment"); ...; recorder.stop()
+        recorder.close()  # writes what is queued and detaches from the bus
+    """
+
+    formats = ("png", "npy", "video")
+    video_extensions = {"mp4v": ".mp4", "avc1": ".mp4", "FFV1": ".mkv", "MJPG": ".avi", "XVID": ".avi"}
+    _npy_header_size = 128  # bytes, the stack header is rewritten with the frame count when the clip ends
+
+    def __init__(
+        self,
+        bus: FrameBus,
+        directory: str,
+        prefix: str = "record",
+        fmt: str = "png",
+        png_compression: int = 3,
+        fps: float = 24.0,
+        codec: str = "mp4v",
+        pre_seconds: float = 2.0,
+        queue_size: int = 32,
+    ):
+        """
+        Args:
+            directory (str): existing directory for the clips, files are named <prefix>_<clip name>...
+            fps (float): frame rate written to video files (the camera rate is not known to the recorder).
+            pre_seconds (float): frames kept for clips starting before the trigger, 0 disables the history.
+            queue_size (int): frames waiting for the writer before new frames are dropped.
+        """
+        if fmt not in self.formats:
+            raise ValueError(f"Unknown recording format {fmt}, use one of {', '.join(self.formats)}")
+        if not 0 <= png_compression <= 9:
+            raise ValueError("PNG compression level should be 0..9")
+        if not os.path.isdir(directory):
+            raise ValueError(f"{directory} is not a directory")
+        self.bus = bus
+        self.directory = directory
+        self.prefix = prefix
+        self.fmt = fmt
+        self.png_compression = png_compression
+        self.fps = fps
+        self.codec = codec
+        self.pre_seconds = pre_seconds
+        self.queue_size = queue_size
+        self.written = 0
+        self.dropped = 0
+        self.errors: List[str] = []
+        self._lock = threading.Lock()
+        self._history: deque = deque()  # (sequence, time, copy) of the last pre_seconds
+        self._clip: Optional[_Clip] = None
+        self._queued = 0  # frames in the queue, control items are not counted
+        self._queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="FrameRecorder writer", daemon=True)
+        self._writer.start()
+        self._token = bus.subscribe(self._on_frame)
+
+    @property
+    def recording(self) -> bool:
+        with self._lock:
+            return self._clip is not None
+
+    def record_around(self, name: str, before: float = 2.0, after: float = 2.0) -> str:
+        """Records the frames from before seconds ago (as far as kept, see pre_seconds) to after seconds from now.
+        A trigger during a running clip extends it instead of starting a new one.
+
+        Returns:
+            str: name of the clip the frames go to
+        """
+        now = time.monotonic()
+        return self._begin(name, now - min(before, self.pre_seconds), now + after, now)
+
+    def start(self, name: str) -> str:
+        """Records from now until stop()."""
+        now = time.monotonic()
+        return self._begin(name, now, None, now)
+
+    def stop(self) -> None:
+        """Ends the running clip, frames already queued are still written."""
+        with self._lock:
+            if self._clip is not None:
+                self._end_clip()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stops recording, waits for the queued frames to be written and detaches from the bus."""
+        self.bus.unsubscribe(self._token)
+        self.stop()
+        self._queue.put(("quit", None, None))
+        self._writer.join(timeout)
+        with self._lock:
+            self._history.clear()
+
+    def _begin(self, name: str, start: float, end: Optional[float], trigger: float) -> str:
+        with self._lock:
+            if self._clip is not None:
+                if self._clip.end is not None:
+                    self._clip.end = None if end is None else max(self._clip.end, end)
+                return self._clip.name
+            self._clip = _Clip(name, start, end, trigger)
+            # the history is already bounded by pre_seconds, it bypasses queue_size so that the newest frames
+            # before the trigger are not dropped
+            for sequence, t, frame in self._history:
+                if t >= start:
+                    self._queue.put(("history", self._clip, (sequence, t, frame)))
+            return name
+
+    def _end_clip(self) -> None:
+        """Called with the lock held."""
+        self._queue.put(("end", self._clip, None))
+        self._clip = None
+
+    def _enqueue(self, sequence: int, t: float, frame: np.ndarray) -> None:
+        """Called with the lock held. frame must be a private copy."""
+        if self._queued >= self.queue_size:
+            self.dropped += 1
+            return
+        self._queued += 1
+        self._queue.put(("frame", self._clip, (sequence, t, frame)))
+
+    def _on_frame(self, sequence: int, t: float, frame: np.ndarray) -> None:
+        with self._lock:
+            clip = self._clip
+            if clip is not None and clip.end is not None and t > clip.end:
+                self._end_clip()
+                clip = None
+            if clip is None and self.pre_seconds <= 0:
+                return
+            copy = frame.copy()
+            if self.pre_seconds > 0:
+                self._history.append((sequence, t, copy))
+                while self._history and self._history[0][1] < t - self.pre_seconds:
+                    self._history.popleft()
+            if clip is not None and t >= clip.start:
+                self._enqueue(sequence, t, copy)
+
+    def _expire(self) -> None:
+        """Ends a clip whose end has passed when no frames arrive to do it."""
+        with self._lock:
+            if self._clip is not None and self._clip.end is not None and time.monotonic() > self._clip.end:
+                self._end_clip()
+
+    ########Functions
+    ########writer thread
+
+    def _write_loop(self) -> None:
+        writers: Dict[int, dict] = {}  # id(clip) -> open files of the clip
+        failed: set = set()  # ids of clips that could not be written, their remaining frames are discarded
+        while True:
+            try:
+                kind, clip, item = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                self._expire()
+                continue
+            if kind == "quit":
+                break
+            try:
+                if kind in ("frame", "history"):
+                    if kind == "frame":
+                        with self._lock:
+                            self._queued -= 1
+                    if id(clip) in failed:
+                        continue
+                    state = writers.get(id(clip))
+                    if state is None:
+                        state = writers[id(clip)] = self._open_clip(clip, item[2])
+                    self._write_frame(clip, state, *item)
+                    self.written += 1
+                elif kind == "end":
+                    failed.discard(id(clip))
+                    if id(clip) in writers:
+                        self._close_clip(clip, writers.pop(id(clip)))
+            except Exception as e:  # a full disk etc. must not kill the thread, the rest of the clip is lost
+                self.errors.append(f"{clip.name}: {e}")
+                failed.add(id(clip))
+                state = writers.pop(id(clip), None)
+                if state is not None:
+                    self._close_clip(clip, state, failed=True)
+        for clip_id in list(writers):
+            state = writers.pop(clip_id)
+            self._close_clip(state["clip"], state)
+
+    def _path(self, clip: _Clip, suffix: str) -> str:
+        return os.path.join(self.directory, f"{self.prefix}_{clip.name}{suffix}")
+
+    def _open_clip(self, clip: _Clip, frame: np.ndarray) -> dict:
+        state = {"clip": clip, "shape": frame.shape, "dtype": frame.dtype}
+        state["index"] = open(self._path(clip, "_frames.csv"), "w", newline="")
+        state["csv"] = csv.writer(state["index"], delimiter=";")
+        state["csv"].writerow(["frame", "sequence", "time"])
+        if self.fmt == "npy":
+            state["file"] = open(self._path(clip, ".npy"), "wb")
+            state["file"].write(self._npy_header(frame.shape, frame.dtype, 0))
+        elif self.fmt == "video":
+            height, width = frame.shape[:2]
+            extension = self.video_extensions.get(self.codec, ".avi")
+            writer = cv.VideoWriter(self._path(clip, extension), cv.VideoWriter_fourcc(*self.codec), self.fps, (width, height), frame.ndim == 3)
+            if not writer.isOpened():
+                raise RuntimeError(f"Can not open video writer for codec {self.codec}")
+            state["video"] = writer
+        return state
+
+    def _write_frame(self, clip: _Clip, state: dict, sequence: int, t: float, frame: np.ndarray) -> None:
+        if frame.shape != state["shape"] or frame.dtype != state["dtype"]:
+            raise ValueError("frame size changed during the clip")
+        if self.fmt == "png":
+            image = cv.cvtColor(frame, cv.COLOR_RGB2BGR) if frame.ndim == 3 else frame
+            path = self._path(clip, f"_{clip.frames:05d}.png")
+            if not cv.imwrite(path, image, [cv.IMWRITE_PNG_COMPRESSION, self.png_compression]):
+                raise RuntimeError(f"Can not write {path}")
+        elif self.fmt == "npy":
+            state["file"].write(np.ascontiguousarray(frame).data)
+        else:
+            state["video"].write(cv.cvtColor(frame, cv.COLOR_RGB2BGR) if frame.ndim == 3 else frame)
+        state["csv"].writerow([clip.frames, sequence, f"{t - clip.trigger:.6f}"])
+        clip.frames += 1
+
+    def _close_clip(self, clip: _Clip, state: dict, failed: bool = False) -> None:
+        try:
+            if "file" in state:
+                if not failed:
+                    state["file"].seek(0)
+                    state["file"].write(self._npy_header(state["shape"], state["dtype"], clip.frames))
+                state["file"].close()
+            if "video" in state:
+                state["video"].release()
+        finally:
+            state["index"].close()
+
+    @classmethod
+    def _npy_header(cls, shape: Tuple[int, ...], dtype, frames: int) -> bytes:
+        """Version 1.0 .npy header of fixed size for a stack of frames (see numpy.lib.format)."""
+        header = repr({"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": (frames, *shape)})
+        magic = b"\x93NUMPY\x01\x00"
+        padding = cls._npy_header_size - len(magic) - 2 - len(header) - 1
+        if padding < 0:
+            raise ValueError("frame shape does not fit the stack header")
+        header = (header + " " * padding + "\n").encode("latin1")
+        return magic + len(header).to_bytes(2, "little") + header
@@ -15,15 +15,21 @@ Conversion functions are in oo_utils.py, and should be used to since they are cl
 
 
 class trigger_mode(Enum):
-    CONTINUOUS = 0
-    SOFTWARE = 1
-    EXTERNAL = 2
+    """USB2000 trigger modes, the values are the seabreeze mode numbers."""
+
+    CONTINUOUS = 0  # free running
+    SOFTWARE = 1  # integration runs while the trigger input is high
+    EXTERNAL = 2  # external synchronization, integration time set by the trigger period
+    EDGE = 3  # external hardware trigger, one scan of the set integration time per rising edge
 
 
 class OODRV:
     integration_time: int = s_to_micros(utils.DEFAULT_INTEGRATION_TIME)  # microseconds
     _integ_limits: Optional[tuple[int, int]] = None  # (min, max) integration time in µs, set in open()
     _spectro: Optional[sb.Spectrometer] = None
+    _wavelengths: Optional[np.ndarray] = None  # read once in open()
+    _max_intensity: float = 4095.0
+    mode: trigger_mode = trigger_mode.CONTINUOUS
 
     @property
     def spectro(self) -> sb.Spectrometer:
@@ -41,6 +47,8 @@ class OODRV:
             return  # already open
         self._spectro = sb.Spectrometer.from_serial_number(utils.SERIAL_NUMBER)
         self._integ_limits = self._spectro.integration_time_micros_limits
+        self._wavelengths = np.asarray(self._spectro.wavelengths(), dtype=np.float64)
+        self._max_intensity = self._spectro.max_intensity
         self.set_integration_time(self.integration_time)
 
     def get_integration_time(self) -> int:
@@ -63,7 +71,8 @@ class OODRV:
         assert intg_time >= self.integ_limits[0], f"Integration time below minimum of {self.integ_limits[0]} µs"
         assert intg_time <= self.integ_limits[1], f"Integration time above maximum of {self.integ_limits[1]} µs"
         self.spectro.integration_time_micros(intg_time)
-        self.get_spectrum()  # take a spectrum to make sure the new time is applied.
+        if self.mode == trigger_mode.CONTINUOUS:
+            self.get_spectrum()  # take a spectrum to make sure the new time is applied. Would wait for a trigger otherwise.
         self.integration_time = intg_time
 
     def get_device_status(self):
@@ -78,27 +87,28 @@ class OODRV:
             np.ndarray: The spectrum as a numpy array.
         """
         intensities = self.spectro.intensities(correct_dark_counts=correct_dark_counts)
-        max_intensity = self.spectro.max_intensity  # 4095.0
 
-        # normalize to range 0-1 based on max intensity
-        intensities = intensities / max_intensity
-        return intensities
+        # normalize to range 0-1 based on max intensity (4095.0)
+        return intensities / self._max_intensity
 
     def get_wavelengths(self) -> np.ndarray:
-        """Get the wavelengths from the spectrometer.
+        """Get the wavelengths from the spectrometer. They are read once when the device is opened.
 
         Returns:
             np.ndarray: The wavelengths as a numpy array.
         """
-        wavelengths = self.spectro.wavelengths()
-        return wavelengths
+        if self._wavelengths is None:
+            self._wavelengths = np.asarray(self.spectro.wavelengths(), dtype=np.float64)
+        return self._wavelengths
 
     def trigger_mode(self, mode: trigger_mode) -> None:
-        """Set the trigger mode of the spectrometer. This can be implemented in the future if external triggering is needed.
+        """Set the trigger mode of the spectrometer.
         See: https://www.optosirius.co.jp/OceanOptics/technical/external-triggering-options.pdf
         TL;DR: USB2000 can be triggered externally, but it requires additional hardware.
+        In the external modes get_spectrum blocks until a triggered scan arrives.
 
         Args:
             mode (trigger_mode): The trigger mode to set.
         """
-        raise NotImplementedError("trigger_mode not implemented")
+        self.spectro.trigger_mode(mode.value)
+        self.mode = mode
@@ -40,13 +40,14 @@ from pathvalidate import is_valid_filename
 from PyQt6 import uic
 from PyQt6.QtCore import QObject, Qt
 from PyQt6.QtWidgets import QVBoxLayout, QFileDialog
-from MplCanvas import MplCanvas
+from MplCanvas import LiveLinePlot, MplCanvas
 from threadStopped import ThreadStopped, thread_with_exception
 from threading import Lock
 import copy
 from plugin_components import LoggingHelper, CloseLockSignalProvider, ConnectionIndicatorStyle
 
-from oousb2000 import OODRV
+from oousb2000 import OODRV, trigger_mode
+from spectrometer_components import DarkLibrary, IntegrationTimePredictor, SpectrumAccumulator, SpectrumStream
 
 
 class OOUSB2000_GUI(QObject):
@@ -64,6 +65,14 @@ class OOUSB2000_GUI(QObject):
         "spectrometerStartScan",
         "spectrometerGetScan",
         "spectrometerGetSpectrum",
+        "spectrometerGetWavelength",
+        "spectrometerStreamStart",
+        "spectrometerStreamStop",
+        "spectrometerStreamLatest",
+        "spectrometerStreamNextAfter",
+        "spectrometerStreamAverage",
+        "spectrometerGetAveragedScan",
+        "spectrometerRecordDark",
         "createFile",
         "getAutoTime",
     ]  # necessary for descendents of QObject, otherwise _get_public_methods returns a lot of QObject methods
@@ -80,6 +89,8 @@ class OOUSB2000_GUI(QObject):
     autoValue_min = 0.2  # spectrum value in arb.(?) units
     autoValue_max = 0.8  # spectrum value in arb.(?) units
     intTimeMaxIterations = 10
+    streamCapacity = 64  # frames kept by the background reader
+    streamTriggers = {"continuous": trigger_mode.CONTINUOUS, "external": trigger_mode.EXTERNAL, "edge": trigger_mode.EDGE}
 
     ########Functions
     def __init__(self, verbose=False):
@@ -108,7 +119,12 @@ class OOUSB2000_GUI(QObject):
 
         self.settings = {}
 
-        self._scan_lock = Lock()
+        self._scan_lock = Lock()  # device access, the stream reader thread and the plugin functions share the device
+        self.autoTimePredictor = IntegrationTimePredictor(self.autoTime_min, self.autoTime_max, self.autoValue_min, self.autoValue_max)
+        self.darkLibrary = DarkLibrary(self.path + "dark_library.npz")
+        self.stream = None  # SpectrumStream while frames are read in the background
+        self._previewSequence = -1  # sequence number of the last streamed frame shown in the preview
+        self.streamTrigger = "continuous"  # trigger of the running stream
 
     def _log_verbose(self, message):
         """Logs a message if verbose mode is enabled."""
@@ -134,6 +150,9 @@ class OOUSB2000_GUI(QObject):
 
         self.axes.set_xlim(utils.OO_MIN_WL, utils.OO_MAX_WL)  # limits are given by spectral range of the device
 
+        # persistent line, updated by blitting on every preview frame
+        self.previewLine = LiveLinePlot(self.sc, self.axes)
+
         layout = QVBoxLayout()
         layout.addWidget(self.sc._create_toolbar(self.previewWidget))
         layout.addWidget(self.sc)
@@ -148,22 +167,17 @@ class OOUSB2000_GUI(QObject):
         Returns:
             _type_: _description_
         """
-        [status, info] = self.spectrometerGetScan()
+        if self._streaming():
+            [status, info] = self._streamResult(self._previewFrame)
+        else:
+            [status, info] = self.spectrometerGetScan()
         if status:
             return [status, info]
 
         preview_data = info
-        wl = self.drv.spectro.wavelengths()
+        wl = self.drv.get_wavelengths()
         try:
-            xmin, xmax = self.axes.get_xlim()
-            ymin, ymax = self.axes.get_ylim()
-            self.axes.cla()
-            self.axes.set_xlabel("Wavelength (nm)")
-            self.axes.set_ylabel("Intensity (calib. arb. un.)")
-            self.axes.plot(wl, preview_data, "b-")
-            self.axes.set_xlim(xmin, xmax)
-            self.axes.set_ylim(ymin, ymax)
-            self.sc.draw()
+            self.previewLine.update(wl, preview_data)
             self.lastspectrum = [info, self.settings]
             return [0, [wl, info]]
         except Exception as e:
@@ -236,16 +250,14 @@ class OOUSB2000_GUI(QObject):
                     [status, info] = self.spectrometerSetIntegrationTime(self.settings["integrationTime"])
                     self._log_verbose(f"Integration time set to {self.settings['integrationTime']} seconds.")
                     self.integrationTimeChanged = False
-                    if self.settings["integrationTime"] * 1000 < self.default_timerInterval:
-                        self.sleep_time = self.default_timerInterval / 1000
-                    else:
-                        self.sleep_time = self.settings["integrationTime"]
+                    if not status and not self._streaming():
+                        # frames are read in the background at the device rate, no need to sleep between them
+                        [status, info] = self.spectrometerStreamStart()
                     if status:
                         self.logger.log_info(datetime.now().strftime("%H:%M:%S.%f") + f" : TLCCS plugin : {info}, status = {status}")
                         self.logger.info_popup(f"TLCCS plugin : {info['Error message']}")
                         self.preview_running = False
                         return [status, info]
-                time.sleep(self.sleep_time)
                 [status, info] = self._update_spectrum()
                 if status:
                     self.logger.log_info(datetime.now().strftime("%H:%M:%S.%f") + f" : TLCCS plugin : {info}, status = {status}")
@@ -257,6 +269,9 @@ class OOUSB2000_GUI(QObject):
             return [0, "preview stopped"]
         except ThreadStopped:
             return [0, "preview stopped"]
+        finally:
+            if self._streaming():
+                self.spectrometerStreamStop()
 
     def _setIntTimeAction(self):
         if self.preview_running:  # this function is useful only in preview mode
@@ -317,6 +332,7 @@ class OOUSB2000_GUI(QObject):
         external_cleanup_args=None,
         pause_duration: float = 0.0,
         last_integration_time: Optional[float] = None,
+        setpoint: Optional[float] = None,
     ) -> tuple[int, float | dict]:
         """
         Calculates the optimal integration time, allowing external actions and cleanup with arguments.
@@ -327,34 +343,25 @@ class OOUSB2000_GUI(QObject):
             external_cleanup (callable): External cleanup function to execute after auto time calculation.
             external_cleanup_args (tuple): Arguments for the external cleanup function.
             pause_duration (float): Duration to pause after each iteration.
+            last_integration_time (float): Initial guess in seconds, e.g. the result for the previous point. Takes precedence over the per-setpoint cache.
+            setpoint (float): SMU setpoint the search is done for. Results are cached per setpoint and
+                the initial guess for a new setpoint is extrapolated from them.
 
         Returns:
             tuple[int, float | dict]: Status and integration time or error information.
         """
         self._log_verbose("Calculating auto integration time.")
-        low = self.autoTime_min * 1000  # time min ms
-        high = self.autoTime_max * 1000  # time max ms
-        low_spectrum = self.autoValue_min  # min spectrum value
-        high_spectrum = self.autoValue_max  # max spectrum value
-
         if self.settings["integrationtimetype"] == "auto":
-            # initial guess for time if not provided
-            if last_integration_time is None:
-                if self.settings["useintegrationtimeguess"]:
-                    # guess from current value
-                    guessIntTime = self.settings["integrationTime"] * 1000  # ms
-                else:
-                    # guess from min and max
-                    guessIntTime = (self.autoTime_min + self.autoTime_max) / 2 * 1000  # ms
-            # initial guess provided as argument, use that.
-            else:
-                guessIntTime = last_integration_time * 1000  # ms
-
-            # start iterating through integration times using guessIntTime as initial guess
+            # initial guess: the provided time, then the cached result for the setpoint, then the settings
+            fallback = self.settings["integrationTime"] if self.settings["useintegrationtimeguess"] else None
+            self.autoTimePredictor.start()
+            guessIntTime = self.autoTimePredictor.initial_guess(setpoint, fallback, explicit=last_integration_time)  # s
+
+            # scan, then jump to the integration time predicted from the scans so far
             for iter in range(self.intTimeMaxIterations):
-                self._log_verbose(f"Iteration {iter + 1}: Current guess = {guessIntTime} ms.")
-                self.settings["integrationTime"] = guessIntTime / 1000.0  # needed for keeping self.lastspectrum in order
-                [status, info] = self.spectrometerSetIntegrationTime(guessIntTime / 1000.0)  # s
+                self._log_verbose(f"Iteration {iter + 1}: Current guess = {guessIntTime * 1000} ms.")
+                self.settings["integrationTime"] = guessIntTime  # needed for keeping self.lastspectrum in order
+                [status, info] = self.spectrometerSetIntegrationTime(guessIntTime)  # s
                 if status:
                     self._log_verbose(f"getAutoTime: Failed to set integration time. {status}, {info}")
                     return [status, info]
@@ -373,21 +380,21 @@ class OOUSB2000_GUI(QObject):
                         self._log_verbose("getAutoTime: External action completed without standard return value")
 
                 [status, info] = self._update_spectrum()
-                self._log_verbose(f"getAutoTime: Retrieved spectrum with shape {info[1].shape} and max value {max(info[1])}.")
                 if status:
                     self._log_verbose(f"getAutoTime: Failed to update spectrum. {status}, {info}")
                     return [status, info]
+                self._log_verbose(f"getAutoTime: Retrieved spectrum with shape {info[1].shape} and max value {max(info[1])}.")
                 # save the spectrum if needed
                 if self.settings["saveattempts_check"]:
                     varDict = {}
-                    varDict["integrationtime"] = guessIntTime / 1000.0
+                    varDict["integrationtime"] = guessIntTime
                     varDict["triggermode"] = 1 if self.settings["externalTrigger"] else 0
                     varDict["name"] = self.settings["samplename"]
                     varDict["comment"] = self.settings["comment"] + " Auto adjust of integration time."
                     self.createFile(
                         varDict=varDict,
                         filedelimeter=self.filedelimeter,
-                        address=self.settings["address"] + os.sep + self.settings["filename"] + f"_{int(guessIntTime)}ms.csv",
+                        address=self.settings["address"] + os.sep + self.settings["filename"] + f"_{int(guessIntTime * 1000)}ms.csv",
                         data=info[1],
                     )
                 # external cleanup if needed
@@ -409,28 +416,23 @@ class OOUSB2000_GUI(QObject):
 
                 target = max(info[1])  # target value to optimize
                 # if spectrum is in the range, found good integration time
-                if low_spectrum <= target <= high_spectrum:
-                    self._log_verbose(f"Optimal integration time found: {guessIntTime / 1000.0} seconds.")
-                    return [0, guessIntTime / 1000.0]  # return in seconds
-                # if spectrum is below the range, increase integration time
-                if target < low_spectrum:
-                    self._log_verbose(f"Spectrum value {target} is below the range ({low_spectrum}), increasing integration time.")
-                    if guessIntTime >= high:
-                        self._log_verbose(f"Integration time is too high, returning: {guessIntTime / 1000.0} seconds.")
-                        return [1, {"Error message": "Integration time too high"}]
-                    low = guessIntTime
-                # if spectrum is above the range, decrease integration time
-                else:
-                    self._log_verbose(f"Spectrum value {target} is above the range ({high_spectrum}), decreasing integration time.")
-                    if guessIntTime <= low:
-                        self._log_verbose(f"Integration time is too low, returning: {guessIntTime / 1000.0} seconds.")
-                        return [1, {"Error message": "Integration time too low"}]
-                    high = guessIntTime
-                # Compute new guess in milliseconds, rounded to nearest millisecond
-                guessIntTime = int(round((low + high) / 2))
-
-            self._log_verbose(f"Auto integration time calculation completed: {guessIntTime / 1000.0} seconds.")
-            return [0, guessIntTime / 1000.0]  # return in seconds
+                if self.autoTimePredictor.in_window(info[1]):
+                    self._log_verbose(f"Optimal integration time found: {guessIntTime} seconds.")
+                    self.autoTimePredictor.store(setpoint, guessIntTime)
+                    return [0, guessIntTime]  # return in seconds
+                # spectrum below the range at the longest allowed time
+                if target < self.autoValue_min and guessIntTime >= self.autoTime_max:
+                    self._log_verbose(f"Integration time is too high, returning: {guessIntTime} seconds.")
+                    return [1, {"Error message": "Integration time too high"}]
+                # spectrum above the range at the shortest allowed time
+                if target > self.autoValue_max and guessIntTime <= self.autoTime_min:
+                    self._log_verbose(f"Integration time is too low, returning: {guessIntTime} seconds.")
+                    return [1, {"Error message": "Integration time too low"}]
+                guessIntTime = self.autoTimePredictor.next_time(guessIntTime, info[1])
+                self._log_verbose(f"Spectrum value {target} is outside the range ({self.autoValue_min}, {self.autoValue_max}), next guess {guessIntTime} seconds.")
+
+            self._log_verbose(f"Auto integration time calculation completed: {guessIntTime} seconds.")
+            return [0, guessIntTime]  # return in seconds
         else:
             self._log_verbose("Integration time mode is not set to auto, cannot calculate auto integration time.")
             return [
@@ -652,6 +654,8 @@ class OOUSB2000_GUI(QObject):
         self._log_verbose(f"Connecting to spectrometer with integration time: {integrationTime}")
         if integrationTime:
             self.settings["integrationTime"] = integrationTime
+        # auto time results of a previous measurement are not valid for the next one
+        self.autoTimePredictor.clear_cache()
         try:
             self.drv.open()
             self._log_verbose("Spectrometer connected successfully.")
@@ -661,14 +665,25 @@ class OOUSB2000_GUI(QObject):
             return [4, {"Error message": f"{e}"}]
 
     def spectrometerDisconnect(self):
+        if self._streaming():
+            return self.spectrometerStreamStop()
         return [0, "OK"]
 
     def spectrometerSetIntegrationTime(self, integrationTime):
         try:
             self._log_verbose(f"Setting integration time to {integrationTime} seconds.")
+            restartTrigger = self.streamTrigger if self._streaming() else None
+            if restartTrigger:
+                [status, info] = self.spectrometerStreamStop()
+                if status:
+                    return [status, info]
 
-            self.drv.set_integration_time(s_to_micros(integrationTime))
+            with self._scan_lock:
+                self.drv.set_integration_time(s_to_micros(integrationTime))
 
+            if restartTrigger:
+                self.settings["integrationTime"] = integrationTime
+                return self.spectrometerStreamStart(trigger=restartTrigger)
             return [0, "OK"]
         except ThreadStopped:
             return [4, {"Error message": "Thread stopped"}]
@@ -702,7 +717,8 @@ class OOUSB2000_GUI(QObject):
         self._log_verbose(f"Device status: {self.drv.get_device_status()}")
 
         try:
-            return [0, self.drv.get_spectrum(self.settings["previewCorrection"])]
+            with self._scan_lock:
+                return [0, self.drv.get_spectrum(self.settings["previewCorrection"])]
         except ThreadStopped:
             pass
         except Exception as e:
@@ -710,16 +726,207 @@ class OOUSB2000_GUI(QObject):
             return [4, {"Error message": "Can not get spectrum"}]
 
     def spectrometerGetScan(self):
-        """Atomically get a spectrum to prevent weird behavior when a scan is already running."""
+        """Atomically get a spectrum to prevent weird behavior when a scan is already running.
 
+        While streaming, returns the first frame exposed after the call.
+        """
+        if self._streaming():
+            [status, info] = self.spectrometerStreamNextAfter()
+            return [status, info[0]] if not status else [status, info]
         try:
-            return [0, self.drv.get_spectrum(self.settings["previewCorrection"])]
+            with self._scan_lock:
+                return [0, self.drv.get_spectrum(self.settings["previewCorrection"])]
         except ThreadStopped:
             return [4, {"Error message": "Scan interrupted"}]
         except Exception as e:
             self._log_verbose(f"Exception during spectrum retrieval: {e}")
             return [4, {"Error message": "Can not get spectrum"}]
 
+    def _spectrometerSerial(self) -> str:
+        """Serial number of the connected device, keys the dark library."""
+        try:
+            return str(self.drv.spectro.serial_number)
+        except Exception:
+            return utils.SERIAL_NUMBER
+
+    def spectrometerGetAveragedScan(self, n=1, darkCorrection=False, reference=False):
+        """Mean of n scans at the current integration time, dark corrected on the fly if requested.
+
+        Args:
+            n (int): number of scans.
+            darkCorrection (bool): subtract the dark stored with spectrometerRecordDark for this device and integration time.
+            reference (bool): also divide by the dark corrected reference, gives relative transmission / reflection.
+
+        Returns:
+            [status, [mean, std]]: std is the standard deviation of the single scans per pixel.
+        """
+        if n < 1:
+            return [1, {"Error message": "Number of scans must be positive"}]
+        serial = self._spectrometerSerial()
+        integrationTime = self.drv.integration_time / 1e6
+        if darkCorrection or reference:
+            for kind in ("dark", "reference") if reference else ("dark",):
+                if self.darkLibrary.get(serial, integrationTime, kind) is None:
+                    return [1, {"Error message": f"No {kind} recorded for {serial} at {integrationTime} s"}]
+        accumulator = SpectrumAccumulator()
+        for _ in range(n):
+            [status, data] = self.spectrometerGetScan()
+            if status or isinstance(data, str):
+                return [status, data]
+            if darkCorrection or reference:
+                data = self.darkLibrary.correct(data, serial, integrationTime, reference)
+            accumulator.add(data)
+        self._log_verbose(f"Averaged {n} scans, dark correction: {darkCorrection}, reference: {reference}")
+        return [0, [accumulator.mean, accumulator.std]]
+
+    def spectrometerRecordDark(self, n=1, kind="dark"):
+        """Averages n scans and stores them as dark (or reference, kind="reference") for this device and the current
+        integration time. The library is kept in dark_library.npz in the plugin directory."""
+        if kind not in DarkLibrary.KINDS:
+            return [1, {"Error message": f"Unknown spectrum kind {kind}"}]
+        [status, info] = self.spectrometerGetAveragedScan(n)
+        if status or isinstance(info, str):
+            return [status, info]
+        try:
+            self.darkLibrary.store(self._spectrometerSerial(), self.drv.integration_time / 1e6, info[0], kind)
+            return [0, "OK"]
+        except Exception as e:
+            self._log_verbose(f"Exception during storing the {kind}: {e}")
+            return [4, {"Error message": f"Can not store the {kind}: {e}"}]
+
+    def _streaming(self) -> bool:
+        return self.stream is not None and self.stream.running
+
+    def spectrometerStreamStart(self, capacity=None, trigger="continuous"):
+        """Reads frames in the background at the device rate into a ring buffer.
+
+        Args:
+            capacity (int, optional): number of frames kept. Defaults to streamCapacity.
+            trigger (str): "continuous" (free running), "external" (external synchronization) or "edge"
+                (one scan per rising edge on the trigger input, e.g. from a SMU digio line).
+        """
+        if self._streaming():
+            return [1, {"Error message": "Spectrum stream is already running"}]
+        if trigger not in self.streamTriggers:
+            return [1, {"Error message": f"Unknown trigger {trigger}, expected one of {list(self.streamTriggers)}"}]
+        try:
+            self._log_verbose(f"Starting spectrum stream, trigger {trigger}.")
+            with self._scan_lock:
+                self.drv.trigger_mode(self.streamTriggers[trigger])
+            correction = self.settings["previewCorrection"]
+
+            def read_frame():
+                with self._scan_lock:
+                    return self.drv.get_spectrum(correction)
+
+            self._previewSequence = -1
+            self.stream = SpectrumStream(
+                read_frame,
+                self.settings["integrationTime"],
+                capacity or self.streamCapacity,
+                back_to_back=trigger == "continuous",
+            )
+            self.streamTrigger = trigger
+            self.stream.start()
+            return [0, "OK"]
+        except ThreadStopped:
+            return [4, {"Error message": "Thread stopped"}]
+        except Exception as e:
+            self._log_verbose(f"Exception during stream start: {e}")
+            self.stream = None
+            return [4, {"Error message": f"Can not start spectrum stream: {e}"}]
+
+    def spectrometerStreamStop(self):
+        """Stops the background reader and returns the spectrometer to free running mode.
+
+        A triggered reader may be blocked in a read that waits for a trigger that never comes, holding the device lock.
+        Switching the device to free running mode ends that read with a free running scan, so the mode is switched
+        before the reader is joined, without the lock if the reader holds it."""
+        if self.stream is None:
+            return [0, "OK"]
+        stream = self.stream
+        try:
+            stream.stop(timeout=0)  # no more reads after the current one
+            if self.streamTrigger != "continuous":
+                locked = self._scan_lock.acquire(blocking=False)
+                try:
+                    # without the lock this is the only call made while the reader waits in its read
+                    self.drv.trigger_mode(trigger_mode.CONTINUOUS)
+                finally:
+                    if locked:
+                        self._scan_lock.release()
+            stream.stop(timeout=stream.integration_time + 1)
+            if stream.running:
+                return [4, {"Error message": "Spectrum stream did not stop, the spectrometer does not respond"}]
+            self.stream = None
+            self._log_verbose(f"Spectrum stream stopped after {stream.count} frames, {stream.overruns} not read.")
+            return [0, "OK"]
+        except ThreadStopped:
+            return [4, {"Error message": "Thread stopped"}]
+        except Exception as e:
+            self._log_verbose(f"Exception during stream stop: {e}")
+            return [4, {"Error message": f"Can not stop spectrum stream: {e}"}]
+
+    def _previewFrame(self, stream):
+        """Streamed frame following the one shown last, so the preview shows every frame while it keeps up."""
+        frame = stream.next_frame(self._previewSequence)
+        self._previewSequence = frame[0]
+        return frame[3]
+
+    def _streamResult(self, func):
+        """[0, func(stream)], or an error if the stream is not running. The stream is passed to func because
+        spectrometerStreamStop may clear self.stream meanwhile."""
+        stream = self.stream
+        if stream is None or not stream.running:
+            return [1, {"Error message": "Spectrum stream is not running"}]
+        try:
+            return [0, func(stream)]
+        except (TimeoutError, RuntimeError) as e:
+            return [4, {"Error message": f"{e}"}]
+
+    def spectrometerStreamLatest(self):
+        """Last streamed frame, does not wait.
+
+        Returns:
+            [status, [spectrum, exposure start, exposure end]], times in time.monotonic() seconds. spectrum is None if no frame has arrived yet.
+        """
+
+        def latest(stream):
+            frame = stream.latest()
+            if frame is None:
+                return [None, None, None]
+            return [frame[3], frame[1], frame[2]]
+
+        return self._streamResult(latest)
+
+    def spectrometerStreamNextAfter(self, t=None, timeout=None):
+        """First streamed frame whose exposure started after t, waits for it.
+
+        Args:
+            t (float, optional): time.monotonic() value. Defaults to now, i.e. the first fresh frame.
+            timeout (float, optional): seconds to wait. Defaults to about three exposures, pass a longer one for triggered streams.
+
+        Returns:
+            [status, [spectrum, exposure start, exposure end]]
+        """
+
+        def next_after(stream):
+            frame = stream.next_after(time.monotonic() if t is None else t, timeout)
+            return [frame[3], frame[1], frame[2]]
+
+        return self._streamResult(next_after)
+
+    def spectrometerStreamAverage(self, n, timeout=None):
+        """Mean of the next n streamed frames."""
+        return self._streamResult(lambda stream: stream.average(n, timeout=timeout))
+
+    def spectrometerGetWavelength(self):
+        """Returns the wavelength axis in nm used when saving spectra, one value per pixel."""
+        try:
+            return [0, self.drv.get_wavelengths()]
+        except Exception as e:
+            return [4, {"Error message": f"{e}"}]
+
     ########Functions
     ###############save data
 
@@ -749,6 +956,7 @@ class OOUSB2000_GUI(QObject):
         # varDict['triggermode'] - external trigger = 1 / internal = 0
         # varDict['name'] - str:sample name
         # varDict['comment'] - str:comment
+        # varDict['timestamp'] - float:time.time() of the scan, optional
         comment = "Thorlabs FTS operated by pyIVSL\n"
         comment = f"{comment}#[SpectrumHeader]\n"
         comment = f"{comment}Date{separator}{datetime.now().strftime('%Y%m%d')}\n"
@@ -790,5 +998,7 @@ class OOUSB2000_GUI(QObject):
             comment = f'{comment}Comment{separator}"{varDict["comment"]}"\n'
         else:
             comment = f'{comment}Comment{separator} ""\n'
+        if "timestamp" in varDict:
+            comment = f"{comment}Timestamp{separator}{varDict['timestamp']}\n"
         comment = f"{comment}#[Data]\n"
         return comment
@@ -43,11 +43,14 @@ when unpacking, the data could be anything and contain any keys. lots of room fo
 - DependencyManager: Class to handle dependencies between plugins, including checking for missing dependencies and handling dependency-related GUI changes
 - LoggingHelper: Class for logging messages with different severity levels
 - SMUHelper: I don't know what this is yet.
+- AsyncFileWriter: Background thread that runs file writing jobs in order, so that measurement loops don't wait for the disk.
 
 
 """
 
+import queue
 import sys
+import threading
 import traceback
 from datetime import datetime
 from enum import Enum
@@ -1217,6 +1220,87 @@ class SMUHelper:
         return PyIVLSReturn.success({"smu_config": s})
 
 
+class AsyncFileWriter:
+    """Runs file writing jobs on a single background thread in the order they were submitted.
+
+    Meant for measurement loops where saving (e.g. np.savetxt of a spectrum) should not add to the time
+    spent on each point. Jobs must not share mutable data with the caller, pass copies if the caller keeps
+    modifying the data. Exceptions raised by jobs are collected and do not stop the writer.
+
+    Usage:
+        writer = AsyncFileWriter("SpecSMU")
+        writer.submit(createFile, varDict=varDict, address=address, data=spectrum)
+        ...
+        writer.close()  # waits until all jobs are written
+        if writer.errors: ...
+    """
+
+    _STOP = object()
+
+    def __init__(self, name: str = "AsyncFileWriter", max_pending: int = 0):
+        """
+        Args:
+            name (str): name of the writer thread, shows up in tracebacks.
+            max_pending (int): maximum number of queued jobs before submit() blocks. 0 means unlimited.
+        """
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._errors: List[Tuple[str, Exception]] = []
+        self._errors_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is self._STOP:
+                    return
+                func, args, kwargs = job
+                try:
+                    func(*args, **kwargs)
+                except Exception as e:
+                    with self._errors_lock:
+                        self._errors.append((getattr(func, "__name__", str(func)), e))
+            finally:
+                self._queue.task_done()
+
+    def submit(self, func, *args, **kwargs) -> None:
+        """Queue func(*args, **kwargs) to be run on the writer thread."""
+        if self._closed:
+            raise RuntimeError("AsyncFileWriter is closed")
+        self._queue.put((func, args, kwargs))
+
+    def flush(self) -> None:
+        """Block until all submitted jobs have been run."""
+        self._queue.join()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Run the remaining jobs and stop the writer thread. Safe to call more than once."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs waiting to be written."""
+        return self._queue.qsize()
+
+    @property
+    def errors(self) -> List[Tuple[str, Exception]]:
+        """List of (job name, exception) for failed jobs."""
+        with self._errors_lock:
+            return list(self._errors)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
 class GuiPluginBase:
     """TODO"""
 
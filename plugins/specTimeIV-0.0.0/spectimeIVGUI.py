@@ -12,12 +12,18 @@ This file should provide
 import os
 import time
 import copy
+import threading
+from typing import Optional
+
+import numpy as np
 from pathvalidate import is_valid_filename
 from PyQt6 import uic
 from PyQt6.QtWidgets import QVBoxLayout, QFileDialog, QWidget
 from MplCanvas import MplCanvas  # this should be moved to some pluginsShare
 from threadStopped import thread_with_exception, ThreadStopped
 from plugin_components import LoggingHelper, FileManager, GuiMapper, DependencyManager, PyIVLSReturn, DataOrder, PluginException
+from spectral_archive import SpectralArchiveWriter, archive_path
+from spectrometer_components import SampleStore, align_iv
 
 import pandas as pd
 
@@ -25,6 +31,7 @@ import pandas as pd
 class specTimeIVGUI:
     non_public_methods = []  # add function names here, if they should not be exported as public to another plugins
     public_methods = ["parse_settings_widget", "set_running", "setSettings", "sequenceStep", "set_gui_from_settings"]  # necessary for descendents of QObject, otherwise _get_public_methods returns a lot of QObject methods
+    _PLOT_INTERVAL = 0.5  # s, minimum time between plot redraws during the measurement
 
     ########Functions
     def __init__(self):
@@ -142,10 +149,12 @@ class specTimeIVGUI:
             "samplename": "lineEdit_sampleName",
             "comment": "lineEdit_comment",
             "timestep": "step_lineEdit",
+            "spectrostep": "spectroStep_lineEdit",
             "stopafter": "stopAfterLineEdit",
             "autosaveinterval": "autosaveLineEdit",
             "stoptimer": "stopTimerCheckBox",
             "autosave": "autosaveCheckBox",
+            "archive": "archiveCheckBox",
             # SMU configuration
             "singlechannel": "checkBox_singleChannel",
             "channel": "comboBox_channel",
@@ -174,6 +183,7 @@ class specTimeIVGUI:
             "address": {"validator": lambda x: isinstance(x, str) and len(x.strip()) > 0 and os.path.exists(x), "error_message": "Address is required"},
             "filename": {"validator": lambda x: isinstance(x, str) and is_valid_filename(x), "error_message": "filename must be a valid filename"},
             "timestep": {"validator": lambda x: isinstance(x, (float)) and x > 0, "error_message": "Time step must be positive"},
+            "spectrostep": {"validator": lambda x: isinstance(x, (float)) and x >= 0, "error_message": "Spectrum step must be zero or positive"},
             "stopafter": {"validator": lambda x: isinstance(x, (float)) and x > 0, "error_message": "Stop time must be positive"},
             "autosaveinterval": {"validator": lambda x: isinstance(x, (float)) and x > 0, "error_message": "Auto save interval must be positive"},
             "sourcelimit": {"validator": lambda x: isinstance(x, (float)) and x > 0, "error_message": "Source limit must be positive"},
@@ -613,11 +623,122 @@ class specTimeIVGUI:
 
         return PyIVLSReturn.success({"message": "Spectrometer initialized successfully"})
 
+    def _open_archive(self) -> SpectralArchiveWriter:
+        """Create the spectral archive for this run, named after the spectrometer filename."""
+        function_dict = self.dependency_manager.function_dict
+        spectro_functions = function_dict["spectrometer"][self.settings["spectrometer"]]
+        if "spectrometerGetWavelength" not in spectro_functions:
+            raise PluginException(f"Spectrometer plugin {self.settings['spectrometer']} does not provide spectrometerGetWavelength, can not save to archive")
+        status, wavelength = spectro_functions["spectrometerGetWavelength"]()
+        if status:
+            raise PluginException(f"Can not get wavelength axis for archive: {wavelength}")
+        header = {
+            "samplename": self.spectrometer_settings.get("samplename", ""),
+            "comment": self.spectrometer_settings.get("comment", ""),
+            "triggermode": 1 if self.spectrometer_settings.get("externalTrigger", False) else 0,
+            "csv_name_format": "{name}_scan_{scan:04.0f}_t_{timestamp:.2f}s.csv",
+            "settings": self.settings,
+        }
+        path = archive_path(self.spectrometer_settings["address"], self.spectrometer_settings["filename"])
+        self.logger.log_debug(f"_timeIVimplementation: saving spectra to archive {path}")
+        return SpectralArchiveWriter(path, wavelength, header=header, extra_fields=("i_drain", "v_drain"))
+
+    def _spectrumProducer(self, store: SampleStore, stop: threading.Event, errors: list):
+        """Spectrometer thread of _timeIVimplementation: takes scans every spectrostep seconds (back to back if 0) and stores them with their exposure time."""
+        function_dict = self.dependency_manager.function_dict
+        get_scan = function_dict["spectrometer"][self.settings["spectrometer"]]["spectrometerGetScan"]
+        integration_time = float(self.spectrometer_settings["integrationTime"])
+        next_scan = store.clock()
+        try:
+            while not stop.is_set():
+                t_start = store.clock()
+                status, spectrum = get_scan()
+                t_end = store.clock()
+                if status:
+                    self.logger.log_warn(f"Error getting spectrum: {spectrum}")
+                else:
+                    # the exposure starts with the call, the rest of the call is readout
+                    store.append(spectrum, t_start, t_start + min(integration_time, t_end - t_start))
+                next_scan = max(next_scan + self.settings["spectrostep"], t_end)
+                stop.wait(next_scan - store.clock())
+        except Exception as e:
+            errors.append(e)
+
+    def _saveSpectra(self, spectrum_store: SampleStore, iv_store: SampleStore, first_index: int, archive: Optional[SpectralArchiveWriter], until: Optional[float] = None) -> int:
+        """Saves the spectra from first_index on whose exposure ended before until (all if None) with the IV aligned to the exposure.
+
+        Returns:
+            int: index of the first spectrum not saved.
+        """
+        function_dict = self.dependency_manager.function_dict
+        spectrometer_name = self.settings["spectrometer"]
+        next_index = first_index
+        for index, t_start, t_end, spectrum in spectrum_store.since(first_index):
+            if until is not None and t_end > until:
+                break
+            next_index = index + 1
+            iv_times, iv_values = iv_store.around(t_start, t_end)
+            if len(iv_times) == 0:
+                # no IV sample yet (e.g. the SMU failed before its first point), the spectrum is saved without IV
+                source_i = source_v = drain_i = drain_v = float("nan")
+            else:
+                source_i, source_v, drain_i, drain_v = (float(x) for x in align_iv(iv_times, iv_values, t_start, t_end))
+            toc = (t_start + t_end) / 2
+            spectrum_filename = f"{self.spectrometer_settings['filename']}_scan_{index + 1:04d}_t_{toc:.2f}s.csv"
+
+            # Create metadata dictionary
+            varDict = {}
+            varDict["integrationtime"] = self.spectrometer_settings["integrationTime"]
+            varDict["triggermode"] = 1 if self.spectrometer_settings.get("externalTrigger", False) else 0
+            varDict["name"] = self.spectrometer_settings.get("samplename", "")
+            varDict["timestamp"] = toc
+
+            # add IV data (averaged over the exposure) to the comment on the spectrometer file
+            if not self.settings["singlechannel"]:
+                varDict["comment"] = self.spectrometer_settings.get("comment", "") + f" Time: {toc:.2f}s, Source I/V: {[source_i, source_v]}, Drain I/V: {[drain_i, drain_v]}"
+            else:
+                varDict["comment"] = self.spectrometer_settings.get("comment", "") + f" Time: {toc:.2f}s, Source I/V: {[source_i, source_v]}"
+
+            # Save spectrum file
+            spectrum_address = self.spectrometer_settings["address"] + os.sep + spectrum_filename
+            try:
+                if archive is not None:
+                    archive.append(spectrum, timestamp=toc, integrationtime=varDict["integrationtime"], i_before=source_i, v_before=source_v, i_drain=drain_i, v_drain=drain_v)
+                else:
+                    status, state = function_dict["spectrometer"][spectrometer_name]["createFile"](varDict=varDict, filedelimeter=";", address=spectrum_address, data=spectrum)
+                    if status:
+                        self.logger.log_error(f"Error saving spectrum: {state}")
+                    else:
+                        self.logger.log_debug(f"Spectrum saved to: {spectrum_filename}")
+            except Exception as e:
+                self.logger.log_error(f"Error saving spectrum: {e}")
+        return next_index
+
+    def _updatePlot(self, timeData, sourceV, sourceI, drainV=None, drainI=None):
+        self.axes.cla()
+        self.axes_twinx.cla()
+        self.axes.plot(timeData, sourceV, "bo")
+        self.axes_twinx.plot(timeData, sourceI, "b*")
+        if drainV is not None and drainI is not None:
+            self.axes.plot(timeData, drainV, "go")
+            self.axes_twinx.plot(timeData, drainI, "g*")
+        self.axes.set_xlabel("time (s)")
+        self.axes.set_ylabel("Voltage (V)")
+        self.axes_twinx.set_ylabel("Current (A)")
+        self.axes.relim()
+        self.axes.autoscale_view()
+        self.sc.draw()
+
     def _timeIVimplementation(self):
+        """IV and spectra are taken by two threads stamped from the same clock.
+
+        This thread samples the IV every timestep, plots and saves. The spectrometer thread (_spectrumProducer) scans
+        independently, so the IV rate is not limited by the integration time. A spectrum is saved once IV samples
+        up to the end of its exposure exist, with the IV averaged over the exposure.
+        """
         function_dict = self.dependency_manager.function_dict
         self.logger.log_debug("_timeIVimplementation: Creating file header.")
         header = self.create_file_header(self.settings, self.smu_settings)
-        spectrometer_name = self.settings["spectrometer"]
         smu_name = self.settings["smu"]
 
         smu_init_result = self._initialize_smu()
@@ -632,143 +753,97 @@ class specTimeIVGUI:
             raise PluginException(f"Error initializing Spectrometer: {spectrometer_init_result.error_message}")
         # spectrometer now connected with integration time set
 
-        timeData = []
-        startTic = time.time()
-        saveTic = startTic
-        scan_counter = 0  # Counter for spectrometer file naming
+        iv_store = SampleStore()
+        spectrum_store = SampleStore(t0=iv_store.t0)
+        stop_spectra = threading.Event()
+        spectrum_errors = []
+        spectro_thread = threading.Thread(target=self._spectrumProducer, args=(spectrum_store, stop_spectra, spectrum_errors), name="specTimeIV spectrometer", daemon=True)
         self.logger.log_debug("_timeIVimplementation: SMU initialized successfully.")
 
         # start of measurement loop
-        drainIV = None  # Initialize to avoid unbound variable issues
+        timeData = []
         sourceV = []
         sourceI = []
-        drainV = None
-        drainI = None
-        while True:
-            # fetch IV Data for source
-            self.logger.log_debug("_timeIVimplementation: Fetching IV data for source channel.")
-
-            # Handle legacy [status, data] format for smu_getIV
-            status, sourceIV = function_dict["smu"][smu_name]["smu_getIV"](self.settings["channel"])
-            if status:
-                raise PluginException(f"SMU getIV error for source: {sourceIV}")
-
-            # fetch IV Data for drain if not in single channel mode
-            if not self.settings["singlechannel"]:
-                self.logger.log_debug("_timeIVimplementation: Fetching IV data for drain channel.")
-
-                status, drainIV = function_dict["smu"][smu_name]["smu_getIV"](self.settings["drainchannel"])
+        drainV = None if self.settings["singlechannel"] else []
+        drainI = None if self.settings["singlechannel"] else []
+        saved_spectra = 0
+        saveTic = 0.0
+        plotTic = -self._PLOT_INTERVAL
+        next_sample = 0.0
+        # in archive mode the spectra of the run go to one archive instead of a csv per scan
+        archive = self._open_archive() if self.settings.get("archive", False) else None
+        try:
+            spectro_thread.start()
+            while True:
+                # fetch IV Data for source
+                self.logger.log_debug("_timeIVimplementation: Fetching IV data for source channel.")
+                tic = iv_store.clock()
+
+                # Handle legacy [status, data] format for smu_getIV
+                status, sourceIV = function_dict["smu"][smu_name]["smu_getIV"](self.settings["channel"])
                 if status:
-                    raise PluginException(f"SMU getIV error for drain: {drainIV}")
-            else:
-                drainIV = None
+                    raise PluginException(f"SMU getIV error for source: {sourceIV}")
 
-            currentTime = time.time()
-            toc = currentTime - startTic
+                # fetch IV Data for drain if not in single channel mode
+                if not self.settings["singlechannel"]:
+                    self.logger.log_debug("_timeIVimplementation: Fetching IV data for drain channel.")
 
-            # Plot doesn't exist yet, initialize it
-            if not timeData:
-                self.logger.log_debug("_timeIVimplementation: Initializing plots.")
-                self.axes.cla()
-                self.axes_twinx.cla()
-                timeData.append(toc)
-                sourceV = [sourceIV[DataOrder.V.value]]
-                plot_refs = self.axes.plot(timeData, sourceV, "bo")
-                self.axes.set_xlabel("time (s)")
-                self.axes.set_ylabel("Voltage (V)")
-                self._plot_sourceV = plot_refs[0]
-                self.axes_twinx.set_ylabel("Current (A)")
-                sourceI = [sourceIV[DataOrder.I.value]]
-                plot_refs = self.axes_twinx.plot(timeData, sourceI, "b*")
-                self._plot_sourceI = plot_refs[0]
-
-                if not self.settings["singlechannel"] and drainIV is not None:
-                    drainV = [drainIV[DataOrder.V.value]]
-                    plot_refs = self.axes.plot(timeData, drainV, "go")
-                    self._plot_drainV = plot_refs[0]
-                    drainI = [drainIV[DataOrder.I.value]]
-                    plot_refs = self.axes_twinx.plot(timeData, drainI, "g*")
-                    self._plot_drainI = plot_refs[0]
+                    status, drainIV = function_dict["smu"][smu_name]["smu_getIV"](self.settings["drainchannel"])
+                    if status:
+                        raise PluginException(f"SMU getIV error for drain: {drainIV}")
                 else:
-                    drainI = None
-                    drainV = None
-            else:
-                self.logger.log_debug("_timeIVimplementation: Updating plots.")
+                    drainIV = None
+
+                toc = (tic + iv_store.clock()) / 2
                 timeData.append(toc)
-                self.axes.cla()
                 sourceV.append(sourceIV[DataOrder.V.value])
                 sourceI.append(sourceIV[DataOrder.I.value])
-                self.axes.plot(timeData, sourceV, "bo")
-                self.axes_twinx.cla()
-                self.axes_twinx.plot(timeData, sourceI, "b*")
-
-                if not self.settings["singlechannel"] and drainIV is not None and drainV is not None and drainI is not None:
+                if drainIV is not None:
                     drainV.append(drainIV[DataOrder.V.value])
                     drainI.append(drainIV[DataOrder.I.value])
-                    self.axes_twinx.plot(timeData, drainI, "g*")
-                    self.axes.plot(timeData, drainV, "go")
-
-            # plot is now updated, redraw the canvas
-            self.axes.relim()
-            self.axes.autoscale_view()
-            self.sc.draw()
-
-            # Take spectrometer scan after each plot update
-            self.logger.log_debug("_timeIVimplementation: Taking spectrometer scan.")
-
-            # Handle legacy [status, data] format for spectrometerGetScan
-            status, spectrum = function_dict["spectrometer"][spectrometer_name]["spectrometerGetScan"]()
-            if status:
-                self.logger.log_warn(f"Error getting spectrum: {spectrum}")
-                spectrum = None
-
-            if spectrum is not None:
-                # Save spectrum data with timestamp and IV data
-                scan_counter += 1
-                spectrum_filename = f"{self.spectrometer_settings['filename']}_scan_{scan_counter:04d}_t_{toc:.2f}s.csv"
-
-                # Create metadata dictionary
-                varDict = {}
-                varDict["integrationtime"] = self.spectrometer_settings["integrationTime"]
-                varDict["triggermode"] = 1 if self.spectrometer_settings.get("externalTrigger", False) else 0
-                varDict["name"] = self.spectrometer_settings.get("samplename", "")
-                varDict["timestamp"] = toc
-                sourceIV_formatted = [float(sourceIV[DataOrder.I.value]), float(sourceIV[DataOrder.V.value])]
-
-                # add IV data to the comment on the spectrometer file
-                if not self.settings["singlechannel"] and drainI is not None and drainV is not None:
-                    drainIV_formatted = [float(drainI[-1]), float(drainV[-1])]
-                    varDict["comment"] = self.spectrometer_settings.get("comment", "") + f" Time: {toc:.2f}s, Source I/V: {sourceIV_formatted}, Drain I/V: {drainIV_formatted}"
+                iv_store.append((sourceI[-1], sourceV[-1], drainI[-1] if drainIV is not None else np.nan, drainV[-1] if drainIV is not None else np.nan), toc)
+
+                # redrawing takes longer than an IV sample, so it is rate limited
+                if toc - plotTic >= self._PLOT_INTERVAL:
+                    self.logger.log_debug("_timeIVimplementation: Updating plots.")
+                    self._updatePlot(timeData, sourceV, sourceI, drainV, drainI)
+                    plotTic = toc
+
+                if spectrum_errors:
+                    raise PluginException(f"Spectrometer thread stopped: {spectrum_errors[0]}")
+                saved_spectra = self._saveSpectra(spectrum_store, iv_store, saved_spectra, archive, until=toc)
+
+                # check if it is time to stop
+                if self.settings["stoptimer"]:
+                    if toc >= self.settings["stopafter"] * 60:  # convert to sec from min
+                        self.logger.log_debug("_timeIVimplementation: Stop timer reached, saving data and exiting.")
+                        self._saveData(header, timeData, sourceI, sourceV, drainI, drainV)
+                        break
+
+                # check if it is time to autosave
+                if self.settings["autosave"]:
+                    if (toc - saveTic) >= self.settings["autosaveinterval"] * 60:  # convert to sec from min
+                        self.logger.log_debug("_timeIVimplementation: Autosave interval reached, saving data.")
+                        self._saveData(header, timeData, sourceI, sourceV, drainI, drainV)
+                        saveTic = toc
+
+                # take a nap until we need to take the next measurement, the schedule does not drift with the loop time
+                next_sample += self.settings["timestep"]
+                delay = next_sample - iv_store.clock()
+                if delay > 0:
+                    time.sleep(delay)
                 else:
-                    varDict["comment"] = self.spectrometer_settings.get("comment", "") + f" Time: {toc:.2f}s, Source I/V: {sourceIV_formatted}"
-
-                # Save spectrum file
-                spectrum_address = self.spectrometer_settings["address"] + os.sep + spectrum_filename
-                try:
-                    status, state = function_dict["spectrometer"][spectrometer_name]["createFile"](varDict=varDict, filedelimeter=";", address=spectrum_address, data=spectrum)
-                    if status:
-                        self.logger.log_error(f"Error saving spectrum: {state}")
-                    else:
-                        self.logger.log_debug(f"Spectrum saved to: {spectrum_filename}")
-                except Exception as e:
-                    self.logger.log_error(f"Error saving spectrum: {e}")
-
-            # check if it is time to stop
-            if self.settings["stoptimer"]:
-                if (currentTime - startTic) >= self.settings["stopafter"] * 60:  # convert to sec from min
-                    self.logger.log_debug("_timeIVimplementation: Stop timer reached, saving data and exiting.")
-                    self._saveData(header, timeData, sourceI, sourceV, drainI, drainV)
-                    break
-
-            # check if it is time to autosave
-            if self.settings["autosave"]:
-                if (currentTime - saveTic) >= self.settings["autosaveinterval"] * 60:  # convert to sec from min
-                    self.logger.log_debug("_timeIVimplementation: Autosave interval reached, saving data.")
-                    self._saveData(header, timeData, sourceI, sourceV, drainI, drainV)
-                    saveTic = currentTime
-
-            # take a nap until we need to take the next measurement
-            time.sleep(self.settings["timestep"])
+                    next_sample -= delay  # behind schedule, continue from now instead of catching up
+        finally:
+            stop_spectra.set()
+            if spectro_thread.is_alive():
+                spectro_thread.join()
+            # spectra taken after the last IV sample are saved with nan IV
+            try:
+                self._saveSpectra(spectrum_store, iv_store, saved_spectra, archive)
+            finally:
+                if archive is not None:
+                    archive.close()
 
         self.logger.log_debug("_timeIVimplementation: Completed successfully.")
         return PyIVLSReturn.success({"message": "OK"})
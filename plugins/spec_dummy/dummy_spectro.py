@@ -38,12 +38,13 @@ from pathvalidate import is_valid_filename
 from PyQt6 import uic
 from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import QVBoxLayout, QFileDialog, QWidget
-from MplCanvas import MplCanvas  # type: ignore
+from MplCanvas import LiveLinePlot, MplCanvas  # type: ignore
 from threadStopped import ThreadStopped, thread_with_exception  # type: ignore
 from threading import Lock
 import copy
 
 from mockspec import MockCCSDRV
+from spectrometer_components import DarkLibrary, IntegrationTimePredictor, SpectrumAccumulator, wait_for_scan
 from plugin_components import (
     PyIVLSReturn,
     LoggingHelper,
@@ -68,6 +69,7 @@ class dummy_spectro_GUI:
     autoValue_min = 0.2  # spectrum value in arb.(?) units
     autoValue_max = 0.8  # spectrum value in arb.(?) units
     intTimeMaxIterations = 10
+    scanTimeout = 2  # s, allowed beyond the integration time before a scan is considered lost
 
     ########Functions
     def __init__(self):
@@ -85,8 +87,12 @@ class dummy_spectro_GUI:
         assert self.settingsWidget is not None
         assert self.previewWidget is not None
 
-        # create the driver
-        self.drv = MockCCSDRV()
+        correction_file = r"SC175_correction"
+        self.correction = np.loadtxt(self.path + correction_file)
+        self.logger.log_debug(f"Loaded correction data from {correction_file} with shape {self.correction.shape}")
+
+        # create the simulated driver, it uses the wavelength axis of the correction
+        self.drv = MockCCSDRV(wavelength=self.correction[:, 0])
 
         self._connect_signals()
         self._create_plt()
@@ -95,13 +101,13 @@ class dummy_spectro_GUI:
         self.preview_running = False
         self.integrationTimeChanged = False
         self.scanRunning = False
-
-        correction_file = r"SC175_correction"
-        self.correction = np.loadtxt(self.path + correction_file)
-        self.logger.log_debug(f"Loaded correction data from {correction_file} with shape {self.correction.shape}")
+        self.scanStartTime = None  # time.monotonic() of the last started scan, None for triggered scans
+        self.lastScanOverhead = None  # s, time of the last scan beyond the integration time
         self.settings = {}
 
         self._scan_lock = Lock()
+        self.autoTimePredictor = IntegrationTimePredictor(self.autoTime_min, self.autoTime_max, self.autoValue_min, self.autoValue_max)
+        self.darkLibrary = DarkLibrary(self.path + "dark_library.npz")
 
     def _connect_signals(self):
         self.settingsWidget.connectButton.clicked.connect(self._connectAction)  # type: ignore
@@ -123,6 +129,9 @@ class dummy_spectro_GUI:
 
         self.axes.set_xlim(const.CCS175_MIN_WV, const.CCS175_MAX_WV)  # limits are given by spectral range of the device
 
+        # persistent line, updated by blitting on every preview frame
+        self.previewLine = LiveLinePlot(self.sc, self.axes)
+
         layout = QVBoxLayout()
         layout.addWidget(self.sc._create_toolbar(self.previewWidget))
         layout.addWidget(self.sc)
@@ -147,15 +156,7 @@ class dummy_spectro_GUI:
         else:
             preview_data = info
         try:
-            xmin, xmax = self.axes.get_xlim()
-            ymin, ymax = self.axes.get_ylim()
-            self.axes.cla()
-            self.axes.set_xlabel("Wavelength (nm)")
-            self.axes.set_ylabel("Intensity (calib. arb. un.)")
-            self.axes.plot(self.correction[:, 0], preview_data, "b-")
-            self.axes.set_xlim(xmin, xmax)
-            self.axes.set_ylim(ymin, ymax)
-            self.sc.draw()
+            self.previewLine.update(self.correction[:, 0], preview_data)
             self.lastspectrum = [info, self.settings]
             return [0, [self.correction[:, 0], info]]
         except Exception as e:
@@ -327,6 +328,7 @@ class dummy_spectro_GUI:
         external_cleanup_args=None,
         pause_duration: float = 0.0,
         last_integration_time: Optional[float] = None,
+        setpoint: Optional[float] = None,
     ) -> tuple[int, float | dict]:
         """
         Calculates the optimal integration time, allowing external actions and cleanup with arguments.
@@ -337,36 +339,25 @@ class dummy_spectro_GUI:
             external_cleanup (callable): External cleanup function to execute after auto time calculation.
             external_cleanup_args (tuple): Arguments for the external cleanup function.
             pause_duration (float): Duration to pause after each iteration.
+            last_integration_time (float): Initial guess in seconds, e.g. the result for the previous point. Takes precedence over the per-setpoint cache.
+            setpoint (float): SMU setpoint the search is done for. Results are cached per setpoint and
+                the initial guess for a new setpoint is extrapolated from them.
 
         Returns:
             tuple[int, float | dict]: Status and integration time or error information.
         """
         self.logger.log_debug("Calculating auto integration time.")
-        low = self.autoTime_min * 1000  # time min ms
-        high = self.autoTime_max * 1000  # time max ms
-        low_spectrum = self.autoValue_min  # min spectrum value
-        high_spectrum = self.autoValue_max  # max spectrum value
-
         if self.settings["integrationtimetype"] == "auto":
-            # initial guess for time if not provided
-            if last_integration_time is None:
-                if self.settings["useintegrationtimeguess"]:
-                    # guess from current value
-                    guessIntTime = self.settings["integrationTime"] * 1000  # ms
-                else:
-                    # guess from min and max
-                    guessIntTime = (self.autoTime_min + self.autoTime_max) / 2 * 1000  # ms
-            # initial guess provided as argument, use that.
-            else:
-                guessIntTime = last_integration_time * 1000  # ms
+            # initial guess: the provided time, then the cached result for the setpoint, then the settings
+            fallback = self.settings["integrationTime"] if self.settings["useintegrationtimeguess"] else None
+            self.autoTimePredictor.start()
+            guessIntTime = self.autoTimePredictor.initial_guess(setpoint, fallback, explicit=last_integration_time)  # s
 
-            # start iterating through integration times using guessIntTime as initial guess
+            # scan, then jump to the integration time predicted from the scans so far
             for iter in range(self.intTimeMaxIterations):
-                self.logger.log_debug(f"Iteration {iter + 1}: Current guess = {guessIntTime} ms.")
-                self.settings["integrationTime"] = (
-                    guessIntTime / 1000.0
-                )  # needed for keeping self.lastspectrum in order
-                [status, info] = self.spectrometerSetIntegrationTime(guessIntTime / 1000.0)  # s
+                self.logger.log_debug(f"Iteration {iter + 1}: Current guess = {guessIntTime * 1000} ms.")
+                self.settings["integrationTime"] = guessIntTime  # needed for keeping self.lastspectrum in order
+                [status, info] = self.spectrometerSetIntegrationTime(guessIntTime)  # s
                 if status:
                     self.logger.log_debug(f"getAutoTime: Failed to set integration time. {status}, {info}")
                     return [status, info]
@@ -385,26 +376,21 @@ class dummy_spectro_GUI:
                         self.logger.log_debug("getAutoTime: External action completed without standard return value")
 
                 [status, info] = self._update_spectrum()
-                self.logger.log_debug(
-                    f"getAutoTime: Retrieved spectrum with shape {info[1].shape} and max value {max(info[1])}."
-                )
                 if status:
                     self.logger.log_debug(f"getAutoTime: Failed to update spectrum. {status}, {info}")
                     return [status, info]
+                self.logger.log_debug(f"getAutoTime: Retrieved spectrum with shape {info[1].shape} and max value {max(info[1])}.")
                 # save the spectrum if needed
                 if self.settings["saveattempts_check"]:
                     varDict = {}
-                    varDict["integrationtime"] = guessIntTime / 1000.0
+                    varDict["integrationtime"] = guessIntTime
                     varDict["triggermode"] = 1 if self.settings["externalTrigger"] else 0
                     varDict["name"] = self.settings["samplename"]
                     varDict["comment"] = self.settings["comment"] + " Auto adjust of integration time."
                     self.createFile(
                         varDict=varDict,
                         filedelimeter=self.filedelimeter,
-                        address=self.settings["address"]
-                        + os.sep
-                        + self.settings["filename"]
-                        + f"_{int(guessIntTime)}ms.csv",
+                        address=self.settings["address"] + os.sep + self.settings["filename"] + f"_{int(guessIntTime * 1000)}ms.csv",
                         data=info[1],
                     )
                 # external cleanup if needed
@@ -426,36 +412,23 @@ class dummy_spectro_GUI:
 
                 target = max(info[1])  # target value to optimize
                 # if spectrum is in the range, found good integration time
-                if low_spectrum <= target <= high_spectrum:
-                    self.logger.log_debug(f"Optimal integration time found: {guessIntTime / 1000.0} seconds.")
-                    return [0, guessIntTime / 1000.0]  # return in seconds
-                # if spectrum is below the range, increase integration time
-                if target < low_spectrum:
-                    self.logger.log_debug(
-                        f"Spectrum value {target} is below the range ({low_spectrum}), increasing integration time."
-                    )
-                    if guessIntTime >= high:
-                        self.logger.log_debug(
-                            f"Integration time is too high, returning: {guessIntTime / 1000.0} seconds."
-                        )
-                        return [1, {"Error message": "Integration time too high"}]
-                    low = guessIntTime
-                # if spectrum is above the range, decrease integration time
-                else:
-                    self.logger.log_debug(
-                        f"Spectrum value {target} is above the range ({high_spectrum}), decreasing integration time."
-                    )
-                    if guessIntTime <= low:
-                        self.logger.log_debug(
-                            f"Integration time is too low, returning: {guessIntTime / 1000.0} seconds."
-                        )
-                        return [1, {"Error message": "Integration time too low"}]
-                    high = guessIntTime
-                # Compute new guess in milliseconds, rounded to nearest millisecond
-                guessIntTime = int(round((low + high) / 2))
-
-            self.logger.log_debug(f"Auto integration time calculation completed: {guessIntTime / 1000.0} seconds.")
-            return [0, guessIntTime / 1000.0]  # return in seconds
+                if self.autoTimePredictor.in_window(info[1]):
+                    self.logger.log_debug(f"Optimal integration time found: {guessIntTime} seconds.")
+                    self.autoTimePredictor.store(setpoint, guessIntTime)
+                    return [0, guessIntTime]  # return in seconds
+                # spectrum below the range at the longest allowed time
+                if target < self.autoValue_min and guessIntTime >= self.autoTime_max:
+                    self.logger.log_debug(f"Integration time is too high, returning: {guessIntTime} seconds.")
+                    return [1, {"Error message": "Integration time too high"}]
+                # spectrum above the range at the shortest allowed time
+                if target > self.autoValue_max and guessIntTime <= self.autoTime_min:
+                    self.logger.log_debug(f"Integration time is too low, returning: {guessIntTime} seconds.")
+                    return [1, {"Error message": "Integration time too low"}]
+                guessIntTime = self.autoTimePredictor.next_time(guessIntTime, info[1])
+                self.logger.log_debug(f"Spectrum value {target} is outside the range ({self.autoValue_min}, {self.autoValue_max}), next guess {guessIntTime} seconds.")
+
+            self.logger.log_debug(f"Auto integration time calculation completed: {guessIntTime} seconds.")
+            return [0, guessIntTime]  # return in seconds
         else:
             self.logger.log_debug("Integration time mode is not set to auto, cannot calculate auto integration time.")
             return [
@@ -727,6 +700,8 @@ class dummy_spectro_GUI:
         self.logger.log_debug(f"Connecting to spectrometer with integration time: {integrationTime}")
         if integrationTime:
             self.settings["integrationTime"] = integrationTime
+        # auto time results of a previous measurement are not valid for the next one
+        self.autoTimePredictor.clear_cache()
         try:
             status = self.drv.open(const.CCS175_VID, const.CCS175_PID, self.settings["integrationTime"])
             if not status:
@@ -786,6 +761,7 @@ class dummy_spectro_GUI:
             if self.scanRunning:
                 self.logger.log_debug("Scan is already running.")
                 return [1, {"Error message": "Scan is already running"}]
+            self.scanStartTime = time.monotonic()
             self.drv.start_scan()
             self.scanRunning = True
             self.logger.log_debug("Spectrometer scan started successfully.")
@@ -796,6 +772,27 @@ class dummy_spectro_GUI:
             self.logger.log_debug(f"Exception during scan start: {e}")
             return [4, {"Error message": "Can not start scan"}]
 
+    @public
+    def spectrometerArmTrigger(self):
+        """Arms a single scan that starts on the external trigger input. Collect it with spectrometerGetSpectrum.
+
+        Used for hardware timed measurements where the trigger comes from e.g. a SMU digio line.
+        """
+        self.logger.log_debug("Arming spectrometer for external trigger.")
+        try:
+            if self.scanRunning:
+                self.logger.log_debug("Scan is already running.")
+                return [1, {"Error message": "Scan is already running"}]
+            self.drv.start_scan_ext_trigger()
+            self.scanStartTime = None
+            self.scanRunning = True
+            return [0, "OK"]
+        except ThreadStopped:
+            return [0, "ThreadStopped"]
+        except Exception as e:
+            self.logger.log_debug(f"Exception during arming: {e}")
+            return [4, {"Error message": "Can not arm external trigger"}]
+
     @public
     def spectrometerGetSpectrum(self):
         """Reads the spectrum from the spectrometer, waits for the scan to finish if necessary.
@@ -805,20 +802,29 @@ class dummy_spectro_GUI:
         """
         self.logger.log_debug("Getting spectrum from spectrometer.")
         try:
-            while self.scanRunning:
-                if "SCAN_TRANSFER" not in self.drv.get_device_status():
-                    self.logger.log_debug("Waiting for scan to finish.")
-                    time.sleep(self.settings["integrationTime"])
-                else:
-                    break
-            if not self.scanRunning:
+            integrationTime = self.drv.integration_time
+            if self.scanStartTime is None:
+                # triggered scan, the end of the exposure is not known
+                deadline = None
+                timeout = None
+            else:
+                deadline = self.scanStartTime + integrationTime
+                timeout = deadline + self.scanTimeout
+            if not wait_for_scan(self.drv.scan_ready, deadline, timeout, cancelled=lambda: not self.scanRunning):
                 self.logger.log_debug("Scan stopped before completion.")
                 return [1, {"Error message": "Scan stopped"}]
-            else:
-                self.logger.log_debug("Spectrum retrieved successfully.")
-                return [0, self.drv.get_scan_data()]
+            data = self.drv.get_scan_data()
+            self.scanRunning = False
+            if self.scanStartTime is not None:
+                self.lastScanOverhead = time.monotonic() - self.scanStartTime - integrationTime
+                self.logger.log_debug(f"Spectrum retrieved, {integrationTime:.4f} s exposure, overhead {self.lastScanOverhead * 1000:.1f} ms.")
+            return [0, data]
         except ThreadStopped:
             pass
+        except TimeoutError as e:
+            self.logger.log_debug(f"Scan did not finish: {e}")
+            self.scanRunning = False
+            return [4, {"Error message": f"Scan did not finish within {self.scanTimeout} s after the integration time"}]
         except Exception as e:
             self.logger.log_debug(f"Exception during spectrum retrieval: {e}")
             self.scanRunning = False
@@ -837,8 +843,10 @@ class dummy_spectro_GUI:
                     # Scan is running, read the stale data
                     _ = self.drv.get_scan_data()
                 # No scan running, start a new scan
+                scanStart = time.monotonic()
                 self.drv.start_scan()
                 data = self.drv.get_scan_data()
+                self.lastScanOverhead = time.monotonic() - scanStart - self.drv.integration_time
                 self.scanRunning = False
                 return [0, data]
             except ThreadStopped:
@@ -846,6 +854,95 @@ class dummy_spectro_GUI:
             except Exception as e:
                 return [4, {"Error message": f"Can not get scan: {e}"}]
 
+    @public
+    def spectrometerSetExcitation(self, level):
+        """Sets the excitation of the simulated emission line, 1 gives a peak of about 0.3 at 100 ms.
+
+        Replaces the coupling to the SMU set up in plugin.ini, meant for scripts and benchmarks without an SMU.
+        """
+        try:
+            self.drv.excitation_source = None
+            self.drv.set_excitation(float(level))
+            return [0, "OK"]
+        except Exception as e:
+            return [1, {"Error message": f"{e}"}]
+
+    def _coupleSMU(self, smu_functions: dict, channel: str, gain: float) -> None:
+        """Makes the simulated emission follow the SMU: excitation = gain * |current| of the channel,
+        read at the start of every exposure.
+
+        Args:
+            smu_functions (dict): public functions of the SMU plugin.
+            channel (str): SMU channel, e.g. "smua".
+            gain (float): excitation per ampere.
+        """
+        getIV = smu_functions["smu_getIV"]
+
+        def excitation():
+            [status, iv] = getIV(channel)
+            if status:
+                raise RuntimeError(f"Can not read the SMU: {iv}")
+            return gain * abs(float(iv[0]))
+
+        self.drv.excitation_source = excitation
+        self.logger.log_debug(f"Simulated emission coupled to {channel}, {gain} per A")
+
+    def _spectrometerSerial(self) -> str:
+        """Serial number of the connected device, keys the dark library."""
+        return "dummy"
+
+    @public
+    def spectrometerGetAveragedScan(self, n=1, darkCorrection=False, reference=False):
+        """Mean of n scans at the current integration time, dark corrected on the fly if requested.
+
+        Args:
+            n (int): number of scans.
+            darkCorrection (bool): subtract the dark stored with spectrometerRecordDark for this device and integration time.
+            reference (bool): also divide by the dark corrected reference, gives relative transmission / reflection.
+
+        Returns:
+            [status, [mean, std]]: std is the standard deviation of the single scans per pixel.
+        """
+        if n < 1:
+            return [1, {"Error message": "Number of scans must be positive"}]
+        serial = self._spectrometerSerial()
+        integrationTime = self.drv.integration_time
+        if darkCorrection or reference:
+            for kind in ("dark", "reference") if reference else ("dark",):
+                if self.darkLibrary.get(serial, integrationTime, kind) is None:
+                    return [1, {"Error message": f"No {kind} recorded for {serial} at {integrationTime} s"}]
+        accumulator = SpectrumAccumulator()
+        for _ in range(n):
+            [status, data] = self.spectrometerGetScan()
+            if status or isinstance(data, str):
+                return [status, data]
+            if darkCorrection or reference:
+                data = self.darkLibrary.correct(data, serial, integrationTime, reference)
+            accumulator.add(data)
+        self.logger.log_debug(f"Averaged {n} scans, dark correction: {darkCorrection}, reference: {reference}")
+        return [0, [accumulator.mean, accumulator.std]]
+
+    @public
+    def spectrometerRecordDark(self, n=1, kind="dark"):
+        """Averages n scans and stores them as dark (or reference, kind="reference") for this device and the current
+        integration time. The library is kept in dark_library.npz in the plugin directory."""
+        if kind not in DarkLibrary.KINDS:
+            return [1, {"Error message": f"Unknown spectrum kind {kind}"}]
+        [status, info] = self.spectrometerGetAveragedScan(n)
+        if status or isinstance(info, str):
+            return [status, info]
+        try:
+            self.darkLibrary.store(self._spectrometerSerial(), self.drv.integration_time, info[0], kind)
+            return [0, "OK"]
+        except Exception as e:
+            self.logger.log_debug(f"Exception during storing the {kind}: {e}")
+            return [4, {"Error message": f"Can not store the {kind}: {e}"}]
+
+    @public
+    def spectrometerGetWavelength(self):
+        """Returns the wavelength axis in nm used when saving spectra, one value per pixel."""
+        return [0, self.correction[:, 0]]
+
     ########Functions
     ###############save data
 
@@ -1,18 +1,72 @@
-import numpy as np
+"""
+Simulated CCS175 for spec_dummy.
+
+Keeps the timing of the real device, so that autotime, SpecSMU and other sequences can be run and benchmarked without
+hardware:
+
+- start_scan returns immediately, the exposure runs for integration_time from the call
+- the frame is ready (SCAN_TRANSFER) readout_time after the end of the exposure
+- get_scan_data blocks until the frame is ready and then for the USB transfer of the raw frame
+- continuous mode exposes back to back, get_scan_data returns the next frame, frames not read in time are lost
+- an armed external trigger scan starts trigger_delay after arming or when trigger() is called
+
+Frames are generated in ADC counts and normalized with the dark pixels as the driver does:
+    counts = bias + (excitation * emission + background) * responsivity * t + dark_current * t
+with shot noise (Poisson statistics of the collected charge, gain counts per electron), read noise and clipping at
+MAX_ADC_VALUE. The dark pixels see only the bias, so dark current remains in the spectrum as on the real device.
+
+The excitation scales the emission line, e.g. an LED driven by the SMU. It is set with set_excitation or read from
+excitation_source at the start of every exposure, see the [simulator] section of plugin.ini.
+"""
+
 import time
+from threading import Lock
+from typing import Callable, Optional
+
+import numpy as np
+
+import TLCCS_const as const
 
 
 class MockCCSDRV:
-    def __init__(self):
+    # sensor
+    bias = 1000.0  # counts, also the level of the dark pixels
+    read_noise = 8.0  # counts rms
+    gain = 2.0  # counts per photoelectron
+    dark_current = 200.0  # counts/s
+    responsivity = 2.0e5  # counts/s at the emission peak for excitation 1
+    # timing
+    readout_time = 0.0037  # s, CCD readout after the exposure
+    usb_rate = 4.0e6  # bytes/s, effective bulk transfer rate
+    # spectrum
+    emission_center = 650.0  # nm
+    emission_fwhm = 30.0  # nm
+    background = 0.02  # broad ambient light relative to the emission peak
+
+    def __init__(self, wavelength=None, seed=None):
         self.integration_time = 0.01
-        self.scan_active = False
+        self.wavelength = np.linspace(const.CCS175_MIN_WV, const.CCS175_MAX_WV, const.CCS_SERIES_NUM_PIXELS) if wavelength is None else np.asarray(wavelength, dtype=np.float64)
+        sigma = self.emission_fwhm / (2 * np.sqrt(2 * np.log(2)))
+        self.emission = np.exp(-((self.wavelength - self.emission_center) ** 2) / (2 * sigma**2))
+        self.excitation = 1.0
+        self.excitation_source: Optional[Callable[[], float]] = None
+        self.trigger_delay = 0.0  # s, None to wait for trigger()
+        self.rng = np.random.default_rng(seed)
+        self.transfer_time = const.CCS_SERIES_NUM_RAW_PIXELS * 2 / self.usb_rate
+        self._lock = Lock()
+        self._mode = None  # None, "single", "continuous" or "trigger"
+        self._start = None  # start of the (first) exposure, time.monotonic
+        self._level = self.excitation
+        self._next_frame = 0
 
     def open(self, spectrometerVID, spectrometerPID, integration_time=0.01):
-        self.integration_time = integration_time
+        self.set_integration_time(integration_time)
+        self._mode = None
         return True
 
     def close(self):
-        pass
+        self._mode = None
+
     def get_integration_time(self):
         return self.integration_time
 
@@ -25,26 +79,110 @@ class MockCCSDRV:
         self.integration_time = intg_time
         return True
 
-    def get_device_status(self, debug=False):
-        return ["SCAN_IDLE"] if not self.scan_active else ["SCAN_TRANSFER"]
+    def set_excitation(self, level: float) -> None:
+        """Excitation level of the emission line, 1 gives responsivity counts/s at the peak."""
+        if level < 0:
+            raise ValueError("Excitation can not be negative")
+        self.excitation = level
+
+    def _excitation_level(self) -> float:
+        if self.excitation_source is not None:
+            try:
+                self.excitation = max(0.0, float(self.excitation_source()))
+            except Exception:
+                pass  # keep the last level, the simulated scan does not fail because of the source
+        return self.excitation
+
+    ########Functions
+    ########scan control
 
     def start_scan(self):
-        self.scan_active = True
-        time.sleep(self.integration_time * 1)
-        self.scan_active = False
+        with self._lock:
+            self._mode = "single"
+            self._start = time.monotonic()
+            self._level = self._excitation_level()
 
     def start_scan_continuous(self):
-        self.scan_active = True
+        with self._lock:
+            self._mode = "continuous"
+            self._start = time.monotonic()
+            self._next_frame = 0
 
     def start_scan_ext_trigger(self):
-        self.scan_active = True
+        with self._lock:
+            self._mode = "trigger"
+            self._start = None if self.trigger_delay is None else time.monotonic() + self.trigger_delay
+            self._level = None  # read when the exposure starts
+
+    def trigger(self):
+        """External trigger edge, starts an armed scan."""
+        with self._lock:
+            if self._mode == "trigger" and (self._start is None or self._start > time.monotonic()):
+                self._start = time.monotonic()
+                self._level = self._excitation_level()
+
+    def _frame_period(self) -> float:
+        return self.integration_time + self.readout_time
+
+    def _ready_time(self) -> Optional[float]:
+        """time.monotonic when the pending frame can be transferred, None if it has not started."""
+        if self._mode is None or self._start is None:
+            return None
+        if self._mode == "continuous":
+            return self._start + self._next_frame * self._frame_period() + self._frame_period()
+        return self._start + self._frame_period()
+
+    def get_device_status(self, debug=False):
+        with self._lock:
+            if self._mode is None:
+                return ["SCAN_IDLE"]
+            if self._start is None or self._start > time.monotonic():
+                return ["SCAN_IDLE", "WAIT_FOR_EXT_TRIG"] if self._mode == "trigger" else ["SCAN_IDLE"]
+            if time.monotonic() >= self._ready_time():
+                return ["SCAN_TRANSFER"]
+            return ["SCAN_TRIGGERED"]
+
+    def scan_ready(self) -> bool:
+        return "SCAN_TRANSFER" in self.get_device_status()
 
     def get_scan_data(self):
-        data = (np.random.rand(3648)) / 2 # from 0 to 0.5
-        data -= 0.4 # from -0.4 to 0.1
-        data = data + (self.integration_time)
-        return np.array(data)
+        """Blocks until the pending frame is read out and transferred, then returns it normalized like CCSDRV does."""
+        while True:
+            with self._lock:
+                if self._mode is None:
+                    raise RuntimeError("No scan started")
+                if self._start is not None and self._start <= time.monotonic():
+                    break
+            time.sleep(0.001)  # armed, waiting for the trigger
+        with self._lock:
+            mode = self._mode
+            if mode == "continuous":
+                # the device keeps only the newest finished frame
+                latest = int((time.monotonic() - self._start) // self._frame_period()) - 1
+                self._next_frame = max(self._next_frame, latest)
+                self._level = self._excitation_level()
+            elif mode == "trigger" and self._level is None:
+                self._level = self._excitation_level()
+            ready = self._ready_time()
+            level = self._level
+            if mode == "continuous":
+                self._next_frame += 1
+            else:
+                self._mode = None
+        remaining = ready - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        time.sleep(self.transfer_time)
+        return self._frame(self.integration_time, level)
 
+    def _frame(self, integration_time: float, excitation: float) -> np.ndarray:
+        photo = (excitation * self.emission + self.background) * self.responsivity * integration_time
+        thermal = self.dark_current * integration_time
+        collected = self.gain * self.rng.poisson((photo + thermal) / self.gain)
+        counts = self.bias + collected + self.rng.normal(0.0, self.read_noise, collected.shape)
+        counts = np.clip(np.round(counts), 0, const.MAX_ADC_VALUE)
+        dark_com = self.bias + self.rng.normal(0.0, self.read_noise / np.sqrt(const.NO_DARK_PIXELS))
+        return (counts - dark_com) / (const.MAX_ADC_VALUE - dark_com)
 
     def read_eeprom(self, addr, idx, length):
         return bytes([int(255 * np.random.rand()) for _ in range(length)])
@@ -31,6 +31,11 @@ class pyIVLS_spec_dummy_plugin:
         self.version = config.get("plugin", "version", fallback="")
         self.metadata = {"name": self.plugin_name, "type": self.type, "function": self.plugin_function, "version": self.version, "dependencies": self.dependencies}
 
+        # coupling of the simulated emission to an SMU channel
+        self.excitation_smu = config.get("simulator", "smu", fallback="")
+        self.excitation_channel = config.get("simulator", "channel", fallback="smua")
+        self.excitation_gain = config.getfloat("simulator", "gain", fallback=1000.0)
+
         # create the driver
         self.spectrometerGUI = dummy_spectro_GUI()
 
@@ -66,6 +71,13 @@ class pyIVLS_spec_dummy_plugin:
         if args is None or args.get("function") == self.plugin_function:
             return {self.plugin_name: self.spectrometerGUI._get_public_methods()}
 
+    @hookimpl
+    def set_function(self, function_dict):
+        """Couples the simulated emission to the SMU named in the [simulator] section of plugin.ini, if it is loaded."""
+        smu_functions = function_dict.get("smu", {}).get(self.excitation_smu) if self.excitation_smu else None
+        if smu_functions and "smu_getIV" in smu_functions:
+            self.spectrometerGUI._coupleSMU(smu_functions, self.excitation_channel, self.excitation_gain)
+
     @hookimpl
     def get_log(self, args=None):
         """provides the signal for logging to main app
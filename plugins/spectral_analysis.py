@@ -0,0 +1,241 @@
+"""
+Feature extraction for whole measurement runs (SpecSMU, specTimeIV).
+
+A run is either a directory of per-scan CSV files written by createFile, or an archive written by SpectralArchiveWriter.
+All spectra of a run are handled as one [scans x pixels] array, and the features are computed for all scans at once:
+
+    peak_wavelength       wavelength of the maximum
+    peak_intensity        value at the maximum
+    fwhm                  full width at half maximum, half maximum crossings linearly interpolated. nan if the peak is
+                          cut by the end of the spectrum
+    integrated_intensity  trapezoidal integral over the wavelength
+    centroid              intensity weighted mean wavelength
+
+analyze_run writes a summary table (";" separated, one row per scan) next to the data. Runs larger than chunk_size
+scans are split into chunks that are loaded and processed in separate processes, so only the features travel between
+processes.
+
+Usage:
+    python spectral_analysis.py <run directory or .specarchive> [--pattern "*.csv"] [--workers N]
+
+Nothing in this file uses Qt.
+"""
+
+import argparse
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from spectral_archive import ARCHIVE_SUFFIX, SpectralArchiveReader
+
+FEATURES = ("peak_wavelength", "peak_intensity", "fwhm", "integrated_intensity", "centroid")
+SUMMARY_SUFFIX = "_features.csv"
+SEPARATOR = ";"
+
+# setpoint in the names of SpecSMU csv files: <name>_<setpoint:.4f> iv.csv
+_SETPOINT_PATTERN = re.compile(r"_(-?\d+\.\d+) iv\.csv$")
+
+
+def spectral_features(wavelength: Sequence[float], spectra: np.ndarray) -> Dict[str, np.ndarray]:
+    """Features of every spectrum, see the module docstring.
+
+    Args:
+        wavelength (array): [pixels], increasing.
+        spectra (array): [scans x pixels] or [pixels].
+
+    Returns:
+        dict: feature name -> [scans]
+    """
+    wavelength = np.asarray(wavelength, dtype=np.float64)
+    spectra = np.atleast_2d(np.asarray(spectra, dtype=np.float64))
+    if spectra.shape[1] != wavelength.size:
+        raise ValueError(f"Spectra have {spectra.shape[1]} pixels, wavelength axis has {wavelength.size}")
+    scans, pixels = spectra.shape
+    rows = np.arange(scans)
+
+    peak = np.argmax(spectra, axis=1)
+    peak_intensity = spectra[rows, peak]
+
+    dx = np.diff(wavelength)
+    integrated = 0.5 * ((spectra[:, 1:] + spectra[:, :-1]) @ dx)
+    weighted = 0.5 * ((spectra[:, 1:] * wavelength[1:] + spectra[:, :-1] * wavelength[:-1]) @ dx)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        centroid = weighted / integrated
+
+    # nearest pixels below half maximum on both sides of the peak
+    half = peak_intensity / 2
+    below = spectra < half[:, None]
+    index = np.arange(pixels)
+    left = np.where(below & (index < peak[:, None]), index, -1).max(axis=1)
+    right = np.where(below & (index > peak[:, None]), index, pixels).min(axis=1)
+    found = (left >= 0) & (right < pixels)
+    left_c = np.clip(left, 0, pixels - 2)
+    right_c = np.clip(right, 1, pixels - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # crossing between left and left + 1, and between right - 1 and right
+        y0, y1 = spectra[rows, left_c], spectra[rows, left_c + 1]
+        x_left = wavelength[left_c] + (half - y0) / (y1 - y0) * (wavelength[left_c + 1] - wavelength[left_c])
+        y0, y1 = spectra[rows, right_c - 1], spectra[rows, right_c]
+        x_right = wavelength[right_c - 1] + (half - y0) / (y1 - y0) * (wavelength[right_c] - wavelength[right_c - 1])
+    fwhm = np.where(found, x_right - x_left, np.nan)
+
+    return {
+        "peak_wavelength": wavelength[peak],
+        "peak_intensity": peak_intensity,
+        "fwhm": fwhm,
+        "integrated_intensity": integrated,
+        "centroid": centroid,
+    }
+
+
+def is_archive(path: str) -> bool:
+    return os.path.isdir(path) and (path.rstrip(os.sep).endswith(ARCHIVE_SUFFIX) or os.path.exists(os.path.join(path, "archive.json")))
+
+
+def run_files(path: str, pattern: str = "*.csv") -> List[str]:
+    """CSV files of a run directory, sorted, without summary tables."""
+    files = sorted(glob.glob(os.path.join(path, pattern)))
+    return [f for f in files if not f.endswith(SUMMARY_SUFFIX)]
+
+
+def load_csv_spectrum(path: str, separator: str = SEPARATOR) -> Tuple[np.ndarray, np.ndarray]:
+    """(wavelength, spectrum) from a file written by createFile."""
+    data = np.loadtxt(path, delimiter=separator, comments="#", ndmin=2)
+    return data[:, 0], data[:, 1]
+
+
+def load_csv_run(files: Sequence[str], separator: str = SEPARATOR) -> Tuple[np.ndarray, np.ndarray]:
+    """Spectra of several createFile files as one [scans x pixels] array.
+
+    Raises:
+        ValueError: the files do not share one wavelength axis.
+    """
+    if not files:
+        raise ValueError("No spectra to load")
+    wavelength, first = load_csv_spectrum(files[0], separator)
+    spectra = np.empty((len(files), first.size), dtype=np.float64)
+    spectra[0] = first
+    for i, path in enumerate(files[1:], start=1):
+        file_wavelength, spectrum = load_csv_spectrum(path, separator)
+        if file_wavelength.shape != wavelength.shape or not np.allclose(file_wavelength, wavelength):
+            raise ValueError(f"{path} has a different wavelength axis than {files[0]}")
+        spectra[i] = spectrum
+    return wavelength, spectra
+
+
+def load_run(path: str, pattern: str = "*.csv") -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    """Whole run as (wavelength, spectra [scans x pixels], metadata).
+
+    Metadata is the archive metadata table, or for CSV runs the file names and the setpoints found in them.
+    """
+    if is_archive(path):
+        reader = SpectralArchiveReader(path)
+        return reader.wavelength, np.asarray(reader.spectra()), reader.metadata
+    files = run_files(path, pattern)
+    wavelength, spectra = load_csv_run(files)
+    return wavelength, spectra, _csv_metadata(files)
+
+
+def _csv_metadata(files: Sequence[str]) -> Dict[str, np.ndarray]:
+    setpoints = []
+    for path in files:
+        match = _SETPOINT_PATTERN.search(os.path.basename(path))
+        setpoints.append(float(match.group(1)) if match else np.nan)
+    return {"file": np.array([os.path.basename(f) for f in files]), "setpoint": np.array(setpoints)}
+
+
+def _archive_chunk_features(path: str, index: int) -> Dict[str, np.ndarray]:
+    reader = SpectralArchiveReader(path)
+    return spectral_features(reader.wavelength, reader.chunk(index))
+
+
+def _csv_chunk_features(files: Sequence[str]) -> Dict[str, np.ndarray]:
+    return spectral_features(*load_csv_run(files))
+
+
+def summary_path(path: str) -> str:
+    """The summary table is written next to the run: <run name>_features.csv in the directory containing it."""
+    path = os.path.normpath(os.path.abspath(path))
+    name = os.path.basename(path)
+    if name.endswith(ARCHIVE_SUFFIX):
+        name = name[: -len(ARCHIVE_SUFFIX)]
+    return os.path.join(os.path.dirname(path), name + SUMMARY_SUFFIX)
+
+
+def analyze_run(
+    path: str,
+    output: Optional[str] = None,
+    pattern: str = "*.csv",
+    workers: Optional[int] = None,
+    chunk_size: int = 2000,
+) -> Tuple[str, Dict[str, np.ndarray]]:
+    """Computes the features of every scan of a run and writes the summary table.
+
+    Args:
+        path (str): run directory with createFile CSVs, or an archive.
+        output (str): summary table, defaults to summary_path(path).
+        pattern (str): CSV file pattern in the run directory.
+        workers (int): processes for runs larger than chunk_size scans, None for one per CPU, 1 to stay in this process.
+        chunk_size (int): scans per chunk. Archives are processed per archive chunk.
+
+    Returns:
+        (summary table path, metadata and features by column name)
+    """
+    if is_archive(path):
+        reader = SpectralArchiveReader(path)
+        metadata = reader.metadata
+        jobs = [(_archive_chunk_features, (path, index)) for index in range(reader.n_chunks)]
+        scans = len(reader)
+    else:
+        files = run_files(path, pattern)
+        if not files:
+            raise ValueError(f"No files matching {pattern} in {path}")
+        metadata = _csv_metadata(files)
+        jobs = [(_csv_chunk_features, (files[start : start + chunk_size],)) for start in range(0, len(files), chunk_size)]
+        scans = len(files)
+
+    if scans > chunk_size and len(jobs) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_call, jobs))
+    else:
+        results = [_call(job) for job in jobs]
+    features = {name: np.concatenate([result[name] for result in results]) if results else np.empty(0) for name in FEATURES}
+
+    table = dict(metadata)
+    table.update(features)
+    output = output or summary_path(path)
+    _write_table(output, table)
+    return output, table
+
+
+def _call(job):
+    func, args = job
+    return func(*args)
+
+
+def _write_table(path: str, table: Dict[str, np.ndarray]) -> None:
+    columns = list(table)
+    with open(path, "w") as f:
+        f.write(SEPARATOR.join(columns) + "\n")
+        for row in zip(*(table[column] for column in columns)):
+            f.write(SEPARATOR.join(value if isinstance(value, str) else repr(float(value)) for value in row) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("run", help="run directory with createFile CSVs, or a .specarchive")
+    parser.add_argument("--pattern", default="*.csv", help="CSV files of the run")
+    parser.add_argument("--output", help="summary table, defaults to <run>_features.csv next to the run")
+    parser.add_argument("--workers", type=int, help="number of processes, defaults to one per CPU")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="scans per process")
+    args = parser.parse_args()
+    output, table = analyze_run(args.run, args.output, args.pattern, args.workers, args.chunk_size)
+    print(f"{len(table['peak_wavelength'])} scans, summary written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Archive format for the spectra of one measurement run (SpecSMU, specTimeIV).
+
+Saving every spectrum with createFile repeats the wavelength column in every file and stores the numbers as text.
+The archive stores a run in one directory instead:
+
+    <name>.specarchive/
+        archive.json        format version, number of pixels, chunk size and the run header (sample name, comment, settings)
+        wavelength.npy      wavelength axis, stored once
+        metadata.csv        one row per scan, ";" separated: scan;timestamp;setpoint;integrationtime;i_before;v_before;i_after;v_after (+ extra fields)
+        chunk_00000.npy     float32 spectra [scans x pixels], chunk_size scans per chunk, memory-mappable with np.load(mmap_mode="r")
+        chunk_00001.npz     same, for chunks sealed with compression enabled (np.savez_compressed, key "spectra")
+
+Appending writes one row into the open chunk (a preallocated memory-mapped .npy) and one line to metadata.csv.
+metadata.csv is written after the spectrum, so the number of rows in it is the number of complete scans even if the run crashed.
+When a chunk is full it is sealed, and with compress=True it is replaced by a compressed .npz. Compressed chunks
+can not be memory-mapped, so compression is off by default; float32 already takes ~15 kB per CCS175 scan.
+
+Per-spectrum CSV files (same layout as createFile) can be produced afterwards with export_csv.
+
+Nothing in this file uses Qt, export_csv imports the header formatting from plugin_components when called.
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ARCHIVE_SUFFIX = ".specarchive"
+FORMAT_VERSION = 1
+METADATA_FIELDS = ("scan", "timestamp", "setpoint", "integrationtime", "i_before", "v_before", "i_after", "v_after")
+METADATA_SEPARATOR = ";"
+
+_HEADER_FILE = "archive.json"
+_WAVELENGTH_FILE = "wavelength.npy"
+_METADATA_FILE = "metadata.csv"
+
+
+def _chunk_name(index: int, compressed: bool) -> str:
+    return f"chunk_{index:05d}" + (".npz" if compressed else ".npy")
+
+
+def archive_path(address: str, filename: str) -> str:
+    """Path of the archive for a run saved as filename in the directory address."""
+    if not filename.endswith(ARCHIVE_SUFFIX):
+        filename = filename + ARCHIVE_SUFFIX
+    return os.path.join(address, filename)
+
+
+class SpectralArchiveWriter:
+    """Appends spectra of a run to an archive. Opening an existing archive continues it.
+
+    Usage:
+        with SpectralArchiveWriter(path, wavelength, header={"samplename": "x"}) as archive:
+            archive.append(spectrum, setpoint=1.0, integrationtime=0.1, i_after=1e-3, v_after=1.0)
+
+    Not thread safe, use from one thread (e.g. through AsyncFileWriter).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        wavelength: Sequence[float],
+        header: Optional[Dict[str, Any]] = None,
+        chunk_size: int = 256,
+        compress: bool = False,
+        extra_fields: Sequence[str] = (),
+    ):
+        """
+        Args:
+            path (str): archive directory, created if missing.
+            wavelength (Sequence[float]): wavelength axis, one value per pixel.
+            header (dict): run information stored in archive.json (JSON serializable, other values are stored as str).
+            chunk_size (int): number of scans per chunk file.
+            compress (bool): compress chunks when they are sealed.
+            extra_fields (Sequence[str]): metadata columns in addition to METADATA_FIELDS.
+        """
+        self.path = path
+        self.wavelength = np.asarray(wavelength, dtype=np.float64)
+        self.pixels = self.wavelength.size
+        self.compress = compress
+        self._chunk: Optional[np.memmap] = None
+        self._chunk_index = 0
+        self._chunk_rows = 0
+
+        if os.path.exists(os.path.join(path, _HEADER_FILE)):
+            self._open_existing()
+        else:
+            if chunk_size < 1:
+                raise ValueError("chunk_size must be positive")
+            self.chunk_size = chunk_size
+            self.fields = tuple(METADATA_FIELDS) + tuple(f for f in extra_fields if f not in METADATA_FIELDS)
+            self.count = 0
+            os.makedirs(path, exist_ok=True)
+            np.save(os.path.join(path, _WAVELENGTH_FILE), self.wavelength)
+            with open(os.path.join(path, _HEADER_FILE), "w") as f:
+                json.dump(
+                    {
+                        "format": "pyIVLS spectral archive",
+                        "version": FORMAT_VERSION,
+                        "pixels": self.pixels,
+                        "dtype": "float32",
+                        "chunk_size": self.chunk_size,
+                        "fields": list(self.fields),
+                        "header": header or {},
+                    },
+                    f,
+                    indent=2,
+                    default=str,
+                )
+            with open(os.path.join(path, _METADATA_FILE), "w") as f:
+                f.write(METADATA_SEPARATOR.join(self.fields) + "\n")
+        self._metadata_file = open(os.path.join(path, _METADATA_FILE), "a")
+
+    def _open_existing(self) -> None:
+        reader = SpectralArchiveReader(self.path)
+        if reader.pixels != self.pixels:
+            raise ValueError(f"Archive {self.path} has {reader.pixels} pixels, got wavelength axis with {self.pixels}")
+        self.chunk_size = reader.chunk_size
+        self.fields = reader.fields
+        self.count = len(reader)
+        # drop a line cut by a crash, otherwise the next row would be appended to it
+        with open(os.path.join(self.path, _METADATA_FILE), "r+") as f:
+            text = f.read()
+            if text and not text.endswith("\n"):
+                f.truncate(text.rfind("\n") + 1)
+        self._chunk_index, self._chunk_rows = divmod(self.count, self.chunk_size)
+        if self._chunk_rows:
+            # continue the last, partially filled chunk
+            rows = np.array(reader.chunk(self._chunk_index))
+            for name in (_chunk_name(self._chunk_index, True), _chunk_name(self._chunk_index, False)):
+                if os.path.exists(os.path.join(self.path, name)):
+                    os.remove(os.path.join(self.path, name))
+            self._new_chunk()
+            self._chunk[: self._chunk_rows] = rows[: self._chunk_rows]
+
+    def _new_chunk(self) -> None:
+        self._chunk = np.lib.format.open_memmap(
+            os.path.join(self.path, _chunk_name(self._chunk_index, False)),
+            mode="w+",
+            dtype=np.float32,
+            shape=(self.chunk_size, self.pixels),
+        )
+
+    def _seal_chunk(self) -> None:
+        """Write the open chunk to its final form: trimmed to the stored rows, compressed if enabled."""
+        if self._chunk is None:
+            return
+        self._chunk.flush()
+        rows = self._chunk_rows
+        data = np.array(self._chunk[:rows]) if (self.compress or rows < self.chunk_size) else None
+        self._chunk = None  # release the memory map before the file is replaced
+        npy_path = os.path.join(self.path, _chunk_name(self._chunk_index, False))
+        if self.compress:
+            np.savez_compressed(os.path.join(self.path, _chunk_name(self._chunk_index, True)), spectra=data)
+            os.remove(npy_path)
+        elif data is not None:
+            np.save(npy_path, data)
+
+    def append(self, spectrum: Sequence[float], **metadata) -> int:
+        """Append one scan.
+
+        Args:
+            spectrum: intensities, one value per pixel.
+            **metadata: values for the metadata fields, missing fields are stored as nan. "scan" is filled in.
+
+        Returns:
+            int: index of the scan in the archive.
+        """
+        spectrum = np.asarray(spectrum)
+        if spectrum.shape != (self.pixels,):
+            raise ValueError(f"Spectrum has shape {spectrum.shape}, archive expects ({self.pixels},)")
+        unknown = set(metadata) - set(self.fields)
+        if unknown:
+            raise ValueError(f"Unknown metadata fields {sorted(unknown)}, archive fields are {self.fields}")
+        if self._chunk is None:
+            self._new_chunk()
+        self._chunk[self._chunk_rows] = spectrum
+        self._chunk.flush()
+        index = self.count
+        metadata["scan"] = index
+        values = []
+        for field in self.fields:
+            value = metadata.get(field)
+            values.append("nan" if value is None else repr(float(value)))
+        self._metadata_file.write(METADATA_SEPARATOR.join(values) + "\n")
+        self._metadata_file.flush()
+        self.count += 1
+        self._chunk_rows += 1
+        if self._chunk_rows == self.chunk_size:
+            self._seal_chunk()
+            self._chunk_index += 1
+            self._chunk_rows = 0
+        return index
+
+    def close(self) -> None:
+        """Seal the last chunk and close the metadata file. Safe to call more than once."""
+        if self._chunk is not None:
+            self._seal_chunk()
+        if not self._metadata_file.closed:
+            self._metadata_file.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+class SpectralArchiveReader:
+    """Reads an archive written by SpectralArchiveWriter. Uncompressed chunks are memory-mapped."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, _HEADER_FILE)) as f:
+            info = json.load(f)
+        if info.get("version", 0) > FORMAT_VERSION:
+            raise ValueError(f"Archive {path} has format version {info['version']}, this reader supports up to {FORMAT_VERSION}")
+        self.pixels: int = info["pixels"]
+        self.chunk_size: int = info["chunk_size"]
+        self.fields: Tuple[str, ...] = tuple(info["fields"])
+        self.header: Dict[str, Any] = info.get("header", {})
+        self.wavelength: np.ndarray = np.load(os.path.join(path, _WAVELENGTH_FILE))
+        self.metadata: Dict[str, np.ndarray] = self._read_metadata()
+
+    def _read_metadata(self) -> Dict[str, np.ndarray]:
+        with open(os.path.join(self.path, _METADATA_FILE)) as f:
+            lines = f.read().splitlines()[1:]
+        # a line is complete only if it has all fields (the last one may be cut if the writer was killed)
+        rows = [line.split(METADATA_SEPARATOR) for line in lines]
+        rows = [row for row in rows if len(row) == len(self.fields)]
+        table = np.array(rows, dtype=np.float64).reshape(len(rows), len(self.fields))
+        return {field: table[:, i] for i, field in enumerate(self.fields)}
+
+    def __len__(self) -> int:
+        return len(self.metadata["scan"])
+
+    @property
+    def n_chunks(self) -> int:
+        return -(-len(self) // self.chunk_size)
+
+    def chunk(self, index: int) -> np.ndarray:
+        """Spectra of one chunk, trimmed to the stored scans. Memory-mapped (read only) if the chunk is not compressed."""
+        rows = min(self.chunk_size, len(self) - index * self.chunk_size)
+        npz = os.path.join(self.path, _chunk_name(index, True))
+        if os.path.exists(npz):
+            with np.load(npz) as data:
+                return data["spectra"][:rows]
+        return np.load(os.path.join(self.path, _chunk_name(index, False)), mmap_mode="r")[:rows]
+
+    def chunks(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """Yields (index of the first scan, spectra) for every chunk, for processing runs larger than memory."""
+        for index in range(self.n_chunks):
+            yield index * self.chunk_size, self.chunk(index)
+
+    def spectrum(self, scan: int) -> np.ndarray:
+        if not 0 <= scan < len(self):
+            raise IndexError(f"Scan {scan} out of range for archive with {len(self)} scans")
+        return self.chunk(scan // self.chunk_size)[scan % self.chunk_size]
+
+    def spectra(self) -> np.ndarray:
+        """All spectra as [scans x pixels]. A single uncompressed chunk is returned memory-mapped, otherwise chunks are concatenated."""
+        if len(self) == 0:
+            return np.empty((0, self.pixels), dtype=np.float32)
+        if self.n_chunks == 1:
+            return self.chunk(0)
+        return np.concatenate([chunk for _, chunk in self.chunks()])
+
+    def scan_metadata(self, scan: int) -> Dict[str, float]:
+        return {field: float(values[scan]) for field, values in self.metadata.items()}
+
+
+def export_csv(path: str, address: Optional[str] = None, separator: str = ";", name_format: Optional[str] = None) -> List[str]:
+    """Write every scan of an archive as a CSV file in the createFile layout.
+
+    Args:
+        path (str): archive directory.
+        address (str): directory for the CSV files, defaults to the directory containing the archive.
+        separator (str): CSV separator.
+        name_format (str): file name pattern, formatted with name (archive name without suffix) and the metadata fields of the scan.
+            Defaults to header["csv_name_format"] or "{name}_{scan:04.0f}.csv".
+
+    Returns:
+        list[str]: paths of the written files.
+    """
+    from plugin_components import FileManager
+
+    reader = SpectralArchiveReader(path)
+    if address is None:
+        address = os.path.dirname(os.path.abspath(path))
+    name = os.path.basename(os.path.normpath(path))
+    if name.endswith(ARCHIVE_SUFFIX):
+        name = name[: -len(ARCHIVE_SUFFIX)]
+    if name_format is None:
+        name_format = reader.header.get("csv_name_format", "{name}_{scan:04.0f}.csv")
+
+    written = []
+    for start, spectra in reader.chunks():
+        for row, spectrum in enumerate(spectra):
+            meta = reader.scan_metadata(start + row)
+            readings = [meta[field] for field in ("i_before", "v_before", "i_after", "v_after") if field in meta and not np.isnan(meta[field])]
+            varDict = {
+                "integrationtime": meta.get("integrationtime", 0),
+                "triggermode": reader.header.get("triggermode", 0),
+                "name": reader.header.get("samplename", ""),
+                "comment": (reader.header.get("comment", "") + " " + ",".join(str(r) for r in readings)).strip(),
+                "timestamp": meta.get("timestamp"),
+            }
+            address_csv = os.path.join(address, name_format.format(name=name, **meta))
+            np.savetxt(
+                address_csv,
+                np.column_stack((reader.wavelength, spectrum)),
+                fmt="%.9e",
+                delimiter=separator,
+                newline="\n",
+                header=FileManager.create_spectrometer_header(varDict, separator=separator),
+                footer="#[EndOfFile]",
+                comments="#",
+            )
+            written.append(address_csv)
+    return written
@@ -0,0 +1,692 @@
+"""
+Shared functionality for spectrometer plugins (TLCCS, spec_dummy, ocean_optics).
+
+The spectrometer plugins are near copies of each other, so logic that does not depend on the
+hardware lives here. Nothing in this file uses Qt, so it can be used from low level classes and tests.
+
+This file includes:
+- IntegrationTimePredictor: predicts the integration time that brings the spectrum maximum into the target window,
+  using the linear counts vs. integration time relation instead of bisection. Caches results per SMU setpoint.
+- SampleStore: thread safe store of samples stamped with a shared monotonic clock, one per producer (IV, spectra).
+- align_iv, align_spectra: look up the IV at the time each spectrum was taken.
+- wait_for_scan: waits for a scan to finish, sleeping through the predicted exposure and polling only near its end.
+- SpectrumStream: background reader for spectrometers in continuous scan mode, keeps the last frames in a ring buffer.
+- SpectrumAccumulator: running mean and variance of frames (Welford), for averaging scans as they arrive.
+- DarkLibrary: dark and reference spectra keyed by device serial and integration time, persisted to an .npz file.
+- SpectrometerGroup: calls the same function of several spectrometer plugins concurrently, one worker per device.
+"""
+
+import bisect
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class IntegrationTimePredictor:
+    """Integration time search for getAutoTime.
+
+    Counts grow linearly with the integration time (counts = offset + rate * time) until the detector saturates,
+    so one unsaturated scan is usually enough to jump to the target, and two scans give the offset as well.
+    Saturated scans only tell that the time was too long, how much too long is estimated from the fraction
+    of clipped pixels.
+
+    Usage within one search:
+        predictor.start()
+        t = predictor.initial_guess(setpoint, fallback)
+        loop:
+            scan with t
+            if predictor.in_window(spectrum): predictor.store(setpoint, t); done
+            t = predictor.next_time(t, spectrum)
+    """
+
+    def __init__(
+        self,
+        time_min: float,
+        time_max: float,
+        value_min: float,
+        value_max: float,
+        saturation_level: float = 0.98,
+        max_step: float = 20.0,
+    ):
+        """
+        Args:
+            time_min (float): shortest allowed integration time in s.
+            time_max (float): longest allowed integration time in s.
+            value_min (float): lower edge of the target window for the spectrum maximum.
+            value_max (float): upper edge of the target window for the spectrum maximum.
+            saturation_level (float): values at or above this are treated as clipped.
+            max_step (float): largest factor the time is changed by in one step when the scan is too dark to fit.
+        """
+        self.time_min = time_min
+        self.time_max = time_max
+        self.value_min = value_min
+        self.value_max = value_max
+        self.saturation_level = saturation_level
+        self.max_step = max_step
+        self._observations: List[Tuple[float, float]] = []  # (time, peak) of unsaturated scans in this search
+        self._saturated_below: Optional[float] = None  # shortest time that saturated in this search
+        self._cache: Dict[float, float] = {}  # setpoint -> accepted integration time
+
+    @property
+    def target(self) -> float:
+        """Spectrum maximum the predictor aims for (middle of the window)."""
+        return (self.value_min + self.value_max) / 2
+
+    def start(self) -> None:
+        """Forget the scans of the previous search. The per-setpoint cache is kept."""
+        self._observations = []
+        self._saturated_below = None
+
+    def clear_cache(self) -> None:
+        """Forget the per-setpoint results, e.g. when a new measurement starts."""
+        self._cache = {}
+
+    def clamp(self, integration_time: float) -> float:
+        return float(min(max(integration_time, self.time_min), self.time_max))
+
+    def in_window(self, spectrum) -> bool:
+        peak = float(np.max(spectrum))
+        return self.value_min <= peak <= self.value_max
+
+    def store(self, setpoint: Optional[float], integration_time: float) -> None:
+        """Remember the accepted integration time for a setpoint."""
+        if setpoint is not None:
+            self._cache[float(setpoint)] = float(integration_time)
+
+    def initial_guess(self, setpoint: Optional[float] = None, fallback: Optional[float] = None, explicit: Optional[float] = None) -> float:
+        """First integration time to try.
+
+        An explicit time (e.g. the last integration time requested by the caller) is used as is.
+        Otherwise uses the per-setpoint cache if possible: the cached value for the same setpoint, otherwise log(time)
+        interpolated or extrapolated linearly from the two closest cached setpoints.
+        Falls back to fallback, then to the geometric mean of the allowed range.
+        """
+        if explicit is not None and explicit > 0:
+            return self.clamp(explicit)
+        cached = self.extrapolate(setpoint) if setpoint is not None else None
+        if cached is not None:
+            return self.clamp(cached)
+        if fallback is not None and fallback > 0:
+            return self.clamp(fallback)
+        return self.clamp(float(np.sqrt(self.time_min * self.time_max)))
+
+    def extrapolate(self, setpoint: float) -> Optional[float]:
+        """Integration time for setpoint estimated from the cache, None if the cache is empty."""
+        if not self._cache:
+            return None
+        setpoint = float(setpoint)
+        if setpoint in self._cache:
+            return self._cache[setpoint]
+        points = sorted(self._cache.items())
+        if len(points) == 1:
+            return points[0][1]
+        xs = [x for x, _ in points]
+        idx = bisect.bisect_left(xs, setpoint)
+        # two closest points, on both sides if possible
+        idx = min(max(idx, 1), len(points) - 1)
+        (x0, t0), (x1, t1) = points[idx - 1], points[idx]
+        slope = (np.log(t1) - np.log(t0)) / (x1 - x0)
+        return float(np.exp(np.log(t1) + slope * (setpoint - x1)))
+
+    def next_time(self, integration_time: float, spectrum) -> float:
+        """Integration time to try after a scan with integration_time gave spectrum."""
+        spectrum = np.asarray(spectrum)
+        peak = float(np.max(spectrum))
+        if peak >= self.saturation_level:
+            if self._saturated_below is None or integration_time < self._saturated_below:
+                self._saturated_below = integration_time
+            guess = self._predict_from_observations()
+            if guess is None:
+                # the true maximum is above the clipping level, the more pixels are clipped the further above
+                clipped = float(np.count_nonzero(spectrum >= self.saturation_level)) / spectrum.size
+                guess = integration_time * self.target / peak / (1.0 + 10.0 * clipped)
+        else:
+            self._observations.append((integration_time, peak))
+            guess = self._predict_from_observations()
+            if guess is None:
+                guess = integration_time * self.max_step
+        if self._saturated_below is not None and guess >= self._saturated_below:
+            guess = self._saturated_below * self.target / self.saturation_level
+        guess = min(max(guess, integration_time / self.max_step), integration_time * self.max_step)
+        return self.clamp(guess)
+
+    def _predict_from_observations(self) -> Optional[float]:
+        """Time giving the target peak from the unsaturated scans, None if they do not determine it."""
+        if not self._observations:
+            return None
+        times = np.array([t for t, _ in self._observations])
+        peaks = np.array([p for _, p in self._observations])
+        if len(self._observations) >= 2 and np.ptp(times) > 0:
+            rate, offset = np.polyfit(times, peaks, 1)
+            if rate > 0:
+                return float((self.target - offset) / rate)
+        # single usable scan: counts are proportional to time
+        t, p = self._observations[-1]
+        if p <= 0 or p < self.value_min / self.max_step:
+            return None  # too dark to tell the signal from noise
+        return float(t * self.target / p)
+
+
+class SampleStore:
+    """Append only store for the samples of one producer thread, readable from other threads.
+
+    Every sample has a start and end time from a clock shared by all producers (clock(), time.monotonic
+    relative to t0), so samples of different producers can be aligned. For instantaneous samples (IV)
+    start and end are the same, for spectra they are the start and end of the exposure.
+    """
+
+    def __init__(self, t0: Optional[float] = None):
+        """
+        Args:
+            t0 (float): time.monotonic() value of time zero, shared by the stores of one measurement.
+        """
+        self.t0 = time.monotonic() if t0 is None else t0
+        self._lock = threading.Lock()
+        self._starts: List[float] = []
+        self._ends: List[float] = []
+        self._values: List[Any] = []
+
+    def clock(self) -> float:
+        """Seconds since t0."""
+        return time.monotonic() - self.t0
+
+    def append(self, value: Any, t_start: float, t_end: Optional[float] = None) -> int:
+        """Store a sample, returns its index."""
+        with self._lock:
+            self._starts.append(t_start)
+            self._ends.append(t_start if t_end is None else t_end)
+            self._values.append(value)
+            return len(self._values) - 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._values)
+
+    def latest_time(self) -> Optional[float]:
+        """End time of the last sample, None if empty."""
+        with self._lock:
+            return self._ends[-1] if self._ends else None
+
+    def get(self, index: int) -> Tuple[float, float, Any]:
+        """(start, end, value) of a sample."""
+        with self._lock:
+            return self._starts[index], self._ends[index], self._values[index]
+
+    def since(self, index: int) -> List[Tuple[int, float, float, Any]]:
+        """(index, start, end, value) of the samples from index on, for consumers that poll for new samples."""
+        with self._lock:
+            return [(i, self._starts[i], self._ends[i], self._values[i]) for i in range(index, len(self._values))]
+
+    def around(self, t_start: float, t_end: float) -> Tuple[np.ndarray, List[Any]]:
+        """Start times and values of the samples from t_start to t_end plus the closest sample on each side, input for align_iv.
+
+        Samples must be appended in time order. Cost does not grow with the number of stored samples.
+        """
+        with self._lock:
+            lo = max(bisect.bisect_left(self._starts, t_start) - 1, 0)
+            hi = min(bisect.bisect_right(self._starts, t_end) + 1, len(self._starts))
+            return np.array(self._starts[lo:hi]), self._values[lo:hi]
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, List[Any]]:
+        """Copies of (start times, end times, values) at the time of the call."""
+        with self._lock:
+            return np.array(self._starts), np.array(self._ends), list(self._values)
+
+
+def align_iv(iv_times: Sequence[float], iv_values, t_start: float, t_end: Optional[float] = None) -> np.ndarray:
+    """IV during an exposure from t_start to t_end.
+
+    The mean of the IV samples taken during the exposure. If there are none (exposure shorter than the IV step),
+    the IV is interpolated linearly at the middle of the exposure. nan if the exposure is outside the sampled time.
+
+    Args:
+        iv_times: sample times, increasing.
+        iv_values: sample values [samples x channels] (e.g. columns i, v), or 1D for a single channel.
+        t_start, t_end: exposure, t_end defaults to t_start.
+
+    Returns:
+        np.ndarray: one value per channel.
+    """
+    iv_times = np.asarray(iv_times, dtype=float)
+    iv_values = np.asarray(iv_values, dtype=float)
+    if iv_values.ndim == 1:
+        iv_values = iv_values[:, None]
+    if t_end is None:
+        t_end = t_start
+    if iv_times.size == 0:
+        return np.full(iv_values.shape[1], np.nan)
+    lo = np.searchsorted(iv_times, t_start, side="left")
+    hi = np.searchsorted(iv_times, t_end, side="right")
+    if hi > lo:
+        return iv_values[lo:hi].mean(axis=0)
+    middle = (t_start + t_end) / 2
+    if middle < iv_times[0] or middle > iv_times[-1]:
+        return np.full(iv_values.shape[1], np.nan)
+    return np.array([np.interp(middle, iv_times, column) for column in iv_values.T])
+
+
+def align_spectra(spectrum_store: SampleStore, iv_store: SampleStore) -> np.ndarray:
+    """IV for every spectrum in spectrum_store (see align_iv), as [spectra x channels]."""
+    starts, ends, _ = spectrum_store.snapshot()
+    return np.array([align_iv(*iv_store.around(t_start, t_end), t_start, t_end) for t_start, t_end in zip(starts, ends)])
+
+
+def wait_for_scan(
+    ready: Callable[[], bool],
+    deadline: Optional[float],
+    timeout: Optional[float] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+    lead: float = 0.005,
+    first_poll: float = 0.001,
+    max_poll: float = 0.05,
+) -> bool:
+    """Waits until ready() is True.
+
+    Sleeps until shortly before the predicted end of the exposure, then polls with exponential back-off
+    (first_poll doubling up to max_poll), so a scan costs a few status requests and finishes at most max_poll late.
+
+    Args:
+        ready (callable): status check, e.g. the scan transfer bit of the device.
+        deadline (float): predicted end of the exposure (time.monotonic), None if unknown (e.g. waiting for a trigger).
+        timeout (float): time.monotonic() after which TimeoutError is raised, None to wait forever.
+        cancelled (callable): checked while waiting, the wait returns False once it returns True.
+        lead (float): polling starts this many seconds before the deadline.
+
+    Returns:
+        bool: True when ready, False when cancelled.
+    """
+    if deadline is not None:
+        while True:
+            if cancelled is not None and cancelled():
+                return False
+            remaining = deadline - lead - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, 0.1))  # short chunks, so that cancelling a long exposure is fast
+    interval = first_poll
+    while True:
+        if cancelled is not None and cancelled():
+            return False
+        if ready():
+            return True
+        if timeout is not None and time.monotonic() > timeout:
+            raise TimeoutError("Scan did not finish in time")
+        time.sleep(interval)
+        interval = min(interval * 2, max_poll)
+
+
+class SpectrumStream:
+    """Reads frames from a spectrometer running in continuous scan mode in a background thread.
+
+    Frames are kept in a ring buffer of the last `capacity` frames together with their exposure start and end
+    (time.monotonic). In continuous mode exposures follow each other, so a frame's exposure starts when the previous
+    frame arrived. For triggered frames (back_to_back=False) the start is the arrival minus the integration time. Frames that are pushed out of the ring before anyone read them are counted in `overruns`.
+
+    Usage:
+        stream = SpectrumStream(drv.get_scan_data, integration_time)
+        drv.start_scan_continuous()
+        stream.start()
+        frame = stream.next_after(time.monotonic())  # first frame exposed entirely after now
+        stream.stop()
+    """
+
+    def __init__(
+        self,
+        read_frame: Callable[[], np.ndarray],
+        integration_time: float,
+        capacity: int = 64,
+        back_to_back: bool = True,
+    ):
+        """
+        Args:
+            read_frame (callable): blocks until the next frame is available and returns it.
+            integration_time (float): exposure time in s, used to estimate the start of the first exposure and for timeouts.
+            capacity (int): number of frames kept.
+            back_to_back (bool): exposures follow each other without gaps (continuous scan mode).
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.read_frame = read_frame
+        self.integration_time = integration_time
+        self.capacity = capacity
+        self.back_to_back = back_to_back
+        self.overruns = 0
+        self.error: Optional[Exception] = None
+        self._frames: List[Optional[Tuple[int, float, float, np.ndarray]]] = [None] * capacity  # (sequence, start, end, frame)
+        self._read: List[bool] = [True] * capacity
+        self._count = 0  # frames received
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def count(self) -> int:
+        """Number of frames received since start."""
+        with self._condition:
+            return self._count
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name="SpectrumStream", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stops after the frame being read. Blocks until the thread has finished (at most about one exposure, a
+        triggered read may wait for its trigger longer than timeout)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._condition:
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        last_end = time.monotonic() - self.integration_time
+        try:
+            while not self._stop.is_set():
+                frame = self.read_frame()
+                t_end = time.monotonic()
+                if not self.back_to_back:
+                    last_end = t_end - self.integration_time
+                with self._condition:
+                    slot = self._count % self.capacity
+                    if not self._read[slot]:
+                        self.overruns += 1
+                    self._frames[slot] = (self._count, last_end, t_end, frame)
+                    self._read[slot] = False
+                    self._count += 1
+                    self._condition.notify_all()
+                last_end = t_end
+        except Exception as e:
+            self.error = e
+            with self._condition:
+                self._condition.notify_all()
+
+    def _get(self, sequence: int) -> Tuple[int, float, float, np.ndarray]:
+        slot = sequence % self.capacity
+        self._read[slot] = True
+        return self._frames[slot]
+
+    def latest(self) -> Optional[Tuple[int, float, float, np.ndarray]]:
+        """Last frame as (sequence number, exposure start, exposure end, frame), None if nothing has been received."""
+        with self._condition:
+            if self._count == 0:
+                return None
+            return self._get(self._count - 1)
+
+    def next_frame(self, sequence: int, timeout: Optional[float] = None) -> Tuple[int, float, float, np.ndarray]:
+        """Frame following the frame with the given sequence number, waits for it if needed. If it has already been
+        overwritten the latest frame is returned. A consumer passing the sequence of the frame it got last (-1 at
+        the start) receives every frame while it keeps up, e.g. a preview.
+
+        Raises:
+            TimeoutError: no such frame arrived in time.
+            RuntimeError: the stream stopped or its reader failed.
+        """
+        if timeout is None:
+            timeout = 3 * self.integration_time + 1.0
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._count <= sequence + 1:
+                if self.error is not None:
+                    raise RuntimeError(f"Spectrum stream reader failed: {self.error}")
+                if self._stop.is_set():
+                    raise RuntimeError("Spectrum stream is stopped")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No frame after sequence {sequence} within {timeout:.3f} s")
+                self._condition.wait(remaining)
+            if self._count - (sequence + 1) > self.capacity:
+                return self._get(self._count - 1)
+            return self._get(sequence + 1)
+
+    def next_after(self, t: float, timeout: Optional[float] = None) -> Tuple[int, float, float, np.ndarray]:
+        """First frame whose exposure started at or after t (time.monotonic), waits for it if needed.
+
+        Args:
+            t (float): time.monotonic() value.
+            timeout (float): seconds to wait, defaults to three exposures plus one second.
+
+        Raises:
+            TimeoutError: no such frame arrived in time.
+            RuntimeError: the stream stopped or its reader failed.
+        """
+        return self.next_n_after(t, 1, timeout)[0]
+
+    def next_n_after(self, t: float, n: int, timeout: Optional[float] = None) -> List[Tuple[int, float, float, np.ndarray]]:
+        """The first n frames whose exposure started at or after t, see next_after."""
+        if timeout is None:
+            timeout = (n + 2) * self.integration_time + 1.0
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            # oldest frame still in the ring that may qualify
+            first = max(self._count - self.capacity, 0)
+            while first < self._count and self._frames[first % self.capacity][1] < t:
+                first += 1
+            while self._count < first + n:
+                if self.error is not None:
+                    raise RuntimeError(f"Spectrum stream reader failed: {self.error}")
+                if self._stop.is_set():
+                    raise RuntimeError("Spectrum stream is stopped")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No {n} frames after t={t:.3f} within {timeout:.3f} s")
+                self._condition.wait(remaining)
+                # skip frames that arrived but started too early (first call after t in the middle of an exposure)
+                while first < self._count and self._frames[first % self.capacity][1] < t:
+                    first += 1
+            if self._count - first > self.capacity:
+                raise RuntimeError("Spectrum stream overrun: requested frames were overwritten")
+            return [self._get(sequence) for sequence in range(first, first + n)]
+
+    def average(self, n: int, t: Optional[float] = None, timeout: Optional[float] = None) -> np.ndarray:
+        """Mean of the next n frames exposed after t (default: now)."""
+        frames = self.next_n_after(time.monotonic() if t is None else t, n, timeout)
+        return np.mean([frame for _, _, _, frame in frames], axis=0)
+
+
+class SpectrumAccumulator:
+    """Running mean and variance of spectra (Welford's algorithm), no frames are kept.
+
+    Usage:
+        acc = SpectrumAccumulator()
+        for each scan: acc.add(scan)
+        acc.mean, acc.std
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self._mean: Optional[np.ndarray] = None
+        self._m2: Optional[np.ndarray] = None  # sum of squared deviations from the mean
+
+    def add(self, frame) -> None:
+        frame = np.asarray(frame, dtype=np.float64)
+        if self._mean is None:
+            self._mean = np.zeros_like(frame)
+            self._m2 = np.zeros_like(frame)
+        elif frame.shape != self._mean.shape:
+            raise ValueError(f"Frame has {frame.shape} pixels, expected {self._mean.shape}")
+        self.count += 1
+        delta = frame - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (frame - self._mean)
+
+    @property
+    def mean(self) -> np.ndarray:
+        if self._mean is None:
+            raise ValueError("No frames added")
+        return self._mean.copy()
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Sample variance per pixel, zeros for a single frame."""
+        if self._m2 is None:
+            raise ValueError("No frames added")
+        if self.count < 2:
+            return np.zeros_like(self._m2)
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+
+class DarkLibrary:
+    """Dark and reference spectra keyed by device serial number and integration time.
+
+    Every change is written to an .npz file, so the library survives restarts. Integration times are
+    matched to the microsecond.
+
+    Usage:
+        library = DarkLibrary(path)
+        library.store(serial, integration_time, dark)                    # dark
+        library.store(serial, integration_time, lamp, kind="reference")  # reference, e.g. lamp or white standard
+        corrected = library.correct(scan, serial, integration_time)      # scan - dark
+        relative = library.correct(scan, serial, integration_time, reference=True)  # (scan - dark) / (reference - dark)
+    """
+
+    KINDS = ("dark", "reference")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._spectra: Dict[str, np.ndarray] = {}
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self._spectra = {key: data[key] for key in data.files}
+
+    @staticmethod
+    def _key(kind: str, serial: str, integration_time: float) -> str:
+        if kind not in DarkLibrary.KINDS:
+            raise ValueError(f"Unknown spectrum kind {kind}, expected one of {DarkLibrary.KINDS}")
+        return f"{kind}|{serial}|{round(integration_time * 1e6)}"
+
+    def __len__(self) -> int:
+        return len(self._spectra)
+
+    def entries(self) -> List[Tuple[str, str, float]]:
+        """Stored spectra as (kind, serial, integration time in s)."""
+        result = []
+        for key in sorted(self._spectra):
+            kind, serial, micros = key.split("|")
+            result.append((kind, serial, int(micros) / 1e6))
+        return result
+
+    def get(self, serial: str, integration_time: float, kind: str = "dark") -> Optional[np.ndarray]:
+        return self._spectra.get(self._key(kind, serial, integration_time))
+
+    def store(self, serial: str, integration_time: float, spectrum, kind: str = "dark") -> None:
+        self._spectra[self._key(kind, serial, integration_time)] = np.asarray(spectrum, dtype=np.float64)
+        self.save()
+
+    def remove(self, serial: str, integration_time: float, kind: str = "dark") -> None:
+        if self._spectra.pop(self._key(kind, serial, integration_time), None) is not None:
+            self.save()
+
+    def save(self) -> None:
+        """Writes the library, replacing the file only when the new one is complete."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = self.path + ".tmp.npz"
+        np.savez(temporary, **self._spectra)
+        os.replace(temporary, self.path)
+
+    def correct(self, frame, serial: str, integration_time: float, reference: bool = False) -> np.ndarray:
+        """Subtracts the dark, and divides by the dark corrected reference if requested.
+
+        Raises:
+            KeyError: no dark (or reference) stored for this device and integration time.
+        """
+        dark = self.get(serial, integration_time)
+        if dark is None:
+            raise KeyError(f"No dark spectrum for {serial} at {integration_time} s")
+        corrected = np.asarray(frame, dtype=np.float64) - dark
+        if reference:
+            lamp = self.get(serial, integration_time, kind="reference")
+            if lamp is None:
+                raise KeyError(f"No reference spectrum for {serial} at {integration_time} s")
+            signal = lamp - dark
+            with np.errstate(divide="ignore", invalid="ignore"):
+                corrected = np.where(signal > 0, corrected / signal, np.nan)
+        return corrected
+
+
+class SpectrometerGroup:
+    """Several spectrometer plugins used as one, e.g. for UV and NIR coverage.
+
+    Each call goes to all members at once, one worker thread per device, so a capture takes as long as the slowest
+    exposure instead of the sum of all of them.
+
+    Usage:
+        group = SpectrometerGroup({"TLCCS": tlccs_functions, "oousb2000": oo_functions})
+        timestamp, spectra = group.capture()  # {"TLCCS": spectrum, "oousb2000": spectrum}
+        group.close()
+    """
+
+    def __init__(self, functions: Dict[str, Dict[str, Callable]]):
+        """
+        Args:
+            functions (dict): plugin name -> public functions of the plugin
+        """
+        if not functions:
+            raise ValueError("A spectrometer group needs at least one spectrometer")
+        self.functions = functions
+        self._executor = ThreadPoolExecutor(max_workers=len(functions), thread_name_prefix="SpectrometerGroup")
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.functions)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def call(self, function: str, *args, **kwargs) -> Dict[str, list]:
+        """Calls function(*args, **kwargs) of every member concurrently.
+
+        Returns:
+            dict: plugin name -> [status, info] as returned by the plugin. Exceptions are returned as status 4.
+        """
+
+        def run(name):
+            try:
+                return self.functions[name][function](*args, **kwargs)
+            except Exception as e:
+                return [4, {"Error message": f"{type(e).__name__}: {e}"}]
+
+        futures = {name: self._executor.submit(run, name) for name in self.functions}
+        return {name: future.result() for name, future in futures.items()}
+
+    def capture(self, function: str = "spectrometerGetScan") -> Tuple[float, Dict[str, Any]]:
+        """One spectrum from every member, started together.
+
+        Returns:
+            (timestamp, spectra): time.time() when the scans were started, plugin name -> spectrum
+
+        Raises:
+            RuntimeError: any of the members failed, the message lists all failures.
+        """
+        timestamp = time.time()
+        results = self.call(function)
+        errors = {name: info for name, (status, info) in results.items() if status}
+        if errors:
+            raise RuntimeError(f"Spectrometer group: {function} failed: {errors}")
+        return timestamp, {name: info for name, (status, info) in results.items()}
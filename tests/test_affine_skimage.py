@@ -2,7 +2,7 @@ import numpy as np
 import cv2 as cv
 import pytest
 from skimage.transform import AffineTransform, warp
-from plugins.Affine.Affine_skimage import Affine, AffineError
+from plugins.Affine.Affine_skimage import Affine, AffineError, MaskFeatureCache
 import os
 
 
@@ -232,3 +232,175 @@ def test_affine_settings_update():
     assert aff.ratio_test == 0.5
     assert aff.residual_threshold == 5
     assert aff.cross_check is False
+
+
+def test_mask_feature_cache(tmp_path, monkeypatch):
+    """Mask features are extracted once per mask, backend and mask settings, and reloaded from disk."""
+    mask_path = os.path.join("tests", "test_media", "masks", "refLED_v3_flat.png")
+    aff = Affine()
+    aff.feature_cache.directory = str(tmp_path)
+    aff.update_internal_mask(mask_path)
+    matrix = np.array([[1, 0, 15], [0, 1, 25], [0, 0, 1]], dtype=float)
+    warped = (warp(aff.internal_mask, AffineTransform(matrix=matrix).inverse) * 255).astype(np.uint8)
+    calls = []
+    preprocess_mask = aff.preprocessor.preprocess_mask
+    monkeypatch.setattr(aff.preprocessor, "preprocess_mask", lambda mask: calls.append(1) or preprocess_mask(mask))
+
+    aff.try_match(warped)
+    first = aff.A.copy()
+    aff.try_match(warped)
+    assert len(calls) == 1
+    assert np.allclose(aff.A[:2, :], first[:2, :], atol=1)
+    assert len(os.listdir(tmp_path)) == 1
+
+    # another instance loads the features from disk
+    aff2 = Affine()
+    aff2.feature_cache.directory = str(tmp_path)
+    aff2.update_internal_mask(mask_path)
+    monkeypatch.setattr(aff2.preprocessor, "preprocess_mask", lambda mask: calls.append(2) or preprocess_mask(mask))
+    aff2.try_match(warped)
+    assert calls == [1]
+    np.testing.assert_array_equal(aff2.result["kp1"], aff.result["kp1"])
+
+    # mask settings and backend are part of the key, image settings are not
+    aff.update_settings({"sigmaimage": 3.0})
+    aff.try_match(warped)
+    assert len(calls) == 1
+    aff.update_settings({"blurmask": True, "sigmamask": 1.5})
+    aff.try_match(warped)
+    assert len(calls) == 2
+    assert len(os.listdir(tmp_path)) == 2
+
+    # a truncated file is extracted again
+    (tmp_path / "broken.npz").write_bytes(b"PK\x03\x04 truncated")
+    assert MaskFeatureCache(str(tmp_path)).get("broken") is None
+
+
+def test_pyramid_matching(capsys):
+    """Coarse-to-fine matching finds the transform of a rotated and scaled view of the mask."""
+    mask_path = os.path.join("tests", "test_media", "masks", "refLED_v3_flat.png")
+    aff = Affine({"pyramid": "True", "pyramidscale": 0.5})
+    aff.update_internal_mask(mask_path)
+    tform = AffineTransform(scale=1.1, rotation=np.deg2rad(8), translation=(-150, -60))
+    view = (warp(aff.internal_mask, tform.inverse, output_shape=(720, 1280)) * 255).astype(np.uint8)
+    assert aff.try_match(view)
+    assert "coarse_transform" in aff.result
+    assert "pyramid_error" not in aff.result
+    assert "gray" in aff.result["timings"]
+    assert aff.result["matches"].shape[0] >= aff.MIN_MATCHES
+    for point in [(300, 200), (900, 500)]:
+        assert np.allclose(aff.coords(point), tform(np.array([point]))[0], atol=3)
+
+    # a failing coarse stage falls back to the full resolution match
+    aff.pyramid_scale = 0.01
+    aff.try_match(view)
+    assert "coarse_transform" not in aff.result
+    assert "pyramid_error" in aff.result
+    assert capsys.readouterr().out == ""  # diagnostics are in the result, not on stdout
+
+
+def reference_preprocess(img, s, suffix):
+    """The float64 skimage preprocessing that the uint8 pipeline replaced, for comparison."""
+    import skimage as ski
+
+    if img.ndim == 3:
+        img = ski.color.rgb2gray(img)
+    if s.get(f"invert{suffix}"):
+        img = 1.0 - img
+    if s.get(f"equalize{suffix}"):
+        img = ski.exposure.equalize_hist(img)
+    if s.get(f"blur{suffix}"):
+        img = ski.filters.gaussian(img, sigma=s[f"sigma{suffix}"])
+    if s.get(f"canny{suffix}"):
+        img = ski.feature.canny(img, sigma=s[f"sigma{suffix}"]).astype(float)
+    if s.get(f"otsu{suffix}"):
+        img_uint8 = (img * 255).astype("uint8")
+        img = (img_uint8 > ski.filters.threshold_otsu(img_uint8)).astype(float)
+    if s.get(f"manualthreshold{suffix}"):
+        img = ((img * 255).astype("uint8") > s[f"threshold{suffix}"]).astype(float)
+    if s.get(f"morphology{suffix}"):
+        operation = getattr(ski.morphology, s[f"morphologytype{suffix}"])
+        img = operation(img > 0.5, ski.morphology.disk(s[f"morphologystrength{suffix}"])).astype(float)
+    return (img * 255).astype("uint8")
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {},
+        {"invertimage": True, "equalizeimage": True},
+        {"blurimage": True, "sigmaimage": 2.0},
+        {"blurimage": True, "otsuimage": True, "sigmaimage": 2.0},
+        {"manualthresholdimage": True, "thresholdimage": 100, "morphologyimage": True, "morphologytypeimage": "opening", "morphologystrengthimage": 3},
+        {"blurimage": True, "cannyimage": True, "sigmaimage": 2.0},
+        {"cannymask": True, "sigmamask": 1.0},
+    ],
+)
+def test_uint8_preprocessing_matches_float(settings):
+    """The uint8 pipeline gives the output of the float pipeline within rounding, edges within a pixel."""
+    img = cv.cvtColor(cv.imread(os.path.join("tests", "test_media", "img", "NC1.png")), cv.COLOR_BGR2RGB)
+    aff = Affine(settings)
+    suffix = "mask" if any(key.endswith("mask") for key in settings) else "image"
+    s = dict(aff.preprocessor.settings)
+    new = aff.preprocessor.preprocess_mask(img) if suffix == "mask" else aff.preprocessor.preprocess_img(img)
+    old = reference_preprocess(img, s, suffix)
+    assert new.dtype == np.uint8 and new.shape == old.shape
+    timings = aff.preprocessor.timings["mask" if suffix == "mask" else "img"]
+    assert "gray" in timings and all(t >= 0 for t in timings.values())
+    if s[f"canny{suffix}"]:
+        assert "canny" in timings
+        near = cv.dilate(new, np.ones((3, 3), np.uint8))[old > 0] > 0
+        assert near.mean() > 0.97
+        assert abs(int(np.count_nonzero(new)) - int(np.count_nonzero(old))) < 0.1 * np.count_nonzero(old)
+    elif len(np.unique(old)) <= 2:
+        assert np.mean((new > 0) != (old > 0)) < 0.01
+    else:
+        diff = np.abs(new.astype(int) - old)
+        assert diff.mean() < 2.5 and diff.max() <= 12
+
+
+def test_preprocessing_reuses_buffers():
+    img = create_synthetic_image()
+    pre = Affine({"blurimage": True, "otsuimage": True}).preprocessor
+    first = pre.preprocess_img(img)
+    kept = first.copy()
+    second = pre.preprocess_img(create_synthetic_image(square_pos=(100, 100)))
+    # the output is not a scratch buffer, earlier results stay valid
+    np.testing.assert_array_equal(first, kept)
+    assert not np.shares_memory(first, second)
+    assert len(pre._scratch) == 2
+
+
+def test_tracking():
+    """track() follows drift of the image from the last aligned frame and runs a full match when it is lost."""
+    mask_path = os.path.join("tests", "test_media", "masks", "refLED_v3_flat.png")
+    aff = Affine()
+    mask = aff.update_internal_mask(mask_path)[:720, :1280]
+    aligned = AffineTransform(translation=(30, -20), rotation=np.deg2rad(2))
+    view = (warp(mask, aligned.inverse, output_shape=mask.shape) * 255).astype(np.uint8)
+    src = np.array([(100, 100), (1000, 120), (150, 600), (1100, 650)], dtype=float)
+    aff.manual_transform(src, aligned(src), view, mask)
+
+    full_matches = []
+    for step in range(1, 4):
+        drift = AffineTransform(translation=(3 * step, -2 * step), rotation=np.deg2rad(0.3 * step))
+        frame = (warp(mask, (drift + aligned).inverse, output_shape=mask.shape) * 255).astype(np.uint8)
+        assert aff.track(frame, fallback=full_matches.append)
+        assert aff.track_confidence >= aff.track_min_confidence
+        for point in [(300, 200), (900, 500)]:
+            assert np.allclose(aff.coords(point), (drift + aligned)(np.array([point]))[0], atol=1.5)
+    assert full_matches == []
+
+    # an unrelated frame falls back to the full match
+    other = np.random.default_rng(0).integers(0, 256, mask.shape[:2], dtype=np.uint8)
+    assert not aff.track(other, fallback=full_matches.append)
+    assert len(full_matches) == 1 and aff.track_confidence < aff.track_min_confidence
+
+    # phase correlation follows translations
+    aff.update_settings({"trackingmethod": "phase", "trackingconfidence": 0.3})
+    aff.manual_transform(src, aligned(src), view, mask)
+    shifted = np.roll(view, (4, -6), axis=(0, 1))
+    assert aff.track(shifted, fallback=full_matches.append)
+    assert np.allclose(aff.coords((600, 400)), aligned(np.array([(600, 400)]))[0] + (-6, 4), atol=1)
+    with pytest.raises(AffineError):
+        aff.update_settings({"trackingmethod": "optical flow"})
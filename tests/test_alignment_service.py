@@ -0,0 +1,89 @@
+"""
+Tests for the alignment worker processes of Affine (alignment_service.py)
+
+This module tests the following:
+- parsing of the candidate settings string
+- races in the calling process: best candidate by inliers, first passing candidate, failing candidates
+- races in a process pool, jobs submitted without blocking
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from skimage.transform import AffineTransform, warp
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "plugins", "Affine"))
+
+try:
+    from alignment_service import AlignmentService, parse_candidates
+    from Affine_skimage import Affine, AffineError
+except ImportError as e:
+    pytest.skip(f"Cannot import alignment_service: {e}", allow_module_level=True)
+
+MASK_PATH = os.path.join(os.path.dirname(__file__), "test_media", "masks", "refLED_v3_flat.png")
+
+
+@pytest.fixture(scope="module")
+def scene():
+    aff = Affine()
+    mask = aff.update_internal_mask(MASK_PATH)[:540, :960]
+    tform = AffineTransform(translation=(20, -15), rotation=np.deg2rad(3))
+    view = (warp(mask, tform.inverse, output_shape=mask.shape) * 255).astype(np.uint8)
+    return mask, view, tform
+
+
+def test_parse_candidates():
+    assert parse_candidates(" sift:0.8, ORB ,") == [{"backend": "SIFT", "ratiotest": 0.8}, {"backend": "ORB"}]
+    assert parse_candidates("") == []
+    with pytest.raises(ValueError):
+        parse_candidates("SURF:0.8")
+    with pytest.raises(ValueError):
+        parse_candidates("SIFT:1.5")
+
+
+def test_best_candidate_in_process(scene):
+    mask, view, tform = scene
+    service = AlignmentService(workers=1)
+    base = {"backend": "SIFT", "ratiotest": 0.8, "crosscheck": True}
+    candidates = [{"backend": "SIFT"}, {"backend": "ORB", "ratiotest": 0.9}, {"backend": "FAST"}]
+    outcome = service.align(view, mask, candidates, base_settings=base)
+    service.shutdown()
+    finished = outcome["candidates"]
+    assert len(finished) == 3  # the base settings first, the SIFT candidate is the same
+    assert finished[0]["settings"] == base
+    assert finished[2]["error"] is not None  # unsupported backend, the race goes on
+    assert outcome["inliers"] == max(c["inliers"] for c in finished)
+    assert outcome["settings"]["crosscheck"] is True
+    aff = Affine()
+    AlignmentService.apply(aff, outcome)
+    assert aff.result["matches"].shape[0] == outcome["inliers"]
+    assert np.allclose(aff.coords((300, 200)), tform(np.array([(300, 200)]))[0], atol=3)
+
+
+def test_first_candidate_in_process(scene):
+    mask, view, _ = scene
+    service = AlignmentService(workers=1)
+    base = {"backend": "ORB"}
+    outcome = service.align(view, mask, [{"backend": "SIFT"}], base_settings=base, mode="first", min_inliers=10)
+    assert outcome["settings"]["backend"] == "ORB"
+    assert len(outcome["candidates"]) == 1
+    with pytest.raises(AffineError):
+        service.align(view, mask, [], base_settings={"backend": "FAST"})
+    with pytest.raises(ValueError):
+        service.align(view, mask, [], mode="fastest")
+    service.shutdown()
+
+
+def test_process_pool(scene):
+    mask, view, tform = scene
+    service = AlignmentService(workers=2)
+    try:
+        future = service.submit(view, mask, parse_candidates("ORB:0.9"), base_settings={"backend": "SIFT"})
+        outcome = future.result(timeout=120)
+        assert {c["settings"]["backend"] for c in outcome["candidates"]} == {"SIFT", "ORB"}
+        assert outcome["inliers"] == max(c["inliers"] for c in outcome["candidates"])
+        assert np.allclose(outcome["A"], tform.params, atol=[[0.02, 0.02, 3], [0.02, 0.02, 3], [0, 0, 0]])
+    finally:
+        service.shutdown()
@@ -0,0 +1,333 @@
+"""
+Tests for camera_components.py
+
+This module tests the following:
+- FrameGrabber: newest frame without waiting, frames read after a given time, skipping buffered frames, read failures
+- fit_preview, PreviewPacer: downsampling to the preview size, dropping frames while the GUI renders, adaptive rate
+- FrameBus: read-only views, buffer reuse only when no view is alive, dropping when the pool is held, subscribers
+- FrameRecorder: PNG, NPY stack and video clips, frames before the trigger, dropping when the writer falls behind
+- VenusUSB2 with a fake capture: grabbed frames are published to the bus and shared with captures
+"""
+
+import os
+import sys
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+# Add the plugins directory to the path so we can import the module
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "plugins"))
+
+try:
+    from camera_components import FrameBus, FrameGrabber, FrameRecorder, PreviewPacer, fit_preview
+except ImportError as e:
+    pytest.skip(f"Cannot import required modules: {e}", allow_module_level=True)
+
+
+class FakeCamera:
+    """read() returns numbered frames every period seconds, or fails while failing is set."""
+
+    def __init__(self, period=0.01):
+        self.period = period
+        self.frames = 0
+        self.failing = threading.Event()
+
+    def read(self):
+        time.sleep(self.period)
+        if self.failing.is_set():
+            return False, None
+        self.frames += 1
+        return True, np.full((4, 4), self.frames, dtype=np.uint8)
+
+
+class TestFrameGrabber:
+    def setup_method(self):
+        self.camera = FakeCamera()
+        self.grabber = FrameGrabber(self.camera.read, convert=lambda frame: frame * 2, max_failures=5)
+        self.grabber.start()
+
+    def teardown_method(self):
+        self.grabber.stop()
+
+    def test_latest_is_newest_and_immediate(self):
+        seq, t_start, t_end, frame = self.grabber.latest()
+        assert t_start < t_end
+        time.sleep(0.05)
+        start = time.monotonic()
+        seq2, _, _, frame2 = self.grabber.latest()
+        assert time.monotonic() - start < 0.005
+        assert seq2 > seq
+        # converted in the grabber thread
+        assert frame2[0, 0] == 2 * (seq2 + 1)
+
+    def test_next_after(self):
+        self.grabber.latest()
+        t = time.monotonic()
+        seq, t_start, _, _ = self.grabber.next_after(t)
+        assert t_start >= t
+        t = time.monotonic()
+        seq_skip, _, _, _ = self.grabber.next_after(t, skip=2)
+        # at least three frames were read after t
+        assert self.grabber._starts[-3] >= t
+        assert seq_skip >= seq + 3
+
+    def test_failures_stop_the_grabber(self):
+        self.grabber.latest()
+        self.camera.failing.set()
+        with pytest.raises(RuntimeError):
+            self.grabber.next_after(time.monotonic(), timeout=1.0)
+        assert not self.grabber.running
+        assert self.grabber.error is not None
+
+    def test_stopped(self):
+        self.grabber.stop()
+        with pytest.raises(RuntimeError):
+            self.grabber.next_after(time.monotonic() + 10, timeout=0.1)
+        grabber = FrameGrabber(lambda: (False, None))
+        with pytest.raises(RuntimeError):
+            grabber.latest(timeout=0.1)
+
+
+class TestPreview:
+    def test_fit_preview(self):
+        frame = np.zeros((960, 1280, 3), dtype=np.uint8)
+        assert fit_preview(frame, 640, 640).shape == (480, 640, 3)
+        assert fit_preview(frame, 2000, 300).shape == (300, 400, 3)
+        assert fit_preview(frame, 4000, 4000) is frame
+
+    def test_drops_while_rendering(self):
+        pacer = PreviewPacer(min_interval=0)
+        assert pacer.ready()
+        pacer.sent()
+        assert not pacer.ready()
+        assert not pacer.ready()
+        assert pacer.dropped == 2
+        pacer.rendered(0.001)
+        time.sleep(0.01)
+        assert pacer.ready()
+
+    def test_interval_follows_render_time(self):
+        pacer = PreviewPacer(min_interval=0.01, max_interval=0.2, load=0.5, smoothing=1.0)
+        pacer.sent()
+        pacer.rendered(0.05)
+        assert pacer.interval == pytest.approx(0.1)
+        assert not pacer.ready()  # interval not elapsed
+        pacer.sent()
+        pacer.rendered(1.0)
+        assert pacer.interval == 0.2
+        pacer.sent()
+        pacer.rendered(0.001)
+        assert pacer.interval == 0.01
+
+    def test_lost_frame(self):
+        pacer = PreviewPacer(min_interval=0, lost_after=0.02)
+        pacer.sent()
+        assert not pacer.ready()
+        time.sleep(0.03)
+        assert pacer.ready()
+
+
+class TestFrameBus:
+    def test_views_and_reuse(self):
+        bus = FrameBus(slots=3)
+        frame = np.arange(12, dtype=np.uint8).reshape(3, 4)
+        seq, view = bus.publish_copy(frame)
+        assert seq == 0
+        assert not view.flags.writeable
+        np.testing.assert_array_equal(view, frame)
+        with pytest.raises(ValueError):
+            view[0, 0] = 1
+        # the held frame is not overwritten by later ones
+        for i in range(10):
+            bus.publish_copy(np.full((3, 4), i, dtype=np.uint8))
+        np.testing.assert_array_equal(view, frame)
+        assert bus.dropped == 0
+        assert bus.latest()[0] == 10
+
+    def test_drops_when_all_buffers_are_held(self):
+        bus = FrameBus(slots=3)
+        held = [bus.publish_copy(np.full((2, 2), i, dtype=np.uint8)) for i in range(3)]
+        assert bus.publish_copy(np.zeros((2, 2), dtype=np.uint8)) is None
+        assert bus.dropped == 1
+        # releasing the views frees the buffers (the newest stays held by the bus)
+        held = None
+        assert bus.publish_copy(np.zeros((2, 2), dtype=np.uint8))[0] == 3
+
+    def test_wait_and_subscribe(self):
+        bus = FrameBus()
+        received = []
+        token = bus.subscribe(lambda seq, t, frame: received.append((seq, frame[0, 0])))
+        threading.Timer(0.02, lambda: bus.publish_copy(np.full((2, 2), 7, dtype=np.uint8))).start()
+        seq, t, frame = bus.wait_next(timeout=1.0)
+        assert (seq, frame[0, 0]) == (0, 7)
+        assert received == [(0, 7)]
+        bus.unsubscribe(token)
+        bus.publish_copy(np.zeros((2, 2), dtype=np.uint8))
+        assert len(received) == 1
+        with pytest.raises(TimeoutError):
+            bus.wait_next(1, timeout=0.05)
+
+    def test_shape_change(self):
+        bus = FrameBus()
+        bus.publish_copy(np.zeros((2, 2), dtype=np.uint8))
+        seq, frame = bus.publish_copy(np.ones((4, 4, 3), dtype=np.uint8))
+        assert frame.shape == (4, 4, 3)
+
+
+
+def stream(bus, first, count, interval=0.01):
+    for i in range(first, first + count):
+        bus.publish_copy(np.full((12, 16, 3), (i, 2 * i % 256, 0), dtype=np.uint8))
+        time.sleep(interval)
+
+
+class TestFrameRecorder:
+    def test_record_around(self, tmp_path):
+        bus = FrameBus()
+        recorder = FrameRecorder(bus, str(tmp_path), prefix="run", fmt="npy", pre_seconds=0.1)
+        stream(bus, 0, 20)
+        assert recorder.record_around("step1", before=0.05, after=0.05) == "step1"
+        # a trigger during the clip extends it
+        assert recorder.record_around("step2", before=0.05, after=0.1) == "step1"
+        stream(bus, 20, 30)
+        recorder.close()
+        assert not recorder.recording and recorder.errors == []
+        stack = np.load(tmp_path / "run_step1.npy")
+        frames = np.loadtxt(tmp_path / "run_step1_frames.csv", delimiter=";", skiprows=1)
+        assert stack.shape[1:] == (12, 16, 3)
+        assert len(stack) == len(frames) == recorder.written
+        # consecutive frames from before the trigger to about 0.1 s after it
+        np.testing.assert_array_equal(np.diff(stack[:, 0, 0, 0].astype(int)), 1)
+        assert stack[0, 0, 0, 0] < 20 <= stack[-1, 0, 0, 0]
+        assert frames[0, 2] < 0 and 0.05 < frames[-1, 2] <= 0.1
+        np.testing.assert_array_equal(stack[:, 0, 0, 1], (2 * stack[:, 0, 0, 0].astype(int)) % 256)
+
+    def test_png_and_video(self, tmp_path):
+        bus = FrameBus()
+        for fmt in ("png", "video"):
+            recorder = FrameRecorder(bus, str(tmp_path), prefix=fmt, fmt=fmt, png_compression=9)
+            recorder.start("manual")
+            stream(bus, 0, 5)
+            recorder.stop()
+            stream(bus, 5, 5)
+            recorder.close()
+            assert recorder.written == 5
+        png = cv.imread(str(tmp_path / "png_manual_00004.png"))
+        assert tuple(png[0, 0]) == (0, 8, 4)  # stored as BGR
+        assert not (tmp_path / "png_manual_00005.png").exists()
+        video = cv.VideoCapture(str(tmp_path / "video_manual.mp4"))
+        assert video.get(cv.CAP_PROP_FRAME_COUNT) == 5
+        video.release()
+
+    def test_drops_instead_of_blocking(self, tmp_path):
+        bus = FrameBus()
+        recorder = FrameRecorder(bus, str(tmp_path), fmt="npy", pre_seconds=0, queue_size=4)
+        slow = recorder._write_frame
+
+        def write_frame(*args):
+            time.sleep(0.05)
+            slow(*args)
+
+        recorder._write_frame = write_frame
+        recorder.start("burst")
+        start = time.monotonic()
+        stream(bus, 0, 40, interval=0)
+        assert time.monotonic() - start < 0.1
+        recorder.close()
+        assert recorder.dropped > 0
+        assert recorder.written + recorder.dropped == 40
+        assert len(np.load(tmp_path / "record_burst.npy")) == recorder.written
+
+    def test_history_longer_than_queue(self, tmp_path):
+        bus = FrameBus()
+        recorder = FrameRecorder(bus, str(tmp_path), fmt="npy", pre_seconds=10, queue_size=4)
+        stream(bus, 0, 30)
+        recorder.record_around("late", before=10, after=0)
+        recorder.close()
+        assert recorder.dropped == 0
+        np.testing.assert_array_equal(np.load(tmp_path / "record_late.npy")[:, 0, 0, 0], np.arange(30))
+
+    def test_clip_ends_without_frames(self, tmp_path):
+        bus = FrameBus()
+        recorder = FrameRecorder(bus, str(tmp_path), fmt="npy")
+        stream(bus, 0, 3)
+        recorder.record_around("idle", before=1, after=0.01)
+        time.sleep(0.5)
+        assert not recorder.recording
+        assert len(np.load(tmp_path / "record_idle.npy")) == 3
+        recorder.close()
+
+    def test_settings(self, tmp_path):
+        with pytest.raises(ValueError):
+            FrameRecorder(FrameBus(), str(tmp_path), fmt="gif")
+        with pytest.raises(ValueError):
+            FrameRecorder(FrameBus(), str(tmp_path), png_compression=10)
+        with pytest.raises(ValueError):
+            FrameRecorder(FrameBus(), str(tmp_path / "missing"))
+
+class FakeCapture:
+    """Stands in for cv.VideoCapture, read fills the given image with a frame counter (BGR)."""
+
+    def __init__(self):
+        self.frames = 0
+        self.allocations = 0
+
+    def open(self, source):
+        pass
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop, value):
+        return True
+
+    def get(self, prop):
+        return 0
+
+    def release(self):
+        pass
+
+    def read(self, image=None):
+        time.sleep(0.005)
+        if image is None:
+            image = np.zeros((6, 8, 3), dtype=np.uint8)
+            self.allocations += 1
+        self.frames += 1
+        image[..., 0] = self.frames  # blue
+        return True, image
+
+
+class TestVenusUSB2:
+    def setup_method(self):
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "plugins", "VenusUSB2-0.7.0"))
+        from VenusUSB2 import VenusUSB2
+
+        self.camera = VenusUSB2()
+        self.camera.cap = FakeCapture()
+        assert self.camera.open("fake")[0] == 0
+
+    def teardown_method(self):
+        self.camera.close()
+
+    def test_capture_uses_bus(self):
+        status, frame = self.camera.capture_image("fake", None, latest=True)
+        assert status == 0
+        assert not frame.flags.writeable
+        assert frame[0, 0, 2] > 0  # converted to RGB
+        t = time.monotonic()
+        status, newer = self.camera.capture_image("fake", None, newer_than=t)
+        assert newer[0, 0, 2] > frame[0, 0, 2]
+        assert self.camera.bus.latest()[2][0, 0, 2] >= newer[0, 0, 2]
+        # by default the frame is read after the call
+        status, after = self.camera.capture_image("fake", None)
+        assert after[0, 0, 2] > newer[0, 0, 2]
+        # the raw frame is read into the same buffer every time
+        assert self.camera.cap.allocations == 1
+
+    def test_preview_frames_are_new(self):
+        _, first = self.camera.capture_buffered()
+        _, second = self.camera.capture_buffered()
+        assert second[0, 0, 2] > first[0, 0, 2]
@@ -0,0 +1,102 @@
+"""
+Tests for the mock camera of cam_dummy (dummycam.py)
+
+This module tests the following:
+- ImageCache: images are decoded once, LRU eviction, changed files are decoded again
+- playlist of a directory, video mode at a set fps, frames kept within a frame period
+- jitter: drift of the image between frames, reproducible with a seed
+"""
+
+import os
+import sys
+import time
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "plugins"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "plugins", "cam_dummy"))
+
+try:
+    from dummycam import DummyCamera, ImageCache
+except ImportError as e:
+    pytest.skip(f"Cannot import dummycam: {e}", allow_module_level=True)
+
+
+@pytest.fixture
+def images(tmp_path):
+    rng = np.random.default_rng(0)
+    for i in range(3):
+        img = cv.GaussianBlur(rng.integers(0, 256, (60, 80, 3), dtype=np.uint8), (7, 7), 2)
+        img[0, 0] = (i, 0, 0)  # BGR, the index is in the blue channel
+        cv.imwrite(str(tmp_path / f"img{i}.png"), img)
+    (tmp_path / "notes.txt").write_text("not an image")
+    return tmp_path
+
+
+class TestImageCache:
+    def test_decoded_once(self, images):
+        cache = ImageCache()
+        first = cache.get(str(images / "img1.png"))
+        assert cache.get(str(images / "img1.png")) is first
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert first[0, 0, 2] == 1 and not first.flags.writeable
+
+    def test_lru_eviction(self, images):
+        cache = ImageCache(max_bytes=2 * 60 * 80 * 3)
+        for name in ("img0.png", "img1.png", "img0.png", "img2.png"):
+            cache.get(str(images / name))
+        cache.get(str(images / "img0.png"))
+        assert cache.misses == 3  # img0 was used more recently than img1
+        cache.get(str(images / "img1.png"))
+        assert cache.misses == 4
+
+    def test_changed_file(self, images):
+        cache = ImageCache()
+        path = str(images / "img0.png")
+        cache.get(path)
+        cv.imwrite(path, np.zeros((10, 10, 3), dtype=np.uint8))
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+        assert cache.get(path).shape == (10, 10, 3)
+
+
+class TestDummyCamera:
+    def test_playlist(self, images):
+        camera = DummyCamera()
+        assert camera.open(str(images))[0] == 0
+        indices = [camera.capture_image()[1][0, 0, 2] for _ in range(4)]
+        assert indices == [0, 1, 2, 0]
+        assert camera.cache.misses == 3
+        assert camera.open(str(images / "missing"))[0] == 4
+
+    def test_video_mode(self, images):
+        camera = DummyCamera()
+        camera.fps = 20
+        camera.open(str(images))
+        status, first = camera.capture_image()
+        assert status == 0
+        assert camera.capture_image()[1] is first  # same frame period
+        published = camera.bus.published
+        time.sleep(0.06)
+        before = int((time.monotonic() - camera._start) * 20) % 3
+        status, later = camera.capture_image()
+        after = int((time.monotonic() - camera._start) * 20) % 3
+        assert later is not first and camera.bus.published == published + 1
+        assert later[0, 0, 2] in (before, after)
+
+    def test_jitter(self, images):
+        path = str(images / "img0.png")
+        frames = []
+        for _ in range(2):
+            camera = DummyCamera()
+            camera.seed = 1
+            camera.jitter_shift = 2.0
+            camera.jitter_rotate = 0.2
+            camera.jitter_noise = 3.0
+            camera.open(path)
+            frames.append([camera.capture_image()[1].copy() for _ in range(3)])
+        np.testing.assert_array_equal(frames[0], frames[1])
+        clean = camera.cache.get(path)
+        assert np.abs(frames[0][2].astype(int) - clean).mean() > 3
+        assert np.abs(frames[0][1].astype(int) - frames[0][2]).mean() > 0
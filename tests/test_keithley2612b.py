@@ -416,3 +416,56 @@ class TestKeithley2612B:
         assert "mockb.measure.nplc = 0.01" not in self.commands_sent
         assert "mockb.source.highc = mockb.ENABLE" not in self.commands_sent
 
+
+    def test_triggered_pulse(self):
+        """Test that the triggered pulse ties the digio TTL, the measurement and the end of the pulse to the trigger timers."""
+        self.keithley.keithley_connect("mock", "192.168.1.1", "MOCK", "502")
+
+        settings = {"source": "mocka", "type": "v", "level": 1.5, "pulsewidth": 0.11, "triggerdelay": 0.002, "digio": 3}
+        assert self.keithley.keithley_run_triggered_pulse(settings) == 0
+
+        assert "mocka.source.levelv = 0" in self.commands_sent
+        assert "mocka.trigger.source.listv({1.5})" in self.commands_sent
+        assert "mocka.trigger.endpulse.action = mocka.SOURCE_IDLE" in self.commands_sent
+        assert "trigger.timer[3].delay = 0.002" in self.commands_sent
+        assert "trigger.timer[3].stimulus = mocka.trigger.SOURCE_COMPLETE_EVENT_ID" in self.commands_sent
+        assert "digio.trigger[3].mode = digio.TRIG_RISINGM" in self.commands_sent
+        assert "digio.trigger[3].stimulus = trigger.timer[3].EVENT_ID" in self.commands_sent
+        assert "mocka.trigger.measure.stimulus = trigger.timer[3].EVENT_ID" in self.commands_sent
+        assert "trigger.timer[4].delay = 0.11" in self.commands_sent
+        assert "mocka.trigger.endpulse.stimulus = trigger.timer[4].EVENT_ID" in self.commands_sent
+        # the pulse is started only after the trigger model is configured
+        assert self.commands_sent[-1] == "mocka.trigger.initiate()"
+        assert self.commands_sent.index("mocka.source.output = mocka.OUTPUT_ON") > self.commands_sent.index("mocka.trigger.endpulse.stimulus = trigger.timer[4].EVENT_ID")
+
+    def test_read_triggered_pulse_timeout(self):
+        """Test that the buffer query after a long pulse gets a timeout covering the pulse, restored afterwards."""
+
+        class Instrument:
+            timeout = 25000
+
+        self.keithley.backend = "Ethernet"
+        self.keithley.ke = Instrument()
+        self.keithley.triggered_pulse_length = 30.0
+        timeouts = []
+
+        def mock_get_last_buffer_value(channel, readings=None):
+            timeouts.append(self.keithley.ke.timeout)
+            return [1e-3, 1.5, 1]
+
+        self.keithley.get_last_buffer_value = mock_get_last_buffer_value
+        assert self.keithley.read_triggered_pulse("smua") == [1e-3, 1.5, 1]
+        assert self.commands_sent == ["waitcomplete()"]
+        assert timeouts == [55000]
+        assert self.keithley.ke.timeout == 25000
+
+    def test_triggered_pulse_current_zero_delay(self):
+        """Test current pulses and that a zero trigger delay is replaced by the smallest timer delay."""
+        self.keithley.keithley_connect("mock", "192.168.1.1", "MOCK", "502")
+
+        settings = {"source": "mockb", "type": "i", "level": 0.001, "pulsewidth": 0.05, "triggerdelay": 0, "digio": 1}
+        self.keithley.keithley_run_triggered_pulse(settings)
+
+        assert "mockb.source.leveli = 0" in self.commands_sent
+        assert "mockb.trigger.source.listi({0.001})" in self.commands_sent
+        assert "trigger.timer[3].delay = 1e-06" in self.commands_sent
@@ -0,0 +1,138 @@
+"""
+Tests for the simulated CCS175 of spec_dummy (mockspec.py)
+
+This module tests the following:
+- timing: non blocking start, ready after exposure + readout, blocking read, triggered and continuous scans
+- signal model: linear in integration time and excitation, dark current, saturation, count dependent noise
+- excitation source read at the start of the exposure
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+# Add the spec_dummy plugin directory to the path
+SPEC_DUMMY = os.path.join(os.path.dirname(__file__), "..", "plugins", "spec_dummy")
+sys.path.insert(0, SPEC_DUMMY)
+
+try:
+    from mockspec import MockCCSDRV
+except ImportError as e:
+    pytest.skip(f"Cannot import mockspec: {e}", allow_module_level=True)
+finally:
+    # spec_dummy has its own copy of TLCCS_const, keep it from shadowing the TLCCS one in other tests
+    sys.path.remove(SPEC_DUMMY)
+    sys.modules.pop("TLCCS_const", None)
+
+
+def peak(drv):
+    return int(np.argmax(drv.emission))
+
+
+class TestTiming:
+    def setup_method(self):
+        self.drv = MockCCSDRV(seed=0)
+        self.drv.open(0, 0, 0.05)
+
+    def test_single_scan(self):
+        start = time.monotonic()
+        self.drv.start_scan()
+        assert time.monotonic() - start < 0.01
+        assert self.drv.get_device_status() == ["SCAN_TRIGGERED"]
+        assert not self.drv.scan_ready()
+        data = self.drv.get_scan_data()
+        elapsed = time.monotonic() - start
+        assert elapsed >= 0.05 + self.drv.readout_time + self.drv.transfer_time
+        assert elapsed < 0.05 + 0.05
+        assert data.shape == self.drv.wavelength.shape
+        assert self.drv.get_device_status() == ["SCAN_IDLE"]
+        with pytest.raises(RuntimeError):
+            self.drv.get_scan_data()
+
+    def test_ready_after_readout(self):
+        self.drv.start_scan()
+        time.sleep(0.05 + self.drv.readout_time + 0.005)
+        assert self.drv.scan_ready()
+        start = time.monotonic()
+        self.drv.get_scan_data()
+        assert time.monotonic() - start < 0.02
+
+    def test_external_trigger(self):
+        self.drv.trigger_delay = None
+        self.drv.set_integration_time(0.01)
+        self.drv.start_scan_ext_trigger()
+        time.sleep(0.03)
+        assert "WAIT_FOR_EXT_TRIG" in self.drv.get_device_status()
+        fired = time.monotonic()
+        self.drv.trigger()
+        self.drv.get_scan_data()
+        assert time.monotonic() - fired >= 0.01 + self.drv.readout_time
+
+    def test_continuous_frames_are_back_to_back(self):
+        self.drv.set_integration_time(0.01)
+        self.drv.start_scan_continuous()
+        start = time.monotonic()
+        for _ in range(5):
+            self.drv.get_scan_data()
+        period = 0.01 + self.drv.readout_time
+        assert 5 * period <= time.monotonic() - start + 0.001 < 5 * period + 0.03
+
+
+class TestSignal:
+    def setup_method(self):
+        self.drv = MockCCSDRV(seed=1)
+        self.drv.open(0, 0, 0.1)
+
+    def scan(self, integration_time, n=1):
+        self.drv.integration_time = integration_time
+        return np.mean([self.drv._frame(integration_time, self.drv.excitation) for _ in range(n)], axis=0)
+
+    def test_linear_in_integration_time_and_excitation(self):
+        i = peak(self.drv)
+        short = self.scan(0.05, 20)[i]
+        long = self.scan(0.1, 20)[i]
+        assert long / short == pytest.approx(2, rel=0.02)
+        self.drv.set_excitation(0.5)
+        assert self.scan(0.1, 20)[i] / long == pytest.approx(0.5, rel=0.03)
+
+    def test_dark_current(self):
+        self.drv.set_excitation(0.0)
+        self.drv.background = 0.0
+        dark = self.scan(10.0, 5)
+        expected = self.drv.dark_current * 10.0 / (65535 - self.drv.bias)
+        assert np.mean(dark) == pytest.approx(expected, rel=0.02)
+
+    def test_saturation(self):
+        data = self.scan(5.0)
+        assert data.max() == pytest.approx(1.0, abs=1e-3)
+        assert np.sum(data > 0.999) > 10
+
+    def test_noise_grows_with_counts(self):
+        self.drv.set_excitation(0.0)
+        self.drv.background = 0.0
+        frames = np.array([self.drv._frame(0.001, 0.0) for _ in range(50)])
+        dark_noise = frames.std(axis=0).mean()
+        frames = np.array([self.drv._frame(0.1, 1.0) for _ in range(50)])
+        bright_noise = frames[:, peak(self.drv)].std()
+        assert bright_noise > 3 * dark_noise
+        # shot noise of the collected charge: sqrt(gain * counts)
+        counts = self.drv.responsivity * 0.1
+        assert bright_noise * (65535 - self.drv.bias) == pytest.approx(np.sqrt(self.drv.gain * counts), rel=0.3)
+
+    def test_excitation_source(self):
+        levels = iter([0.0, 1.0])
+        self.drv.excitation_source = lambda: next(levels)
+        self.drv.set_integration_time(0.01)
+        self.drv.start_scan()
+        dark = self.drv.get_scan_data()
+        self.drv.start_scan()
+        lit = self.drv.get_scan_data()
+        i = peak(self.drv)
+        assert lit[i] - dark[i] == pytest.approx(self.drv.responsivity * 0.01 / (65535 - self.drv.bias), rel=0.2)
+        # a failing source keeps the last level
+        self.drv.start_scan()
+        assert self.drv.excitation == 1.0
+        self.drv.get_scan_data()
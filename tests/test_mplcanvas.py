@@ -0,0 +1,74 @@
+"""
+Tests for LiveLinePlot in MplCanvas.py
+
+This module tests the following:
+- the line artist is reused and frames inside the y limits are blitted without a full redraw
+- the y limits follow the data only when it leaves them and only if the user has not set their own
+- frames above the frame rate limit are skipped
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+# Add the components directory to the path so we can import the module
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "components"))
+
+try:
+    from PyQt6.QtWidgets import QApplication
+
+    from MplCanvas import LiveLinePlot, MplCanvas
+
+    app = QApplication.instance() or QApplication(sys.argv)
+except ImportError as e:
+    pytest.skip(f"Cannot import required modules: {e}", allow_module_level=True)
+
+X = np.linspace(500, 1000, 3648)
+
+
+class TestLiveLinePlot:
+    def setup_method(self):
+        self.canvas = MplCanvas()
+        self.axes = self.canvas.fig.add_subplot(111)
+        self.plot = LiveLinePlot(self.canvas, self.axes, max_fps=0)
+        self.draws = 0
+
+        def count(event):
+            self.draws += 1
+
+        self.canvas.mpl_connect("draw_event", count)
+
+    def test_blit_inside_limits(self):
+        self.plot.update(X, np.sin(X))
+        assert self.draws == 1
+        line = self.plot.line
+        for phase in range(5):
+            self.plot.update(X, 0.9 * np.sin(X + phase))
+        assert self.draws == 1
+        assert list(self.axes.lines) == [line]
+        np.testing.assert_allclose(line.get_ydata(), 0.9 * np.sin(X + 4))
+
+    def test_rescale_when_leaving_limits(self):
+        self.plot.update(X, np.sin(X))
+        self.plot.update(X, 3 * np.sin(X))
+        assert self.draws == 2
+        ymin, ymax = self.axes.get_ylim()
+        assert ymin < -3 and ymax > 3
+        # smaller data keeps the limits
+        self.plot.update(X, np.sin(X))
+        assert self.axes.get_ylim() == (ymin, ymax)
+
+    def test_user_limits_are_kept(self):
+        self.plot.update(X, np.sin(X))
+        self.axes.set_ylim(0, 0.5)
+        self.plot.update(X, 3 * np.sin(X))
+        assert self.axes.get_ylim() == (0, 0.5)
+
+    def test_frame_rate_limit(self):
+        plot = LiveLinePlot(self.canvas, self.axes, max_fps=1)
+        assert plot.update(X, np.sin(X))
+        assert not plot.update(X, np.cos(X))
+        np.testing.assert_allclose(plot.line.get_ydata(), np.sin(X))
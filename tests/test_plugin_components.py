@@ -9,6 +9,7 @@ This module tests the following classes:
 - SMUHelper: SMU initialization helper
 - DataOrder: Enum for data ordering
 - PluginException: Custom exception class
+- AsyncFileWriter: Background file writing thread
 """
 
 import sys
@@ -26,6 +27,7 @@ try:
         DependencyManager,
         LoggingHelper,
         PluginException,
+        AsyncFileWriter,
     )
     from PyQt6.QtWidgets import QApplication, QWidget, QLineEdit, QCheckBox, QComboBox, QSpinBox, QDoubleSpinBox
     from PyQt6.QtCore import QObject
@@ -833,6 +835,58 @@ class TestPluginException:
             raise PluginException("Custom error message")
 
 
+class TestAsyncFileWriter:
+    """Test the AsyncFileWriter background writer."""
+
+    def test_jobs_run_in_order(self):
+        """Jobs are run in submission order and close() waits for all of them."""
+        results = []
+        writer = AsyncFileWriter("test writer")
+        for i in range(50):
+            writer.submit(results.append, i)
+        writer.close()
+        assert results == list(range(50))
+        assert writer.pending == 0
+
+    def test_writes_files(self, tmp_path):
+        """Jobs with keyword arguments write files in the background."""
+
+        def save(address, data):
+            with open(address, "w") as f:
+                f.write(data)
+
+        with AsyncFileWriter() as writer:
+            writer.submit(save, address=tmp_path / "a.txt", data="first")
+            writer.submit(save, address=tmp_path / "b.txt", data="second")
+        assert (tmp_path / "a.txt").read_text() == "first"
+        assert (tmp_path / "b.txt").read_text() == "second"
+
+    def test_errors_are_collected(self):
+        """A failing job is recorded and does not stop the following jobs."""
+        results = []
+
+        def fail():
+            raise OSError("disk full")
+
+        writer = AsyncFileWriter()
+        writer.submit(fail)
+        writer.submit(results.append, "after")
+        writer.flush()
+        writer.close()
+        assert results == ["after"]
+        assert len(writer.errors) == 1
+        assert writer.errors[0][0] == "fail"
+        assert isinstance(writer.errors[0][1], OSError)
+
+    def test_submit_after_close_raises(self):
+        """Submitting to a closed writer raises."""
+        writer = AsyncFileWriter()
+        writer.close()
+        writer.close()  # second close is a no-op
+        with pytest.raises(RuntimeError):
+            writer.submit(print)
+
+
 class TestIntegration:
     """Integration tests that test multiple components working together."""
 
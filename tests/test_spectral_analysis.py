@@ -0,0 +1,102 @@
+"""
+Tests for spectral_analysis.py
+
+This module tests the following:
+- spectral_features: peak, FWHM, integral and centroid of Gaussian lines, peaks cut by the spectrum end
+- load_run / analyze_run: CSV runs in the createFile layout and archives, summary table, chunked multiprocess runs
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add the plugins directory to the path so we can import the module
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "plugins"))
+
+try:
+    from spectral_analysis import analyze_run, load_run, spectral_features, summary_path
+    from spectral_archive import SpectralArchiveWriter, archive_path
+except ImportError as e:
+    pytest.skip(f"Cannot import required modules: {e}", allow_module_level=True)
+
+WAVELENGTH = np.linspace(400, 800, 2001)
+
+
+def gaussian(center, sigma, amplitude=1.0):
+    return amplitude * np.exp(-((WAVELENGTH - center) ** 2) / (2 * sigma**2))
+
+
+def write_csv_run(directory, centers):
+    files = []
+    for i, center in enumerate(centers):
+        address = os.path.join(str(directory), f"run_{i * 0.5:.4f} iv.csv")
+        np.savetxt(
+            address,
+            np.column_stack((WAVELENGTH, gaussian(center, 10))),
+            fmt="%.9e",
+            delimiter=";",
+            header="Thorlabs FTS operated by pyIVSL\n#[SpectrumHeader]\nIntegrationTime;0.1\n#[Data]\n",
+            footer="#[EndOfFile]",
+            comments="#",
+        )
+        files.append(address)
+    return files
+
+
+class TestSpectralFeatures:
+    def test_gaussian_lines(self):
+        spectra = np.array([gaussian(500, 10), gaussian(600, 5, 2.0), gaussian(650, 20, 0.5)])
+        features = spectral_features(WAVELENGTH, spectra)
+        np.testing.assert_allclose(features["peak_wavelength"], [500, 600, 650])
+        np.testing.assert_allclose(features["peak_intensity"], [1.0, 2.0, 0.5])
+        np.testing.assert_allclose(features["fwhm"], 2 * np.sqrt(2 * np.log(2)) * np.array([10, 5, 20]), rtol=1e-3)
+        np.testing.assert_allclose(features["integrated_intensity"], np.sqrt(2 * np.pi) * np.array([10, 10, 10]), rtol=1e-4)
+        np.testing.assert_allclose(features["centroid"], [500, 600, 650], rtol=1e-6)
+
+    def test_cut_peak_and_single_spectrum(self):
+        features = spectral_features(WAVELENGTH, gaussian(402, 10))
+        assert features["peak_wavelength"].shape == (1,)
+        assert np.isnan(features["fwhm"][0])
+        with pytest.raises(ValueError):
+            spectral_features(WAVELENGTH[:-1], gaussian(500, 10))
+
+
+class TestRuns:
+    def test_csv_run(self, tmp_path):
+        run = tmp_path / "run"
+        run.mkdir()
+        write_csv_run(run, [500, 550, 600])
+        wavelength, spectra, metadata = load_run(str(run))
+        assert spectra.shape == (3, WAVELENGTH.size)
+        np.testing.assert_allclose(wavelength, WAVELENGTH)
+        np.testing.assert_allclose(metadata["setpoint"], [0.0, 0.5, 1.0])
+
+        output, table = analyze_run(str(run))
+        assert output == summary_path(str(run)) == str(tmp_path / "run_features.csv")
+        with open(output) as f:
+            lines = f.read().splitlines()
+        assert lines[0] == "file;setpoint;peak_wavelength;peak_intensity;fwhm;integrated_intensity;centroid"
+        assert lines[2].startswith("run_0.5000 iv.csv;0.5;550.0;")
+        # the summary is not read back as a spectrum
+        assert len(analyze_run(str(run))[1]["fwhm"]) == 3
+
+    def test_archive_run(self, tmp_path):
+        path = archive_path(str(tmp_path), "run")
+        with SpectralArchiveWriter(path, WAVELENGTH, chunk_size=4) as archive:
+            for i in range(10):
+                archive.append(gaussian(450 + 10 * i, 10), setpoint=i)
+        output, table = analyze_run(path)
+        assert output == str(tmp_path / "run_features.csv")
+        np.testing.assert_allclose(table["peak_wavelength"], 450 + 10 * np.arange(10))
+        np.testing.assert_allclose(table["setpoint"], np.arange(10))
+
+    def test_chunked_run_in_processes(self, tmp_path):
+        run = tmp_path / "run"
+        run.mkdir()
+        centers = np.arange(450.0, 750.0, 30.0)
+        write_csv_run(run, centers)
+        _, table = analyze_run(str(run), chunk_size=2, workers=2)
+        np.testing.assert_allclose(table["peak_wavelength"], centers)
+        np.testing.assert_allclose(table["fwhm"], 2 * np.sqrt(2 * np.log(2)) * 10, rtol=1e-3)
@@ -0,0 +1,134 @@
+"""
+Tests for spectral_archive.py
+
+This module tests the following:
+- SpectralArchiveWriter / SpectralArchiveReader: append, chunking, compression, reopening, crash recovery
+- export_csv: per-scan CSV files in the createFile layout
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add the plugins directory to the path so we can import the module
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "plugins"))
+
+try:
+    from spectral_archive import SpectralArchiveReader, SpectralArchiveWriter, archive_path, export_csv
+except ImportError as e:
+    pytest.skip(f"Cannot import required modules: {e}", allow_module_level=True)
+
+PIXELS = 50
+
+
+@pytest.fixture
+def wavelength():
+    return np.linspace(400, 700, PIXELS)
+
+
+def make_spectrum(i):
+    return np.linspace(0, 1, PIXELS) * (i + 1) / 10
+
+
+class TestSpectralArchive:
+    """Test writing and reading archives."""
+
+    def test_archive_path(self, tmp_path):
+        assert archive_path(str(tmp_path), "run") == os.path.join(str(tmp_path), "run.specarchive")
+        assert archive_path(str(tmp_path), "run.specarchive") == os.path.join(str(tmp_path), "run.specarchive")
+
+    def test_roundtrip(self, tmp_path, wavelength):
+        path = archive_path(str(tmp_path), "run")
+        with SpectralArchiveWriter(path, wavelength, header={"samplename": "s1"}, chunk_size=4) as archive:
+            for i in range(10):
+                assert archive.append(make_spectrum(i), setpoint=i * 0.5, integrationtime=0.1, i_after=1e-3 * i) == i
+            assert len(archive) == 10
+
+        reader = SpectralArchiveReader(path)
+        assert len(reader) == 10
+        assert reader.n_chunks == 3
+        assert reader.header["samplename"] == "s1"
+        np.testing.assert_allclose(reader.wavelength, wavelength)
+        spectra = reader.spectra()
+        assert spectra.shape == (10, PIXELS)
+        for i in range(10):
+            np.testing.assert_allclose(spectra[i], make_spectrum(i), rtol=1e-6)
+        np.testing.assert_allclose(reader.spectrum(7), make_spectrum(7), rtol=1e-6)
+        meta = reader.scan_metadata(3)
+        assert meta["scan"] == 3
+        assert meta["setpoint"] == 1.5
+        assert meta["i_after"] == pytest.approx(3e-3)
+        assert np.isnan(meta["v_before"])
+
+    def test_compressed_chunks(self, tmp_path, wavelength):
+        path = archive_path(str(tmp_path), "run")
+        with SpectralArchiveWriter(path, wavelength, chunk_size=4, compress=True) as archive:
+            for i in range(6):
+                archive.append(make_spectrum(i))
+        files = sorted(os.listdir(path))
+        assert "chunk_00000.npz" in files and "chunk_00001.npz" in files
+        assert not any(name.endswith(".npy") and name.startswith("chunk") for name in files)
+        reader = SpectralArchiveReader(path)
+        np.testing.assert_allclose(reader.spectrum(5), make_spectrum(5), rtol=1e-6)
+
+    def test_reopen_appends(self, tmp_path, wavelength):
+        path = archive_path(str(tmp_path), "run")
+        with SpectralArchiveWriter(path, wavelength, chunk_size=4) as archive:
+            for i in range(5):
+                archive.append(make_spectrum(i))
+        with SpectralArchiveWriter(path, wavelength) as archive:
+            assert len(archive) == 5
+            for i in range(5, 9):
+                archive.append(make_spectrum(i))
+        reader = SpectralArchiveReader(path)
+        assert len(reader) == 9
+        for i in range(9):
+            np.testing.assert_allclose(reader.spectrum(i), make_spectrum(i), rtol=1e-6)
+
+    def test_unclosed_archive_is_readable(self, tmp_path, wavelength):
+        """An archive whose writer was never closed (crash) keeps all complete scans, a cut metadata line is skipped."""
+        path = archive_path(str(tmp_path), "run")
+        archive = SpectralArchiveWriter(path, wavelength, chunk_size=8)
+        for i in range(3):
+            archive.append(make_spectrum(i), setpoint=i)
+        archive._metadata_file.write("3;1.0")  # partially written line
+        archive._metadata_file.flush()
+        reader = SpectralArchiveReader(path)
+        assert len(reader) == 3
+        np.testing.assert_allclose(reader.spectrum(2), make_spectrum(2), rtol=1e-6)
+        archive._metadata_file.close()
+
+        # continuing the run drops the cut line
+        with SpectralArchiveWriter(path, wavelength) as archive:
+            archive.append(make_spectrum(3), setpoint=3)
+        reader = SpectralArchiveReader(path)
+        assert len(reader) == 4
+        assert reader.scan_metadata(3)["setpoint"] == 3
+        np.testing.assert_allclose(reader.spectrum(3), make_spectrum(3), rtol=1e-6)
+
+    def test_invalid_input(self, tmp_path, wavelength):
+        path = archive_path(str(tmp_path), "run")
+        with SpectralArchiveWriter(path, wavelength, extra_fields=("i_drain",)) as archive:
+            archive.append(make_spectrum(0), i_drain=1.0)
+            with pytest.raises(ValueError):
+                archive.append(make_spectrum(0), unknown=1.0)
+            with pytest.raises(ValueError):
+                archive.append(np.zeros(PIXELS + 1))
+        with pytest.raises(ValueError):
+            SpectralArchiveWriter(path, np.linspace(400, 700, PIXELS + 1))
+
+    def test_export_csv(self, tmp_path, wavelength):
+        path = archive_path(str(tmp_path), "run")
+        with SpectralArchiveWriter(path, wavelength, header={"samplename": "s1", "comment": "c", "csv_name_format": "{name}_{setpoint:.4f} iv.csv"}) as archive:
+            for i in range(3):
+                archive.append(make_spectrum(i), setpoint=i * 0.5, integrationtime=0.1, i_after=1e-3, v_after=0.5)
+        written = export_csv(path)
+        assert [os.path.basename(f) for f in written] == ["run_0.0000 iv.csv", "run_0.5000 iv.csv", "run_1.0000 iv.csv"]
+        with open(written[1]) as f:
+            text = f.read()
+        assert text.rstrip().endswith("#[EndOfFile]")
+        data = np.loadtxt(written[1], delimiter=";", comments="#")
+        np.testing.assert_allclose(data[:, 0], wavelength)
+        np.testing.assert_allclose(data[:, 1], make_spectrum(1), rtol=1e-6)
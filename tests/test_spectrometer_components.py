@@ -0,0 +1,422 @@
+"""
+Tests for spectrometer_components.py
+
+This module tests the following classes:
+- IntegrationTimePredictor: integration time search used by getAutoTime
+- SampleStore, align_iv, align_spectra: dual-clock acquisition in specTimeIV
+- wait_for_scan: scan completion wait
+- SpectrumStream: continuous scan reader
+- SpectrumAccumulator, DarkLibrary: averaging and dark correction
+- SpectrometerGroup: concurrent capture from several spectrometer plugins
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+# Add the plugins directory to the path so we can import the module
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "plugins"))
+
+try:
+    from spectrometer_components import (
+        DarkLibrary,
+        IntegrationTimePredictor,
+        SampleStore,
+        SpectrumAccumulator,
+        SpectrometerGroup,
+        SpectrumStream,
+        align_iv,
+        align_spectra,
+        wait_for_scan,
+    )
+except ImportError as e:
+    pytest.skip(f"Cannot import required modules: {e}", allow_module_level=True)
+
+
+def detector(integration_time, rate, offset=0.0, pixels=201):
+    """Gaussian line on a linear detector that clips at 1.0."""
+    x = np.linspace(-1, 1, pixels)
+    spectrum = offset + rate * integration_time * np.exp(-(x**2) / 0.01)
+    return np.clip(spectrum, 0, 1.0)
+
+
+def run_search(predictor, rate, offset=0.0, setpoint=None, fallback=None, max_iterations=10):
+    """Runs the getAutoTime loop against the simulated detector, returns (time, number of scans)."""
+    predictor.start()
+    t = predictor.initial_guess(setpoint, fallback)
+    for scans in range(1, max_iterations + 1):
+        spectrum = detector(t, rate, offset)
+        if predictor.in_window(spectrum):
+            predictor.store(setpoint, t)
+            return t, scans
+        t = predictor.next_time(t, spectrum)
+    return None, max_iterations
+
+
+class TestIntegrationTimePredictor:
+    """Test the IntegrationTimePredictor class."""
+
+    def setup_method(self):
+        self.predictor = IntegrationTimePredictor(0.004, 30, 0.2, 0.8)
+
+    def test_one_unsaturated_scan_reaches_target(self):
+        """A single unsaturated scan is enough to jump into the window."""
+        self.predictor.start()
+        t = self.predictor.next_time(0.1, detector(0.1, rate=1.0))  # peak 0.1
+        assert t == pytest.approx(0.5)
+        assert self.predictor.in_window(detector(t, rate=1.0))
+
+    def test_offset_is_fitted_from_two_scans(self):
+        """With a dark offset two scans give the target exactly."""
+        self.predictor.start()
+        t = self.predictor.next_time(0.01, detector(0.01, rate=2.0, offset=0.15))
+        t = self.predictor.next_time(0.02, detector(0.02, rate=2.0, offset=0.15))
+        assert 0.15 + 2.0 * t == pytest.approx(self.predictor.target)
+
+    def test_saturated_start_converges(self):
+        """Starting 500x in saturation still converges in a few scans (bisection would need 9)."""
+        t, scans = run_search(self.predictor, rate=50.0, fallback=10.0)
+        assert t is not None
+        assert scans <= 5
+
+    def test_dark_start_converges(self):
+        """Starting far below the window still converges in a few scans."""
+        t, scans = run_search(self.predictor, rate=0.05, fallback=0.004)
+        assert t is not None
+        assert scans <= 4
+
+    def test_fewer_scans_than_bisection(self):
+        """Default start (no guess) needs fewer scans than halving/doubling from the middle of the range."""
+        _, scans = run_search(self.predictor, rate=3.0)
+        assert scans <= 3
+
+    def test_result_is_clamped(self):
+        """Predictions stay inside the allowed range."""
+        self.predictor.start()
+        assert self.predictor.next_time(30, detector(30, rate=1e-5)) == 30
+        self.predictor.start()
+        assert self.predictor.next_time(0.004, detector(0.004, rate=1e6)) == 0.004
+
+    def test_setpoint_cache_and_extrapolation(self):
+        """Cached results are reused and extrapolated in log(time) for new setpoints."""
+        self.predictor.store(1.0, 0.4)
+        assert self.predictor.initial_guess(1.0) == pytest.approx(0.4)
+        assert self.predictor.initial_guess(2.0) == pytest.approx(0.4)  # single point: reuse
+        self.predictor.store(2.0, 0.2)
+        assert self.predictor.initial_guess(3.0) == pytest.approx(0.1)
+        assert self.predictor.initial_guess(1.5) == pytest.approx(np.sqrt(0.4 * 0.2))
+        self.predictor.clear_cache()
+        assert self.predictor.initial_guess(3.0, fallback=0.05) == pytest.approx(0.05)
+
+    def test_explicit_guess_wins_over_cache(self):
+        """An explicit initial time is used even if the setpoint is cached."""
+        self.predictor.store(1.0, 0.4)
+        assert self.predictor.initial_guess(1.0, fallback=0.05, explicit=0.2) == pytest.approx(0.2)
+        assert self.predictor.initial_guess(1.0, explicit=100) == self.predictor.time_max
+
+    def test_sweep_uses_one_scan_per_point(self):
+        """In a sweep where intensity grows smoothly with the setpoint most points need a single scan."""
+        total_scans = 0
+        for setpoint in np.linspace(1, 2, 11):
+            t, scans = run_search(self.predictor, rate=setpoint**2, setpoint=setpoint)
+            assert t is not None
+            total_scans += scans
+        assert total_scans <= 15
+
+
+class TestAlignment:
+    """Test SampleStore and the IV alignment functions."""
+
+    def test_mean_over_exposure(self):
+        times = np.arange(10) * 0.1
+        values = np.column_stack((times * 2, times * 3))
+        np.testing.assert_allclose(align_iv(times, values, 0.25, 0.55), [0.8, 1.2])  # samples 0.3, 0.4, 0.5
+
+    def test_interpolation_for_short_exposure(self):
+        times = np.array([0.0, 1.0])
+        np.testing.assert_allclose(align_iv(times, np.array([0.0, 2.0]), 0.2, 0.4), [0.6])
+
+    def test_outside_sampled_time_is_nan(self):
+        times = np.array([0.0, 1.0])
+        assert np.isnan(align_iv(times, np.array([0.0, 2.0]), 1.5, 1.6)).all()
+        assert np.isnan(align_iv([], [], 0.0, 1.0)).all()
+
+    def test_store_around(self):
+        store = SampleStore(t0=0.0)
+        for i in range(100):
+            store.append((i, -i), i * 0.1)
+        times, values = store.around(2.05, 2.35)
+        np.testing.assert_allclose(times, [2.0, 2.1, 2.2, 2.3, 2.4])
+        assert values[0] == (20, -20)
+        assert len(store.since(98)) == 2
+
+    def test_concurrent_producers(self):
+        """IV sampled in one thread, spectra in another, aligned afterwards from the shared clock."""
+        iv_store = SampleStore()
+        spectrum_store = SampleStore(t0=iv_store.t0)
+        stop = threading.Event()
+
+        def spectrometer():
+            while not stop.is_set():
+                t_start = spectrum_store.clock()
+                time.sleep(0.03)
+                spectrum_store.append(np.zeros(5), t_start, spectrum_store.clock())
+
+        thread = threading.Thread(target=spectrometer)
+        thread.start()
+        for _ in range(30):
+            t = iv_store.clock()
+            iv_store.append((t, 1.0), t)  # current equals the time, so the aligned value is the exposure middle
+            time.sleep(0.005)
+        stop.set()
+        thread.join()
+
+        assert len(iv_store) > 3 * len(spectrum_store) > 0
+        aligned = align_spectra(spectrum_store, iv_store)
+        starts, ends, _ = spectrum_store.snapshot()
+        inside = ends <= iv_store.latest_time()
+        np.testing.assert_allclose(aligned[inside, 0], ((starts + ends) / 2)[inside], atol=0.01)
+        np.testing.assert_allclose(aligned[inside, 1], 1.0)
+
+
+class TestWaitForScan:
+    def test_polls_only_near_deadline(self):
+        polls = []
+        start = time.monotonic()
+        deadline = start + 0.2
+
+        def ready():
+            polls.append(time.monotonic())
+            return polls[-1] >= deadline
+
+        assert wait_for_scan(ready, deadline, timeout=deadline + 1)
+        assert polls[0] >= deadline - 0.01
+        assert len(polls) < 10
+        assert time.monotonic() - deadline < 0.05
+
+    def test_backoff_without_deadline(self):
+        polls = []
+        start = time.monotonic()
+
+        def ready():
+            polls.append(time.monotonic())
+            return polls[-1] - start > 0.3
+
+        assert wait_for_scan(ready, None, max_poll=0.05)
+        intervals = np.diff(polls)
+        assert intervals[0] < intervals[3]
+        assert intervals.max() < 0.08
+        assert len(polls) < 20
+
+    def test_timeout_and_cancel(self):
+        now = time.monotonic()
+        with pytest.raises(TimeoutError):
+            wait_for_scan(lambda: False, now, timeout=now + 0.05)
+        cancel_at = time.monotonic() + 0.05
+        assert not wait_for_scan(lambda: False, time.monotonic() + 10, cancelled=lambda: time.monotonic() > cancel_at)
+        assert time.monotonic() - cancel_at < 0.2
+
+
+class FakeContinuousScan:
+    """get_scan_data of a device in continuous mode: blocks for one exposure, frames are filled with their number."""
+
+    def __init__(self, exposure, fail_after=None):
+        self.exposure = exposure
+        self.fail_after = fail_after
+        self.frames = 0
+
+    def read_frame(self):
+        time.sleep(self.exposure)
+        if self.fail_after is not None and self.frames >= self.fail_after:
+            raise IOError("USB timeout")
+        self.frames += 1
+        return np.full(4, float(self.frames - 1))
+
+
+class TestSpectrumStream:
+    def make_stream(self, exposure=0.01, capacity=8, **kwargs):
+        device = FakeContinuousScan(exposure, **kwargs)
+        stream = SpectrumStream(device.read_frame, exposure, capacity)
+        stream.start()
+        return stream
+
+    def test_next_after_waits_for_fresh_frame(self):
+        stream = self.make_stream()
+        try:
+            t = time.monotonic()
+            sequence, t_start, t_end, frame = stream.next_after(t, timeout=1)
+            assert t_start >= t
+            assert t_end > t_start
+            assert frame[0] == sequence
+            assert stream.latest()[0] >= sequence
+        finally:
+            stream.stop()
+        assert not stream.running
+
+    def test_next_frame_gets_every_frame(self):
+        stream = self.make_stream()
+        try:
+            sequences = [-1]
+            for _ in range(5):
+                sequences.append(stream.next_frame(sequences[-1], timeout=1)[0])
+            time.sleep(0.15)  # more than capacity frames behind
+            latest = stream.next_frame(sequences[-1], timeout=1)[0]
+        finally:
+            stream.stop()
+        assert sequences[1:] == [0, 1, 2, 3, 4]
+        assert latest > sequences[-1] + stream.capacity
+
+    def test_frames_are_back_to_back(self):
+        stream = self.make_stream()
+        try:
+            frames = stream.next_n_after(time.monotonic(), 4, timeout=1)
+        finally:
+            stream.stop()
+        sequences = [frame[0] for frame in frames]
+        assert sequences == list(range(sequences[0], sequences[0] + 4))
+        for previous, current in zip(frames, frames[1:]):
+            assert current[1] == previous[2]
+
+    def test_average(self):
+        stream = self.make_stream()
+        try:
+            t = time.monotonic()
+            average = stream.average(3, t, timeout=1)
+            first = stream.next_after(t)[0]
+        finally:
+            stream.stop()
+        np.testing.assert_allclose(average, first + 1)
+
+    def test_triggered_frames_start_one_exposure_before_arrival(self):
+        device = FakeContinuousScan(0.03)
+        stream = SpectrumStream(device.read_frame, 0.01, back_to_back=False)
+        stream.start()
+        try:
+            frames = stream.next_n_after(time.monotonic(), 2, timeout=1)
+        finally:
+            stream.stop()
+        for _, t_start, t_end, _ in frames:
+            assert t_end - t_start == pytest.approx(0.01)
+        assert frames[1][1] > frames[0][2]  # gap while waiting for the trigger
+
+    def test_overruns_count_unread_frames(self):
+        stream = self.make_stream(exposure=0.002, capacity=4)
+        try:
+            time.sleep(0.1)
+        finally:
+            stream.stop()
+        assert stream.count > 4
+        assert stream.overruns == stream.count - 4
+
+    def test_latest_before_first_frame(self):
+        stream = SpectrumStream(FakeContinuousScan(0.01).read_frame, 0.01)
+        assert stream.latest() is None
+
+    def test_timeout_and_reader_error(self):
+        stream = self.make_stream(fail_after=2)
+        with pytest.raises(RuntimeError):
+            stream.next_n_after(time.monotonic(), 5, timeout=1)
+        assert isinstance(stream.error, IOError)
+        stream.stop()
+
+        stream = self.make_stream(exposure=0.2)
+        try:
+            with pytest.raises(TimeoutError):
+                stream.next_after(time.monotonic(), timeout=0.05)
+        finally:
+            stream.stop()
+
+
+class TestSpectrumAccumulator:
+    def test_matches_numpy(self):
+        rng = np.random.default_rng(1)
+        frames = 1000 + rng.normal(0, 5, (50, 30))  # large offset, where the naive sum of squares loses precision
+        acc = SpectrumAccumulator()
+        for frame in frames:
+            acc.add(frame)
+        assert acc.count == 50
+        np.testing.assert_allclose(acc.mean, frames.mean(axis=0))
+        np.testing.assert_allclose(acc.variance, frames.var(axis=0, ddof=1))
+        np.testing.assert_allclose(acc.std, frames.std(axis=0, ddof=1))
+
+    def test_single_frame_and_errors(self):
+        acc = SpectrumAccumulator()
+        with pytest.raises(ValueError):
+            acc.mean
+        acc.add([1.0, 2.0])
+        np.testing.assert_array_equal(acc.variance, [0.0, 0.0])
+        with pytest.raises(ValueError):
+            acc.add([1.0, 2.0, 3.0])
+        acc.reset()
+        assert acc.count == 0
+
+
+class TestDarkLibrary:
+    def test_persisted_and_keyed(self, tmp_path):
+        path = str(tmp_path / "darks" / "dark_library.npz")
+        library = DarkLibrary(path)
+        library.store("M001", 0.1, np.full(5, 0.1))
+        library.store("M001", 0.2, np.full(5, 0.2))
+        library.store("M002", 0.1, np.full(5, 0.3))
+        library.store("M001", 0.1, np.full(5, 1.0), kind="reference")
+
+        reopened = DarkLibrary(path)
+        assert len(reopened) == 4
+        np.testing.assert_array_equal(reopened.get("M001", 0.1 + 1e-9), np.full(5, 0.1))
+        np.testing.assert_array_equal(reopened.get("M002", 0.1), np.full(5, 0.3))
+        assert reopened.get("M002", 0.2) is None
+        assert ("reference", "M001", 0.1) in reopened.entries()
+        reopened.remove("M002", 0.1)
+        assert len(DarkLibrary(path)) == 3
+        assert not os.path.exists(path + ".tmp.npz")
+
+    def test_correct(self, tmp_path):
+        library = DarkLibrary(str(tmp_path / "dark_library.npz"))
+        library.store("M001", 0.1, [0.1, 0.1, 0.1])
+        with pytest.raises(KeyError):
+            library.correct([0.5, 0.5, 0.5], "M001", 0.2)
+        np.testing.assert_allclose(library.correct([0.5, 0.3, 0.1], "M001", 0.1), [0.4, 0.2, 0.0])
+        with pytest.raises(KeyError):
+            library.correct([0.5, 0.3, 0.1], "M001", 0.1, reference=True)
+        library.store("M001", 0.1, [0.9, 0.5, 0.1], kind="reference")
+        relative = library.correct([0.5, 0.3, 0.1], "M001", 0.1, reference=True)
+        np.testing.assert_allclose(relative[:2], [0.5, 0.5])
+        assert np.isnan(relative[2])  # no reference signal
+        with pytest.raises(ValueError):
+            library.store("M001", 0.1, [0, 0, 0], kind="flat")
+
+
+def fake_spectrometer(exposure, level, fail=False):
+    def get_scan():
+        time.sleep(exposure)
+        if fail:
+            return [4, {"Error message": "Can not get scan"}]
+        return [0, np.full(3, level)]
+
+    return {"spectrometerGetScan": get_scan, "spectrometerSetIntegrationTime": lambda t: [0, "OK"] if t > 0 else 1 / 0}
+
+
+class TestSpectrometerGroup:
+    def test_capture_takes_the_slowest_exposure(self):
+        with SpectrometerGroup({"uv": fake_spectrometer(0.1, 1.0), "nir": fake_spectrometer(0.2, 2.0)}) as group:
+            start = time.monotonic()
+            timestamp, spectra = group.capture()
+            elapsed = time.monotonic() - start
+        assert 0.2 <= elapsed < 0.28
+        assert timestamp == pytest.approx(time.time(), abs=1)
+        assert group.names == ["uv", "nir"]
+        np.testing.assert_array_equal(spectra["nir"], np.full(3, 2.0))
+
+    def test_errors(self):
+        with SpectrometerGroup({"uv": fake_spectrometer(0.0, 1.0), "nir": fake_spectrometer(0.0, 2.0, fail=True)}) as group:
+            with pytest.raises(RuntimeError, match="nir"):
+                group.capture()
+            results = group.call("spectrometerSetIntegrationTime", 0)
+        assert results["uv"][0] == 4
+        assert "ZeroDivisionError" in results["uv"][1]["Error message"]
+        with pytest.raises(ValueError):
+            SpectrometerGroup({})
@@ -0,0 +1,98 @@
+"""
+Tests for the TLCCS driver scan processing (TLCCS.py)
+
+The USB device is replaced by an object whose read_raw fills the buffer with a known frame.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add the TLCCS plugin directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "plugins", "TLCCS"))
+
+try:
+    import TLCCS_const as const
+    from TLCCS import CCSDRV, RAW_RING_SIZE
+except ImportError as e:
+    pytest.skip(f"Cannot import TLCCS: {e}", allow_module_level=True)
+
+
+class FrameIO:
+    """read_raw writes the next frame of a list into the buffer."""
+
+    def __init__(self, frames):
+        self.frames = [np.asarray(frame, dtype=np.uint16).tobytes() for frame in frames]
+        self.buffers = []
+        self.status = const.CCS_SERIES_STATUS_SCAN_IDLE
+
+    def control_in(self, request, readTo):
+        assert request == const.CCS_SERIES_RCMD_GET_STATUS
+        memoryview(readTo).cast("B")[:] = np.array([self.status], dtype=np.int16).tobytes()
+
+    def read_raw(self, readTo):
+        self.buffers.append(readTo)
+        memoryview(readTo).cast("B")[:] = self.frames[(len(self.buffers) - 1) % len(self.frames)]
+
+
+def make_frame(level, dark=1000):
+    frame = np.full(const.CCS_SERIES_NUM_RAW_PIXELS, dark, dtype=np.uint16)
+    frame[const.SCAN_PIXELS_OFFSET : const.SCAN_PIXELS_OFFSET + const.CCS_SERIES_NUM_PIXELS] = dark + level + np.arange(const.CCS_SERIES_NUM_PIXELS) % 100
+    return frame
+
+
+def reference_normalization(raw):
+    """Per-pixel normalization as done before vectorization."""
+    data = np.zeros(const.CCS_SERIES_NUM_PIXELS, dtype=np.float64)
+    dark_com = np.sum(raw[const.DARK_PIXELS_OFFSET : const.DARK_PIXELS_OFFSET + const.NO_DARK_PIXELS]) / const.NO_DARK_PIXELS
+    norm_com = 1.0 / (const.MAX_ADC_VALUE - dark_com)
+    for i in range(const.CCS_SERIES_NUM_PIXELS):
+        data[i] = (raw[const.SCAN_PIXELS_OFFSET + i] - dark_com) * norm_com
+    return data
+
+
+class TestCCSDRVScanProcessing:
+    def setup_method(self):
+        self.frames = [make_frame(level) for level in (100, 2000, 30000)]
+        self.drv = CCSDRV()
+        self.drv.io = FrameIO(self.frames)
+
+    def test_normalization_matches_reference(self):
+        for frame in self.frames:
+            data = self.drv.get_scan_data()
+            assert data.dtype == np.float64
+            assert data.shape == (const.CCS_SERIES_NUM_PIXELS,)
+            np.testing.assert_allclose(data, reference_normalization(frame), rtol=1e-12)
+
+    def test_raw_buffers_are_reused(self):
+        for _ in range(2 * RAW_RING_SIZE):
+            self.drv.get_scan_data()
+        buffers = self.drv.io.buffers
+        assert len({id(buffer) for buffer in buffers}) == RAW_RING_SIZE
+        assert buffers[0] is buffers[RAW_RING_SIZE]
+
+    def test_returned_spectra_are_independent(self):
+        """Spectra are kept by callers (e.g. background writers), so later scans must not overwrite them."""
+        spectra = [self.drv.get_scan_data() for _ in range(RAW_RING_SIZE + 1)]
+        np.testing.assert_allclose(spectra[0], reference_normalization(self.frames[0]), rtol=1e-12)
+
+    def test_raw_view_has_no_copy(self):
+        raw = self.drv._get_raw_data()
+        assert raw.dtype == np.uint16
+        assert not raw.flags.owndata
+        np.testing.assert_array_equal(raw, self.frames[0])
+
+    def test_out_argument(self):
+        out = np.empty(const.CCS_SERIES_NUM_PIXELS)
+        result = self.drv._acquire_raw_scan_data(self.frames[1], out=out)
+        assert result is out
+        np.testing.assert_allclose(out, reference_normalization(self.frames[1]), rtol=1e-12)
+
+    def test_scan_ready(self):
+        assert not self.drv.scan_ready()
+        self.drv.io.status = const.CCS_SERIES_STATUS_SCAN_TRANSFER | const.CCS_SERIES_STATUS_SCAN_IDLE
+        assert self.drv.scan_ready()
+        assert "SCAN_TRANSFER" in self.drv.get_device_status()
+